@@ -0,0 +1,29 @@
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+""" -----------------------------------------------------------------------------------------------
+ Counts the commits (= SQLite transactions, each one is an fsync) per session and in total. Every
+ request gets its own session (see get_db in database.py), so the count of a session is the count
+ of the request.
+----------------------------------------------------------------------------------------------- """
+_lock = threading.Lock()
+_total_commits = 0
+
+
+@event.listens_for(Session, "after_commit")
+def _count_commit(session: Session):
+    global _total_commits
+
+    session.info["commit_count"] = session.info.get("commit_count", 0) + 1
+    with _lock:
+        _total_commits += 1
+
+
+def get_commit_count(session: Session) -> int:
+    return session.info.get("commit_count", 0)
+
+
+def commit_stats() -> dict:
+    with _lock:
+        return {"total_commits": _total_commits}
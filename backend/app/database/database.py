@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pathlib import Path
@@ -6,13 +7,76 @@ from pathlib import Path
 DATABASE_PATH = Path(__file__).resolve().parent.parent / "database/plants_database.db"
 DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
 
+# "tuned" applies the pragmas below on every connection, "default" keeps the SQLite defaults (e.g. for comparison)
+ENGINE_PROFILE = os.getenv("SQLITE_ENGINE_PROFILE", "tuned")
+JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Negative values are KiB, positive values are pages
+CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", str(-64 * 1024)))
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# FastAPI runs sync endpoints in a threadpool of 40 threads, one connection each
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "40"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# "1" serves the heavy GET endpoints from a separate read-only engine, "0" uses the same engine for everything
+READ_ONLY_ENGINE = os.getenv("SQLITE_READ_ONLY_ENGINE", "1") == "1"
+
+""" -----------------------------------------------------------------------------------------------
+ Creates an engine for the sqlite database with the connection profile:
+ - WAL journal: readers do not block the writer and the writer does not block readers, instead
+   of the rollback journal locking the whole file ("database is locked")
+ - synchronous NORMAL: in WAL mode only the checkpoints are fsynced, still consistent after a crash
+ - mmap_size and cache_size: reads are served from memory mapped pages and a larger page cache
+ - busy_timeout: a connection waits for a lock instead of failing right away
+ read_only opens the file read-only (no journal mode change, query_only as a safeguard).
+----------------------------------------------------------------------------------------------- """
+def create_sqlite_engine(path: Path = DATABASE_PATH, read_only: bool = False, profile: str = ENGINE_PROFILE,
+                         pool_size: int = POOL_SIZE, max_overflow: int = MAX_OVERFLOW):
+    if profile not in ("tuned", "default"):
+        raise ValueError(f"Unknown sqlite engine profile: {profile}")
+
+    url = f"sqlite:///file:{path}?mode=ro&uri=true" if read_only else f"sqlite:///{path}"
+    sqlite_engine = create_engine(url,
+                                  connect_args={"check_same_thread": False},
+                                  pool_size=pool_size,
+                                  max_overflow=max_overflow,
+                                  pool_timeout=POOL_TIMEOUT)
+
+    if profile == "default":
+        return sqlite_engine
+
+    @event.listens_for(sqlite_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            if read_only:
+                cursor.execute("PRAGMA query_only = ON")
+            else:
+                cursor.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            cursor.execute(f"PRAGMA cache_size = {CACHE_SIZE}")
+        finally:
+            cursor.close()
+
+    return sqlite_engine
+
+
 """ -----------------------------------------------------------------------------------------------
  Creates a lightweight sqlite database, fancy with sqlalchemy
 ----------------------------------------------------------------------------------------------- """
-engine = create_engine(DATABASE_URL)
+engine = create_sqlite_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Separate pool for the heavy GET endpoints, so long reads never hold a connection of the writers
+read_engine = create_sqlite_engine(read_only=True) if READ_ONLY_ENGINE else engine
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
 """ -----------------------------------------------------------------------------------------------
  For dependency injection
 ----------------------------------------------------------------------------------------------- """
@@ -22,3 +86,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Same for endpoints that only read
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,87 @@
+from dataclasses import dataclass
+from typing import Callable
+from sqlalchemy import Connection, Engine, text
+from app.database.database import Base
+# Registers all models on Base.metadata
+import app.models
+
+""" -----------------------------------------------------------------------------------------------
+ One step of the schema, identified by its version number. upgrade gets a connection within the
+ transaction of the step.
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+# Version 1: all tables of the models (an empty database gets the current schema right away)
+def _create_tables(connection: Connection):
+    Base.metadata.create_all(bind=connection)
+
+
+# Version 2: indexes on the foreign keys that are looked up per row (recommendation log and likes)
+def _add_foreign_key_indexes(connection: Connection):
+    for table, column in (("recommendation", "submission_id"),
+                          ("bm25_metadata", "recommendation_id"),
+                          ("sbert_metadata", "recommendation_id"),
+                          ("user_answer", "submission_id"),
+                          ("user_plant_like", "plant_id")):
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"))
+
+
+# Version 3: one row per plant in user_plant_like (likes are counted with an upsert on plant_id) and
+# an index on the counter for the most liked plants. Rows of the same plant are merged first
+def _add_unique_plant_likes(connection: Connection):
+    connection.execute(text("UPDATE user_plant_like SET like_counter = "
+                            "(SELECT SUM(COALESCE(duplicate.like_counter, 0)) FROM user_plant_like AS duplicate "
+                            "WHERE duplicate.plant_id = user_plant_like.plant_id) "
+                            "WHERE id IN (SELECT MIN(id) FROM user_plant_like GROUP BY plant_id)"))
+    connection.execute(text("DELETE FROM user_plant_like "
+                            "WHERE id NOT IN (SELECT MIN(id) FROM user_plant_like GROUP BY plant_id)"))
+    connection.execute(text("DROP INDEX IF EXISTS ix_user_plant_like_plant_id"))
+    connection.execute(text("CREATE UNIQUE INDEX ix_user_plant_like_plant_id ON user_plant_like (plant_id)"))
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_user_plant_like_like_counter "
+                            "ON user_plant_like (like_counter)"))
+
+
+""" -----------------------------------------------------------------------------------------------
+ Versioned schema migrations for existing databases, so they are upgraded in place instead of
+ being deleted. The version of a database file is stored in PRAGMA user_version (0 for databases
+ created before migrations existed). Upon startup (see lifespan in main.py) every migration with
+ a higher version runs in its own transaction (started explicitly, see migrate), together with
+ raising user_version, so a failed step is rolled back and leaves the database at the previous
+ version, DDL included.
+ New migrations are appended with the next version. They have to be idempotent (IF NOT EXISTS),
+ because version 1 creates a new database directly from the current models.
+----------------------------------------------------------------------------------------------- """
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(version=1, description="create tables", upgrade=_create_tables),
+    Migration(version=2, description="add foreign key indexes", upgrade=_add_foreign_key_indexes),
+    Migration(version=3, description="add unique plant likes", upgrade=_add_unique_plant_likes),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(connection: Connection) -> int:
+    return connection.execute(text("PRAGMA user_version")).scalar_one()
+
+
+# Brings the database to the latest version, returns the versions that were applied
+def migrate(engine: Engine) -> list[int]:
+    applied = []
+    for migration in MIGRATIONS:
+        with engine.begin() as connection:
+            # pysqlite only starts a transaction before INSERT/UPDATE/DELETE, DDL and PRAGMA user_version would
+            # autocommit one by one. IMMEDIATE also keeps another process from migrating at the same time
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            if get_schema_version(connection) >= migration.version:
+                continue
+
+            migration.upgrade(connection)
+            connection.execute(text(f"PRAGMA user_version = {migration.version}"))
+            applied.append(migration.version)
+
+    return applied
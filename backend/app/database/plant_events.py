@@ -0,0 +1,44 @@
+from itertools import chain
+from typing import Callable
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import Plant
+
+""" -----------------------------------------------------------------------------------------------
+ Small publish/subscribe hook for changes of the plants table. Everything that caches data derived
+ from the plant catalog (e.g. the SBERT corpus embeddings) registers a listener here and gets
+ notified once a transaction that inserted, updated or deleted plants is committed.
+----------------------------------------------------------------------------------------------- """
+_listeners: list[Callable[[], None]] = []
+
+
+def on_plants_changed(listener: Callable[[], None]) -> Callable[[], None]:
+    _listeners.append(listener)
+    return listener
+
+
+def notify_plants_changed():
+    for listener in list(_listeners):
+        listener()
+
+
+""" -----------------------------------------------------------------------------------------------
+ ORM session hooks, such that nobody has to remember calling notify_plants_changed() by hand.
+ The flush marks the session, the commit fires the notification, a rollback discards it.
+----------------------------------------------------------------------------------------------- """
+@event.listens_for(Session, "after_flush")
+def _mark_plant_changes(session: Session, flush_context):
+    changed = chain(session.new, session.deleted, (obj for obj in session.dirty if session.is_modified(obj)))
+    if any(isinstance(obj, Plant) for obj in changed):
+        session.info["plants_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session: Session):
+    if session.info.pop("plants_changed", False):
+        notify_plants_changed()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop("plants_changed", None)
@@ -0,0 +1,227 @@
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+
+# "1" writes answers and recommendations in the background after the response, "0" writes them within the request
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND", "0") == "1"
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "1000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+
+# How long a request waits for space in a full queue, before it writes itself (backpressure)
+WRITE_BEHIND_PUT_TIMEOUT_MS = float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT_MS", "1000"))
+
+""" -----------------------------------------------------------------------------------------------
+ One pending write. write gets a session and adds its rows, it never commits itself (committing
+ is up to the caller, so several writes can share one transaction). It must only hold plain
+ values (e.g. dicts of column values), no ORM objects of the request session.
+----------------------------------------------------------------------------------------------- """
+@dataclass
+class _PendingWrite:
+    write: Callable[[Session], None]
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+""" -----------------------------------------------------------------------------------------------
+ Write-behind queue for everything that is only logged for later evaluations (user answers,
+ recommendations and their metadata). Request threads put their writes into a bounded queue and
+ return, one writer thread drains it with its own session: all writes that are queued at that
+ moment (at most batch_size) are stored in one transaction. If such a batch fails, its writes are
+ retried one by one, so a single broken write does not take the others with it.
+ Backpressure: if the queue is full, a request waits up to put_timeout_ms and then writes
+ synchronously within its own session, so nothing is dropped. Upon shutdown (see lifespan in
+ main.py) the queue is flushed before the app stops.
+ Disabled (default), every write is stored and committed right away within the request.
+ The submission itself is always stored synchronously, its id is returned to the client.
+----------------------------------------------------------------------------------------------- """
+class WriteBehindQueue:
+    def __init__(self, session_factory=SessionLocal, enabled: bool = WRITE_BEHIND_ENABLED,
+                 max_queue_size: int = WRITE_BEHIND_MAX_QUEUE, batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 put_timeout_ms: float = WRITE_BEHIND_PUT_TIMEOUT_MS):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.max_queue_size = max(1, max_queue_size)
+        self.batch_size = max(1, batch_size)
+        self.put_timeout = max(0.0, put_timeout_ms) / 1000
+
+        self._queue: queue.Queue[_PendingWrite | None] = queue.Queue(maxsize=self.max_queue_size)
+        self._worker: threading.Thread | None = None
+        self._worker_lock = threading.Lock()
+        # Held while checking _closed and queueing, so close() never puts its sentinel before a write
+        self._submit_lock = threading.Lock()
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self._num_enqueued = 0
+        self._num_written = 0
+        self._num_failed = 0
+        self._num_batches = 0
+        self._num_sync_fallbacks = 0
+        self._max_depth_seen = 0
+        self._total_lag = 0.0
+        self._max_lag_seen = 0.0
+        self._last_lag = 0.0
+        self._last_error: str | None = None
+
+    # Called by the request threads: queues the write, or stores it right away within the request session
+    def submit(self, db: Session, write: Callable[[Session], None]):
+        if not self.enabled:
+            self._write_now(db=db, write=write)
+            return
+
+        # While the queue is full, the other requests wait for the lock instead of put, same backpressure
+        queued = False
+        with self._submit_lock:
+            closed = self._closed
+            if not closed:
+                self._ensure_worker()
+                try:
+                    self._queue.put(_PendingWrite(write=write), timeout=self.put_timeout)
+                    queued = True
+                except queue.Full:
+                    pass
+
+        if not queued:
+            if not closed:
+                with self._stats_lock:
+                    self._num_sync_fallbacks += 1
+            self._write_now(db=db, write=write)
+            return
+
+        with self._stats_lock:
+            self._num_enqueued += 1
+            self._max_depth_seen = max(self._max_depth_seen, self._queue.qsize())
+
+    @staticmethod
+    def _write_now(db: Session, write: Callable[[Session], None]):
+        try:
+            write(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._worker.start()
+
+    # Writer loop: wait for the first write, then take everything that is queued (up to batch_size)
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                self._queue.task_done()
+                return
+
+            batch = [first]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    pending = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if pending is None:
+                    stop = True
+                    break
+                batch.append(pending)
+
+            self._write_batch(batch)
+
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch: list[_PendingWrite]):
+        db = self.session_factory()
+        try:
+            try:
+                for pending in batch:
+                    pending.write(db)
+                db.commit()
+                self._record(written=batch, failed=0, error=None)
+                return
+            except Exception:
+                db.rollback()
+
+            # One transaction per write, to find the broken one
+            for pending in batch:
+                try:
+                    pending.write(db)
+                    db.commit()
+                    self._record(written=[pending], failed=0, error=None)
+                except Exception as error:
+                    db.rollback()
+                    self._record(written=[], failed=1, error=error)
+        finally:
+            db.close()
+
+    def _record(self, written: list[_PendingWrite], failed: int, error: Exception | None):
+        committed_at = time.perf_counter()
+        lags = [committed_at - pending.enqueued_at for pending in written]
+
+        with self._stats_lock:
+            self._num_batches += 1 if written else 0
+            self._num_written += len(written)
+            self._num_failed += failed
+            if lags:
+                self._total_lag += sum(lags)
+                self._max_lag_seen = max(self._max_lag_seen, max(lags))
+                self._last_lag = lags[-1]
+            if error is not None:
+                # First line only, SQLAlchemy errors append the statement and a link
+                self._last_error = f"{type(error).__name__}: {str(error).partition(chr(10))[0]}"
+
+    # Blocks until every queued write is stored (or failed)
+    def flush(self):
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.join()
+
+    # Queue depth, throughput and lag (time from queueing to commit) of the writes
+    def stats(self) -> dict:
+        with self._stats_lock:
+            num_batches = self._num_batches or 1
+            num_written = self._num_written or 1
+
+            return {
+                "enabled": self.enabled,
+                "max_queue_size": self.max_queue_size,
+                "batch_size": self.batch_size,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth_seen": self._max_depth_seen,
+                "pending": self._num_enqueued - self._num_written - self._num_failed,
+                "enqueued": self._num_enqueued,
+                "written": self._num_written,
+                "failed": self._num_failed,
+                "sync_fallbacks": self._num_sync_fallbacks,
+                "batches": self._num_batches,
+                "avg_batch_size": round(self._num_written / num_batches, 3),
+                "avg_lag_ms": round(self._total_lag / num_written * 1000, 3),
+                "max_lag_ms": round(self._max_lag_seen * 1000, 3),
+                "last_lag_ms": round(self._last_lag * 1000, 3),
+                "last_error": self._last_error,
+            }
+
+    # Stores everything that is queued and stops the writer, later writes are stored synchronously
+    def close(self):
+        with self._submit_lock:
+            self._closed = True
+            worker = self._worker
+            if worker is not None and worker.is_alive():
+                self._queue.put(None)
+
+        if worker is not None:
+            worker.join()
+
+
+write_behind_queue = WriteBehindQueue()
@@ -4,4 +4,4 @@ from .sunlight import SunLight
 from .watering import Watering
 from .fertilitation import Fertilization
 from .question_type import QuestionType, UserStudyAnswerType
-from .recommendation import Label, Algorithm
\ No newline at end of file
+from .recommendation import Label, Algorithm, ExportFormat
\ No newline at end of file
@@ -13,11 +13,14 @@ class Fertilization(str, Enum):
     # Mapping to avoid whitespace in query
     @property
     def map_db_value(self) -> str:
-        mapping = {
-            "acidic": "acidic",
-            "low_nitrogen": "low-nitrogen",
-            "balanced": "balanced",
-            "no": "no",
-            "organic": "organic",
-        }
-        return mapping[self.value]
\ No newline at end of file
+        return FERTILIZATION_DB_VALUES[self.value]
+
+
+# Database values per enum value, built once and not on every access of map_db_value
+FERTILIZATION_DB_VALUES = {
+    "acidic": "acidic",
+    "low_nitrogen": "low-nitrogen",
+    "balanced": "balanced",
+    "no": "no",
+    "organic": "organic",
+}
@@ -11,4 +11,8 @@ class Label(str, Enum):
 
 class Algorithm(str, Enum):
     bm25 = "bm25"
-    sbert = "sbert"
\ No newline at end of file
+    sbert = "sbert"
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
@@ -13,11 +13,14 @@ class Soil(str, Enum):
     # To have same format for white spaces everywhere
     @property
     def map_db_value(self) -> str:
-        mapping = {
-            "well_drained": "well-drained",
-            "sandy": "sandy",
-            "moist":"moist",
-            "loamy": "loamy",
-            "acidic": "acidic"
-        }
-        return mapping[self.value]
\ No newline at end of file
+        return SOIL_DB_VALUES[self.value]
+
+
+# Database values per enum value, built once and not on every access of map_db_value
+SOIL_DB_VALUES = {
+    "well_drained": "well-drained",
+    "sandy": "sandy",
+    "moist":"moist",
+    "loamy": "loamy",
+    "acidic": "acidic"
+}
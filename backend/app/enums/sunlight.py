@@ -11,9 +11,12 @@ class SunLight(str, Enum):
     # Mapping to avoid whitespace in query
     @property
     def map_db_value(self) -> str:
-        mapping = {
-            "full_sunlight": "full sunlight",
-            "indirect_sunlight": "indirect sunlight",
-            "partial_sunlight": "partial sunlight"
-        }
-        return mapping[self.value]
\ No newline at end of file
+        return SUNLIGHT_DB_VALUES[self.value]
+
+
+# Database values per enum value, built once and not on every access of map_db_value
+SUNLIGHT_DB_VALUES = {
+    "full_sunlight": "full sunlight",
+    "indirect_sunlight": "indirect sunlight",
+    "partial_sunlight": "partial sunlight"
+}
@@ -17,16 +17,19 @@ class Watering(str, Enum):
     # Mapping to avoid whitespace in query
     @property
     def map_db_value(self) -> list[str]:
-        mapping = {
-            "consistently_moist": ["keep soil consistently moist"],
-            "evenly_moist": ["keep soil evenly moist"],
-            "moist": ["keep soil moist"],
-            "slightly_moist": ["keep soil slightly moist"],
-            "water_when_dry": ["let soil dry between watering", "water when soil feels dry",
-                               "water when soil is dry", "water when topsoil is dry"],
-            "regular": ["regular watering"],
-            "regular_moist": ["regular, moist soil"],
-            "regular_well_drained": ["regular, well-drained soil"],
-            "weekly": ["water weekly"]
-        }
-        return mapping[self.value]
\ No newline at end of file
+        return WATERING_DB_VALUES[self.value]
+
+
+# Database values per enum value, built once and not on every access of map_db_value
+WATERING_DB_VALUES = {
+    "consistently_moist": ["keep soil consistently moist"],
+    "evenly_moist": ["keep soil evenly moist"],
+    "moist": ["keep soil moist"],
+    "slightly_moist": ["keep soil slightly moist"],
+    "water_when_dry": ["let soil dry between watering", "water when soil feels dry",
+                       "water when soil is dry", "water when topsoil is dry"],
+    "regular": ["regular watering"],
+    "regular_moist": ["regular, moist soil"],
+    "regular_well_drained": ["regular, well-drained soil"],
+    "weekly": ["water weekly"]
+}
@@ -1,23 +1,68 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
-from .database.database import SessionLocal, engine, Base
-from .routers import plants_router, question_router, recommendations_router, user_study_router
-from .services import store_csv_entries_to_db, store_questions_to_db, store_answer_options_to_db
+from .database.database import SessionLocal, engine
+from .database.migrations import migrate
+from .database.write_behind import write_behind_queue
+from .recommender.BM25 import bm25_registry
+from .recommender.SBERT import sbert_registry
+from .routers import plants_router, question_router, recommendations_router, user_study_router, monitoring_router, \
+    health_router, metrics_router
+from .services import store_csv_entries_to_db, store_questions_to_db, store_answer_options_to_db, question_registry, \
+    plant_catalog_cache, plant_filter_index, plant_name_index, plant_like_counter
+from .services.timing import ServerTimingMiddleware
+from .startup import startup_warm_up
 
 
-# For loading data to the database once upon startup
+# For loading data to the database once upon startup, every phase is timed (see /health/ready)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    startup_warm_up.begin()
+
+    # Creating the tables, or upgrading an existing database to the current schema
+    with startup_warm_up.phase("migrations"):
+        migrate(engine=engine)
+
     db = SessionLocal()
     try:
-        store_csv_entries_to_db(db=db)
-        store_questions_to_db(db=db)
-        store_answer_options_to_db(db=db)
+        with startup_warm_up.phase("dataset"):
+            store_csv_entries_to_db(db=db)
+            store_questions_to_db(db=db)
+            store_answer_options_to_db(db=db)
+
+        # Questions and answer options are reference data, loaded once and served from memory
+        with startup_warm_up.phase("questions"):
+            question_registry.build(db=db)
+
+        # The plant catalog is served as pre-serialized JSON pages, rebuilt if the plants change
+        with startup_warm_up.phase("plant_catalog"):
+            plant_catalog_cache.build(db=db)
+
+        # Name search (trigram index) and filters (bitsets per option) of the plants run in memory
+        with startup_warm_up.phase("plant_indexes"):
+            plant_name_index.build(db=db)
+            plant_filter_index.build(db=db)
+
+        # Building the BM25 index once, rebuilt in the background if the plants change
+        with startup_warm_up.phase("bm25_index"):
+            bm25_registry.build(db=db)
     finally:
         db.close()
+
+    # Loading the SBERT model (torch) and encoding the plant corpus, then a synthetic query through each
+    # recommender, in the background. The app reports ready (/health/ready) once this is done
+    startup_warm_up.warm_up()
     yield
 
+    # No further warm-up attempts after shutdown started
+    startup_warm_up.close()
+
+    # Storing the queued answers and recommendations and the likes counted in memory before stopping
+    write_behind_queue.close()
+    plant_like_counter.close()
+    bm25_registry.wait_for_rebuild()
+    sbert_registry.close()
+
 app = FastAPI(title="Air Project API",
               description="Welcome to our Plant API",
               version="1.0.0",
@@ -33,10 +78,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing"],
 )
 
-# This could be commented out, it is needed only once for creating the tables
-Base.metadata.create_all(bind=engine)
+# Timing of the requests and their stages: Server-Timing header and the histograms of /metrics
+app.add_middleware(ServerTimingMiddleware)
 
 app.include_router(plants_router)
 
@@ -45,3 +91,9 @@ app.include_router(question_router)
 app.include_router(recommendations_router)
 
 app.include_router(user_study_router)
+
+app.include_router(monitoring_router)
+
+app.include_router(health_router)
+
+app.include_router(metrics_router)
@@ -20,4 +20,4 @@ class Bm25Metadata(Base):
     match_count = Column(Integer)
     match_ratio = Column(Float)
 
-    recommendation_id = Column(Integer, ForeignKey("recommendation.id"))
+    recommendation_id = Column(Integer, ForeignKey("recommendation.id"), index=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Enum
+from sqlalchemy import Column, Integer, ForeignKey, Enum, orm
 from ..database.database import Base
 from ..enums import Algorithm
 from ..enums.recommendation import Label
@@ -16,4 +16,8 @@ class Recommendation(Base):
     algorithm = Column(Enum(Algorithm))
 
     plant_id = Column(Integer, ForeignKey("plants.id"))
-    submission_id = Column(Integer, ForeignKey("user_submission.id"))
+    submission_id = Column(Integer, ForeignKey("user_submission.id"), index=True)
+
+    plant = orm.relationship("Plant")
+    bm25_metadata = orm.relationship("Bm25Metadata", uselist=False)
+    sbert_metadata = orm.relationship("SbertMetadata", uselist=False)
@@ -18,4 +18,4 @@ class SbertMetadata(Base):
     cosine_distance = Column(Float)
     gap_to_best = Column(Float)
 
-    recommendation_id = Column(Integer, ForeignKey("recommendation.id"))
\ No newline at end of file
+    recommendation_id = Column(Integer, ForeignKey("recommendation.id"), index=True)
\ No newline at end of file
@@ -8,6 +8,7 @@ class UserPlantLike(Base):
     __tablename__ = "user_plant_like"
 
     id = Column(Integer, primary_key=True, index=True)
-    like_counter = Column(Integer)
+    like_counter = Column(Integer, index=True)
 
-    plant_id = Column(Integer, ForeignKey("plants.id"))
\ No newline at end of file
+    # One row per plant, likes are counted with an upsert on plant_id
+    plant_id = Column(Integer, ForeignKey("plants.id"), index=True, unique=True)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, String
+from sqlalchemy import Column, Integer, DateTime, String, orm
 from ..database.database import Base
 
 """ -----------------------------------------------------------------------------------------------
@@ -13,4 +13,7 @@ class UserSubmission(Base):
     id = Column(Integer, primary_key=True, index=True)
     free_text = Column(String(300))
     created_at = Column(DateTime)
-    rating = Column(Integer)
\ No newline at end of file
+    rating = Column(Integer)
+
+    recommendations = orm.relationship("Recommendation", order_by="Recommendation.id")
+    user_answers = orm.relationship("UserAnswer", order_by="UserAnswer.id")
@@ -1,4 +1,7 @@
 from .bm25_mappings import DB_ANSWER_MAPPING_GROWTH, DB_ANSWER_MAPPING_FERTILIZER, DB_ANSWER_MAPPING_SUN, \
                           DB_ANSWER_MAPPING_SOIL, DB_ANSWER_MAPPING_WATER
 
+from .bm25_matrix import SparseBM25
+from .bm25_inverted_index import BM25InvertedIndex
+from .bm25_registry import BM25Registry, BM25Snapshot, bm25_registry
 from .bm25_recommender import BM25Recommender
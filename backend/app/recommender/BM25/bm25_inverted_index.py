@@ -0,0 +1,207 @@
+import os
+import numpy as np
+from app.recommender.BM25.bm25_matrix import SparseBM25
+from app.recommender.score_metadata import ScoreMetadata, PartialScoreMetadata
+
+# "exhaustive" scores every document per query (reference mode), "inverted" uses the posting lists below
+RETRIEVAL_MODE = os.getenv("BM25_RETRIEVAL_MODE", "exhaustive")
+
+# Slack for float rounding, sums of the same weights in a different order may differ in the last bits
+PRUNING_SLACK = 1e-9
+
+# Number of documents the good fits and mismatches are drawn from in inverted mode (all, if the catalog is smaller)
+BAND_SAMPLE_SIZE = 4096
+
+""" -----------------------------------------------------------------------------------------------
+ Inverted index over the BM25 term weights of SparseBM25 (see bm25_matrix.py). One posting list per
+ integer term id: the ids of the documents containing the term (sorted) and their BM25 weights,
+ plus the largest weight of the list as upper bound of what the term can add to any score.
+
+ Two separate paths per query:
+
+ 1) Top-k (perfect fits) with MaxScore early termination, vectorized with numpy:
+    The k-th best score of the band sample (path 2) is a lower bound of the k-th best score in the
+    catalog. The query terms with the smallest upper bounds, which together stay below that bound,
+    are non-essential: a document that contains none of the other (essential) terms can't make it
+    into the top-k. Only the posting lists of the essential terms are merged into candidates, the
+    non-essential lists are probed with binary search for the candidates (strongest first), and
+    after every step the candidates that can't reach the k-th best score anymore are dropped.
+    Documents that are dropped or never seen score lower than the k-th best, so the result is
+    exact, including rank and percentile of the top documents (see PartialScoreMetadata). The work
+    depends on the posting lists of the essential terms instead of the whole catalog. If the
+    shortcut does not apply (negative weights, or less than k documents with a positive score)
+    every document is scored.
+
+ 2) Percentile bands (good fits, mismatches): the percentile thresholds depend on the score of
+    every document, which is what the top-k path avoids. Instead of the full catalog a fixed
+    uniform sample of BAND_SAMPLE_SIZE documents is scored (one sparse product over the sample
+    rows), the band thresholds are estimated from it and the good fits / mismatches are drawn from
+    the sampled documents within the band. Cost O(BAND_SAMPLE_SIZE) instead of O(number of plants),
+    exact as long as the catalog is not larger than the sample. Percentile and rank of these plants
+    are estimates from the sample (the rank is scaled up to the catalog size).
+
+ Benchmark of both paths against exhaustive scoring: python -m app.scripts.benchmark_bm25_retrieval
+ With 1M plants the top-k path is ~10x faster than exhaustive scoring if the query has selective
+ terms, and the band path ~30x. With the questionnaire terms alone (each in 20-50% of the plants)
+ pruning can't skip much and the top-k path is not faster, those queries are answered from the
+ precomputed score table anyway (see bm25_score_table.py).
+----------------------------------------------------------------------------------------------- """
+class BM25InvertedIndex:
+    def __init__(self, bm25: SparseBM25, band_sample_size: int = BAND_SAMPLE_SIZE):
+        self.bm25 = bm25
+        self.num_documents = bm25.corpus_size
+
+        # Column-wise copy of the weights, column t is the posting list of term t (doc ids sorted)
+        postings = bm25.matrix.tocsc()
+        postings.sort_indices()
+        self.pointers = postings.indptr
+        self.doc_ids = postings.indices.astype(np.int64)
+        self.weights = postings.data
+
+        num_terms = len(self.pointers) - 1
+        lengths = np.diff(self.pointers)
+        non_empty = lengths > 0
+        self.max_weights = np.zeros(num_terms)
+        self.min_weights = np.zeros(num_terms)
+        self.max_weights[non_empty] = np.maximum.reduceat(self.weights, self.pointers[:-1][non_empty])
+        self.min_weights[non_empty] = np.minimum.reduceat(self.weights, self.pointers[:-1][non_empty])
+
+        self.band_sample = self._draw_band_sample(band_sample_size)
+
+    def _draw_band_sample(self, band_sample_size: int) -> np.ndarray:
+        if self.num_documents <= band_sample_size:
+            return np.arange(self.num_documents)
+
+        rng = np.random.default_rng(42)
+        return np.sort(rng.choice(self.num_documents, size=band_sample_size, replace=False))
+
+    def _posting_list(self, term_id: int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self.pointers[term_id], self.pointers[term_id + 1]
+        return self.doc_ids[start:end], self.weights[start:end]
+
+    # Query terms as (term id, count in query), unknown terms are ignored like in the matrix engine
+    def _query_terms(self, tokenized_query) -> list[tuple[int, float]]:
+        counts: dict[int, float] = {}
+        for term in tokenized_query:
+            term_id = self.bm25.vocabulary.get(term)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0.0) + 1.0
+        return list(counts.items())
+
+    # Reference path: every document is scored
+    def _exhaustive_top_k(self, tokenized_query, k: int) -> tuple[list[int], ScoreMetadata]:
+        scores = self.bm25.get_scores(tokenized_query)
+        return scores.argsort()[::-1][:k].tolist(), ScoreMetadata(scores)
+
+    # Smallest score over all documents: 0 if some document contains none of the query terms
+    def _minimum_score(self, tokenized_query, terms: list[tuple[int, float]], sample_scores: np.ndarray) -> float:
+        if len(sample_scores) and sample_scores.min() <= 0:
+            return 0.0
+
+        sum_of_lengths = sum(int(self.pointers[term_id + 1] - self.pointers[term_id]) for term_id, _ in terms)
+        if sum_of_lengths < self.num_documents:
+            return 0.0
+
+        covered = np.zeros(self.num_documents, dtype=bool)
+        for term_id, _ in terms:
+            covered[self._posting_list(term_id)[0]] = True
+
+        # Rare case, every document contains at least one of the terms
+        if covered.all():
+            return float(self.bm25.get_scores(tokenized_query).min())
+        return 0.0
+
+    """ -------------------------------------------------------------------------------------------
+     Path 1: indices of the k best documents (best first) and exact metadata for them. The scores
+     of the band sample (path 2) can be passed in, otherwise they are computed here.
+    ------------------------------------------------------------------------------------------- """
+    def top_k(self, tokenized_query, k: int,
+              sample_scores: np.ndarray | None = None) -> tuple[list[int], ScoreMetadata]:
+        terms = self._query_terms(tokenized_query)
+
+        if k <= 0 or not terms or any(self.min_weights[term_id] < 0 for term_id, _ in terms):
+            return self._exhaustive_top_k(tokenized_query, k)
+
+        if sample_scores is None:
+            sample_scores = self.bm25.get_scores_for_rows(tokenized_query, self.band_sample)
+
+        # The k-th best score of the sample is a lower bound for the k-th best score of the catalog
+        threshold = 0.0
+        if len(sample_scores) >= k:
+            threshold = float(np.partition(sample_scores, len(sample_scores) - k)[len(sample_scores) - k])
+
+        # Weakest terms first, upper bound = the most a term can add to a score
+        terms.sort(key=lambda term: self.max_weights[term[0]] * term[1])
+        upper_bounds = [float(self.max_weights[term_id] * count) for term_id, count in terms]
+
+        # Non-essential terms: together they can't reach the threshold, a document needs an essential term
+        num_non_essential, non_essential_bound = 0, 0.0
+        while (num_non_essential < len(terms) - 1
+               and non_essential_bound + upper_bounds[num_non_essential] < threshold - PRUNING_SLACK):
+            non_essential_bound += upper_bounds[num_non_essential]
+            num_non_essential += 1
+
+        # Candidates are the documents of the essential posting lists (scores of documents in several are summed)
+        essential = terms[num_non_essential:]
+        postings = [self._posting_list(term_id) for term_id, _ in essential]
+        candidates, positions = np.unique(np.concatenate([doc_ids for doc_ids, _ in postings]), return_inverse=True)
+        candidate_scores = np.bincount(positions,
+                                       weights=np.concatenate([weights * count for (_, weights), (_, count)
+                                                               in zip(postings, essential)]),
+                                       minlength=len(candidates))
+
+        # Probing the non-essential lists for the candidates only, strongest first, dropping hopeless candidates
+        remaining_bound = non_essential_bound
+        for index in range(num_non_essential - 1, -1, -1):
+            threshold = self._prune_threshold(candidate_scores, k, threshold)
+            keep = candidate_scores >= threshold - PRUNING_SLACK - remaining_bound
+            candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+
+            term_id, count = terms[index]
+            remaining_bound -= upper_bounds[index]
+            doc_ids, weights = self._posting_list(term_id)
+
+            positions = np.searchsorted(doc_ids, candidates)
+            positions[positions == len(doc_ids)] = 0
+            found = doc_ids[positions] == candidates
+            candidate_scores[found] += weights[positions[found]] * count
+
+        threshold = self._prune_threshold(candidate_scores, k, threshold)
+        keep = candidate_scores >= threshold - PRUNING_SLACK
+        candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+
+        if len(candidates) < k or threshold <= 0:
+            # Less than k documents with a positive score, every document is needed for the order of the rest
+            return self._exhaustive_top_k(tokenized_query, k)
+
+        # Best first, ties with the higher index first (like a stable argsort()[::-1])
+        order = np.lexsort((-candidates, -candidate_scores))
+        top_indices = candidates[order[:k]].tolist()
+
+        metadata = PartialScoreMetadata(indices=candidates,
+                                        scores=candidate_scores,
+                                        population_size=self.num_documents,
+                                        minimum=self._minimum_score(tokenized_query, terms, sample_scores))
+        return top_indices, metadata
+
+    # k-th best (partial) score of the candidates, never lower than the threshold known so far
+    @staticmethod
+    def _prune_threshold(candidate_scores: np.ndarray, k: int, threshold: float) -> float:
+        if len(candidate_scores) < k:
+            return threshold
+
+        kth_best = np.partition(candidate_scores, len(candidate_scores) - k)[len(candidate_scores) - k]
+        return max(threshold, float(kth_best))
+
+    """ -------------------------------------------------------------------------------------------
+     Path 2: scores of the band sample, the good fits and mismatches are chosen from these rows.
+     Returns the sampled document indices and the metadata over their scores.
+    ------------------------------------------------------------------------------------------- """
+    def band_scores(self, tokenized_query) -> tuple[np.ndarray, ScoreMetadata]:
+        scores = self.bm25.get_scores_for_rows(tokenized_query, self.band_sample)
+        return self.band_sample, ScoreMetadata(scores, population_size=self.num_documents)
+
+    @property
+    def memory_bytes(self) -> int:
+        return int(self.pointers.nbytes + self.doc_ids.nbytes + self.weights.nbytes
+                   + self.max_weights.nbytes + self.min_weights.nbytes + self.band_sample.nbytes)
@@ -0,0 +1,102 @@
+import math
+from collections import Counter
+import numpy as np
+from scipy import sparse
+
+""" -----------------------------------------------------------------------------------------------
+ BM25 scoring engine on a sparse document-term matrix, same formula and parameters as
+ rank_bm25.BM25Okapi (ATIRE idf with an epsilon floor for terms in more than half of the documents).
+ The BM25 weight of every (document, term) pair only depends on the corpus, so it is precomputed
+ once and stored as SciPy CSR matrix (one row per document, one column per term):
+
+     weight(d, t) = idf(t) * f(t, d) * (k1 + 1) / (f(t, d) + k1 * (1 - b + b * |d| / avgdl))
+
+ Scoring a query is then one sparse matrix-vector product with the term counts of the query (a
+ term that appears twice in the query counts twice, like in BM25Okapi). Unknown terms are ignored.
+ A batch of queries is scored with one sparse matrix-matrix product.
+----------------------------------------------------------------------------------------------- """
+class SparseBM25:
+    def __init__(self, tokenized_corpus, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.corpus_size = len(tokenized_corpus)
+
+        self.vocabulary: dict[str, int] = {}
+        self.idf = self._build(tokenized_corpus)
+
+    def _build(self, tokenized_corpus) -> np.ndarray:
+        rows, columns, frequencies = [], [], []
+        doc_len = np.zeros(self.corpus_size, dtype=np.float64)
+
+        for doc_id, document in enumerate(tokenized_corpus):
+            doc_len[doc_id] = len(document)
+            for term, frequency in Counter(document).items():
+                rows.append(doc_id)
+                columns.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                frequencies.append(frequency)
+
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+
+        # Document frequency per term, every (document, term) pair is there only once
+        document_frequency = np.bincount(columns, minlength=len(self.vocabulary)).astype(np.float64)
+        idf = self._calc_idf(document_frequency)
+
+        avgdl = doc_len.sum() / self.corpus_size if self.corpus_size else 0.0
+        length_norm = self.k1 * (1 - self.b + self.b * doc_len[rows] / avgdl) if avgdl else np.zeros(len(rows))
+        weights = idf[columns] * frequencies * (self.k1 + 1) / (frequencies + length_norm)
+
+        self.doc_len = doc_len
+        self.avgdl = avgdl
+        self.matrix = sparse.csr_matrix((weights, (rows, columns)),
+                                        shape=(self.corpus_size, len(self.vocabulary)))
+        return idf
+
+    # Same as BM25Okapi._calc_idf: negative idf values are replaced by epsilon * average idf
+    def _calc_idf(self, document_frequency: np.ndarray) -> np.ndarray:
+        if len(document_frequency) == 0:
+            return document_frequency
+
+        idf = (np.log(self.corpus_size - document_frequency + 0.5) - np.log(document_frequency + 0.5))
+        average_idf = math.fsum(idf.tolist()) / len(idf)
+        idf[idf < 0] = self.epsilon * average_idf
+        return idf
+
+    # Sparse term count matrix of the queries (one row per query)
+    def query_matrix(self, tokenized_queries) -> sparse.csr_matrix:
+        rows, columns = [], []
+        for query_id, query in enumerate(tokenized_queries):
+            for term in query:
+                term_id = self.vocabulary.get(term)
+                if term_id is not None:
+                    rows.append(query_id)
+                    columns.append(term_id)
+
+        counts = np.ones(len(rows), dtype=np.float64)
+        # Duplicate (query, term) entries are summed up by scipy, which gives the term counts
+        return sparse.csr_matrix((counts, (rows, columns)), shape=(len(tokenized_queries), len(self.vocabulary)))
+
+    # Dense term count vector of one query
+    def query_vector(self, tokenized_query) -> np.ndarray:
+        return self.query_matrix([tokenized_query]).toarray().ravel()
+
+    # Scores of one query against all documents, drop-in replacement of BM25Okapi.get_scores
+    def get_scores(self, tokenized_query) -> np.ndarray:
+        return self.matrix @ self.query_vector(tokenized_query)
+
+    # Scores of one query against the given documents only (rows of the matrix)
+    def get_scores_for_rows(self, tokenized_query, rows: np.ndarray) -> np.ndarray:
+        return self.matrix[rows] @ self.query_vector(tokenized_query)
+
+    # Scores of many queries at once, one row per query and one column per document
+    def get_batch_scores(self, tokenized_queries) -> np.ndarray:
+        if len(tokenized_queries) == 0:
+            return np.zeros((0, self.corpus_size))
+
+        return (self.query_matrix(tokenized_queries) @ self.matrix.T).toarray()
+
+    @property
+    def memory_bytes(self) -> int:
+        return int(self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes)
@@ -2,98 +2,133 @@ import numpy as np
 from sqlalchemy.orm import Session
 from app.schemas import UserAnswerSubmission, PlantRecommendation
 from app.recommender.BM25 import bm25_service
-from rank_bm25 import BM25Okapi
+from app.recommender.BM25.bm25_registry import BM25Registry, bm25_registry
+from app.recommender.score_metadata import ScoreMetadata
+from app.services.timing import span
 
 PADDING = 5
 
 """ -----------------------------------------------------------------------------------------------
  Class that represents the recommender algorithm BM25. The Implementation is based on the library
- documentation https://pypi.org/project/rank-bm25/. 
- Upon initialization, the preprocessing part of the BM25 algorithm is executed. A document corpus
- is created based on the plant entries in the database and an instance of the algorithm is created.
+ documentation https://pypi.org/project/rank-bm25/, the scores are computed by an equivalent sparse
+ matrix engine (see bm25_matrix.py). 
+ The preprocessing part of the BM25 algorithm is executed once upon startup (see bm25_registry.py):
+ A document corpus is created based on the plant entries in the database and an instance of the
+ algorithm is created. Every request only reads from that shared instance.
+ Retrieval per request: a precomputed result table for the questionnaire answers (see
+ bm25_score_table.py), otherwise all plants are scored (BM25_RETRIEVAL_MODE=exhaustive) or the
+ inverted index with top-k pruning is used (BM25_RETRIEVAL_MODE=inverted, see bm25_inverted_index.py).
  
  BM25 is implementing lexical search, where a query is compared against a document (in our case, 
  the plants in the database. Each row is one document). 
  For more information, see https://huggingface.co/blog/xhluca/bm25s.
 ----------------------------------------------------------------------------------------------- """
 class BM25Recommender:
-    def __init__(self, db: Session, submission_id: int):
+    def __init__(self, db: Session, submission_id: int, registry: BM25Registry = bm25_registry):
         self.submission_id = submission_id
         self.db = db
-        self.corpus = self._create_plant_corpus()
-        self.tokenized_corpus = self._tokenize_corpus()
-        self.bm25 = self._create_bm25_instance()
-
-    # make corpus based on dataset
-    def _create_plant_corpus(self):
-        return bm25_service.create_plant_corpus(db=self.db)
-
-    # tokenizing the corpus
-    def _tokenize_corpus(self):
-        return [doc.split(" ") for doc in self.corpus]
-
-    # we use the imported BM25 algorithm
-    def _create_bm25_instance(self):
-        return BM25Okapi(self.tokenized_corpus)
+        self.registry = registry
 
+        # The corpus and the BM25 instance are built once and shared by all requests, see bm25_registry.py
+        with span("bm25.snapshot"):
+            snapshot = self.registry.get(db=self.db)
+        self.corpus = snapshot.corpus
+        self.tokenized_corpus = snapshot.tokenized_corpus
+        self.bm25 = snapshot.bm25
+        self.score_table = snapshot.score_table
+        self.inverted_index = snapshot.inverted_index
 
     # The recommendation function itself
-    def recommend(self, user_answers: UserAnswerSubmission, num_perfect: int, num_good: int, num_bad: int):
-
-        # creating user query based on user questionnaire
-        user_query = bm25_service.create_query(db=self.db, user_answers=user_answers)
-        tokenized_query = user_query.split(" ")
-
-        # retrieving scores, each entry in the corpus corresponds to a score
-        doc_scores = self.bm25.get_scores(tokenized_query)
-
-        # retrieving the indices together with the corresponding score
-        scores_array = np.array(doc_scores)
-
-        # extract top n perfect fits
-        top_indices = scores_array.argsort()[::-1][:num_perfect + PADDING]
-        perfect_fits = [(self.corpus[i], scores_array[i]) for i in top_indices]
+    def recommend(self, user_answers: UserAnswerSubmission, num_perfect: int, num_good: int, num_bad: int,
+                  store: bool = True):
+
+        with span("bm25.scores"):
+            # The answer combination is looked up in the precomputed table, scored on the fly only if it is not there
+            table_entry = self.score_table.lookup(user_answers) if self.score_table is not None else None
+
+            # band_rows maps positions in the band scores to corpus indices (None: the band scores cover the corpus)
+            band_rows = None
+
+            if table_entry is not None and num_perfect + PADDING <= len(table_entry.top_indices):
+                tokenized_query = table_entry.tokenized_query
+                top_indices = table_entry.top_indices[:num_perfect + PADDING].tolist()
+                perfect_metadata = band_metadata = table_entry.score_metadata
+                good_band = table_entry.bands[bm25_service.GOOD_FITS_PERCENTILES]
+                bad_band = table_entry.bands[bm25_service.MISMATCH_PERCENTILES]
+            else:
+                # creating user query based on user questionnaire
+                user_query = bm25_service.create_query(db=self.db, user_answers=user_answers)
+                tokenized_query = user_query.split(" ")
+
+                if self.inverted_index is not None:
+                    # Two separate paths, see bm25_inverted_index.py: pruned top-k, bands from a sample of the catalog
+                    band_rows, band_metadata = self.inverted_index.band_scores(tokenized_query)
+                    band_scores = band_metadata.scores
+                    top_indices, perfect_metadata = self.inverted_index.top_k(tokenized_query,
+                                                                              k=num_perfect + PADDING,
+                                                                              sample_scores=band_scores)
+                else:
+                    # retrieving scores, each entry in the corpus corresponds to a score
+                    band_scores = self.bm25.get_scores(tokenized_query)
+
+                    # metadata is computed from one sorted copy of the scores
+                    perfect_metadata = band_metadata = ScoreMetadata(band_scores)
+
+                    # extract top n perfect fits
+                    top_indices = band_scores.argsort()[::-1][:num_perfect + PADDING].tolist()
+
+                # candidates for good fits (70-90 percentile) and bad fits (5-20 percentile)
+                good_min_p, good_max_p = bm25_service.GOOD_FITS_PERCENTILES
+                good_band = bm25_service.get_percentile_band(scores=band_scores, min_p=good_min_p, max_p=good_max_p)
+
+                bad_min_p, bad_max_p = bm25_service.MISMATCH_PERCENTILES
+                bad_band = bm25_service.get_percentile_band(scores=band_scores, min_p=bad_min_p, max_p=bad_max_p)
 
         plants_results = bm25_service.get_plant_based_on_bm25_document(db=self.db,
-                                                                       results=perfect_fits,
+                                                                       indices=top_indices,
+                                                                       corpus=self.corpus,
                                                                        max_results=num_perfect,
-                                                                       all_scores=doc_scores,
-                                                                       tokenized_query=tokenized_query,
-                                                                       submission_id=self.submission_id,
-                                                                       label="perfect")
-
-        # extract top n good fits (70-90 percentile)
-        good_fits = bm25_service.get_fits_in_percentile(scores=doc_scores,
-                                                        dataset_corpus=self.corpus,
-                                                        n=num_good + PADDING,
-                                                        min_p=70,
-                                                        max_p=90)
+                                                                       score_metadata=perfect_metadata,
+                                                                       tokenized_query=tokenized_query)
+
+        # extract top n good fits, randomly sampled from the band on every request
+        good_fits = bm25_service.sample_from_band(candidates=good_band, n=num_good + PADDING)
+        good_indices = self._to_corpus_indices(positions=good_fits, band_rows=band_rows)
 
         good_results = bm25_service.get_plant_based_on_bm25_document(db=self.db,
-                                                                     results=good_fits,
+                                                                     indices=good_indices,
+                                                                     corpus=self.corpus,
                                                                      max_results=num_good,
-                                                                     all_scores=doc_scores,
+                                                                     score_metadata=band_metadata,
                                                                      tokenized_query=tokenized_query,
-                                                                     submission_id=self.submission_id,
-                                                                     label="good")
+                                                                     score_positions=good_fits)
 
-        # extract top n bad fits (5-20 percentile)
-        bad_fits = bm25_service.get_fits_in_percentile(scores=doc_scores,
-                                                       dataset_corpus=self.corpus,
-                                                       n=num_bad + PADDING,
-                                                       min_p=5,
-                                                       max_p=20)
+        # extract top n bad fits, randomly sampled from the band on every request
+        bad_fits = bm25_service.sample_from_band(candidates=bad_band, n=num_bad + PADDING)
+        bad_indices = self._to_corpus_indices(positions=bad_fits, band_rows=band_rows)
 
         bad_results = bm25_service.get_plant_based_on_bm25_document(db=self.db,
-                                                                    results=bad_fits,
+                                                                    indices=bad_indices,
+                                                                    corpus=self.corpus,
                                                                     max_results=num_bad,
-                                                                    all_scores=doc_scores,
+                                                                    score_metadata=band_metadata,
                                                                     tokenized_query=tokenized_query,
-                                                                    submission_id=self.submission_id,
-                                                                    label="mismatch")
+                                                                    score_positions=bad_fits)
+
+        # Storing all recommendations of the submission at once, in one transaction (not for the warm-up upon startup)
+        if store:
+            bm25_service.store_recommendation_and_metadata_to_db(db=self.db,
+                                                                 sub_id=self.submission_id,
+                                                                 recommendations_per_label={"perfect": plants_results,
+                                                                                            "good": good_results,
+                                                                                            "mismatch": bad_results})
 
         return [PlantRecommendation(label="perfect", submission_id=self.submission_id, recommendation=plants_results),
                 PlantRecommendation(label="good", submission_id=self.submission_id, recommendation=good_results),
                 PlantRecommendation(label="mismatch", submission_id=self.submission_id, recommendation=bad_results)]
 
-
+    @staticmethod
+    def _to_corpus_indices(positions: list[int], band_rows: np.ndarray | None) -> list[int]:
+        if band_rows is None:
+            return positions
+        return band_rows[np.asarray(positions, dtype=np.int64)].tolist()
@@ -0,0 +1,141 @@
+import threading
+from dataclasses import dataclass
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.database.plant_events import on_plants_changed
+from app.recommender.BM25 import bm25_service
+from app.recommender.BM25.bm25_matrix import SparseBM25
+from app.recommender.BM25.bm25_inverted_index import BM25InvertedIndex, RETRIEVAL_MODE
+from app.recommender.BM25.bm25_score_table import BM25ScoreTable, SCORE_TABLE_ENABLED
+
+""" -----------------------------------------------------------------------------------------------
+ Immutable view on everything the BM25 recommender needs for answering a query: the plant corpus
+ (one document per plant), the tokenized corpus and the sparse BM25 scoring engine built from it
+ (see bm25_matrix.py). score_table holds the precomputed results of all answer combinations of
+ the questionnaire (see bm25_score_table.py), None if disabled or too large. inverted_index holds
+ the posting lists for the inverted retrieval mode (see bm25_inverted_index.py), None otherwise.
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class BM25Snapshot:
+    corpus: tuple[str, ...]
+    tokenized_corpus: tuple[list[str], ...]
+    bm25: SparseBM25
+    score_table: BM25ScoreTable | None
+    inverted_index: BM25InvertedIndex | None
+
+
+""" -----------------------------------------------------------------------------------------------
+ Process-wide holder of the BM25 index, same idea as the SBERT registry (see sbert_registry.py).
+ It is built once upon startup (see lifespan in main.py), every request only reads from it.
+ Readers never lock: they grab the current snapshot, which is replaced as a whole and never
+ mutated. Only building takes the lock, so a rebuild never runs twice at the same time.
+ If the plants table changes, a rebuild runs in a background thread with its own session. Until
+ it is done, requests keep using the previous snapshot, afterwards the new one is swapped in.
+ Changes during a running rebuild trigger exactly one more rebuild afterwards.
+----------------------------------------------------------------------------------------------- """
+class BM25Registry:
+    def __init__(self, session_factory=SessionLocal, score_table_enabled: bool = SCORE_TABLE_ENABLED,
+                 retrieval_mode: str = RETRIEVAL_MODE):
+        if retrieval_mode not in ("exhaustive", "inverted"):
+            raise ValueError(f"Unknown BM25 retrieval mode: {retrieval_mode}")
+
+        self.session_factory = session_factory
+        self.score_table_enabled = score_table_enabled
+        self.retrieval_mode = retrieval_mode
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._snapshot: BM25Snapshot | None = None
+        self._rebuild_thread: threading.Thread | None = None
+        self._rebuild_pending = False
+
+    # Corpus, tokenization and the BM25 term weights - is a preprocessing step
+    def _build(self, db: Session) -> BM25Snapshot:
+        corpus = tuple(bm25_service.create_plant_corpus(db=db))
+        tokenized_corpus = tuple(doc.split(" ") for doc in corpus)
+        bm25 = SparseBM25(tokenized_corpus)
+        score_table = BM25ScoreTable.build(db=db, bm25=bm25) if self.score_table_enabled else None
+        inverted_index = BM25InvertedIndex(bm25) if self.retrieval_mode == "inverted" else None
+
+        snapshot = BM25Snapshot(corpus=corpus,
+                                tokenized_corpus=tokenized_corpus,
+                                bm25=bm25,
+                                score_table=score_table,
+                                inverted_index=inverted_index)
+        self._snapshot = snapshot
+        return snapshot
+
+    # (Re-)builds the snapshot, called upon startup
+    def build(self, db: Session) -> BM25Snapshot:
+        with self._lock:
+            return self._build(db=db)
+
+    # Returns the current snapshot, builds it lazily if startup did not happen
+    def get(self, db: Session) -> BM25Snapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            return snapshot if snapshot is not None else self._build(db=db)
+
+    # Hook for changes of the plants table, rebuilds in the background (coalesced, one thread at a time)
+    def schedule_rebuild(self):
+        # Nothing was built yet, the first reader builds the current catalog anyway
+        if self._snapshot is None:
+            return
+
+        with self._rebuild_lock:
+            self._rebuild_pending = True
+            if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+                return
+
+            self._rebuild_thread = threading.Thread(target=self._run_rebuilds, name="bm25-rebuild", daemon=True)
+            self._rebuild_thread.start()
+
+    def _run_rebuilds(self):
+        while True:
+            with self._rebuild_lock:
+                if not self._rebuild_pending:
+                    self._rebuild_thread = None
+                    return
+                self._rebuild_pending = False
+
+            db = self.session_factory()
+            try:
+                self.build(db=db)
+            finally:
+                db.close()
+
+    # Waits for a running background rebuild, e.g. upon shutdown
+    def wait_for_rebuild(self, timeout: float | None = None):
+        thread = self._rebuild_thread
+        if thread is not None:
+            thread.join(timeout=timeout)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        rebuild_thread = self._rebuild_thread
+        stats = {
+            "built": snapshot is not None,
+            "retrieval_mode": self.retrieval_mode,
+            "rebuild_running": rebuild_thread is not None and rebuild_thread.is_alive(),
+        }
+        if snapshot is None:
+            return stats
+
+        score_table = snapshot.score_table
+        return {
+            **stats,
+            "num_plants": len(snapshot.corpus),
+            "num_terms": len(snapshot.bm25.vocabulary),
+            "matrix_memory_bytes": snapshot.bm25.memory_bytes,
+            "score_table_entries": len(score_table) if score_table is not None else 0,
+            "score_table_memory_bytes": score_table.memory_bytes if score_table is not None else 0,
+            "inverted_index_memory_bytes": (snapshot.inverted_index.memory_bytes
+                                            if snapshot.inverted_index is not None else 0),
+        }
+
+
+bm25_registry = BM25Registry()
+on_plants_changed(bm25_registry.schedule_rebuild)
@@ -0,0 +1,108 @@
+import itertools
+import os
+from dataclasses import dataclass
+import numpy as np
+from sqlalchemy.orm import Session
+from app.recommender.BM25 import bm25_service
+from app.recommender.BM25.bm25_matrix import SparseBM25
+from app.recommender.score_metadata import ScoreMetadata
+from app.schemas import UserAnswerSubmission
+from app.services.question_registry import question_registry
+
+# "1" precomputes the scores of every valid answer combination upon startup, "0" scores per request
+SCORE_TABLE_ENABLED = os.getenv("BM25_SCORE_TABLE", "1") == "1"
+
+# The table grows with (number of combinations x number of plants), above this size it is not built
+SCORE_TABLE_MAX_BYTES = int(os.getenv("BM25_SCORE_TABLE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Number of best documents kept per combination, enough for the max. number of perfect fits + padding
+NUM_TOP_DOCUMENTS = 32
+
+""" -----------------------------------------------------------------------------------------------
+ Everything about one answer combination that does not depend on the request: the query, the
+ scores of all documents, the sorted scores for the metadata, the best documents and the
+ candidates of the percentile bands (good fits, mismatches). Only the random sample out of the
+ bands is drawn per request.
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class BM25TableEntry:
+    tokenized_query: list[str]
+    scores: np.ndarray
+    score_metadata: ScoreMetadata
+    top_indices: np.ndarray
+    bands: dict[tuple[int, int], np.ndarray]
+
+
+""" -----------------------------------------------------------------------------------------------
+ Precomputed BM25 results for the finite answer space of the questionnaire (one answer per
+ question, e.g. 4 * 3 * 6 * 3 * 4 = 864 combinations). All queries are scored with one sparse
+ matrix product (see bm25_matrix.py). Building the query and scoring it per request becomes a
+ dictionary lookup with the answer ids (ordered by question id) as key.
+----------------------------------------------------------------------------------------------- """
+class BM25ScoreTable:
+    def __init__(self, entries: dict[tuple[int, ...], BM25TableEntry], question_ids: tuple[int, ...]):
+        self.entries = entries
+        self.question_ids = question_ids
+
+    # All valid answer combinations with their query terms, based on the questions in the registry
+    @staticmethod
+    def _answer_space(db: Session) -> tuple[tuple[int, ...], list[tuple[tuple[int, ...], list[str]]]]:
+        questions = question_registry.get(db=db).questions
+
+        question_ids = tuple(question.id for question in questions)
+        options_per_question = []
+        for question in questions:
+            options = []
+            for answer in question.answer_option:
+                query_term = bm25_service.create_query_term(plant_type=str(question.type.value),
+                                                            ans_value=str(answer.answer))
+                options.append((answer.id, query_term))
+            options_per_question.append(options)
+
+        combinations = []
+        for combination in itertools.product(*options_per_question):
+            key = tuple(answer_id for answer_id, _ in combination)
+            query = " ".join(term for _, term in combination if term is not None)
+            combinations.append((key, query.split(" ")))
+
+        return question_ids, combinations
+
+    @classmethod
+    def build(cls, db: Session, bm25: SparseBM25, max_bytes: int = SCORE_TABLE_MAX_BYTES):
+        question_ids, combinations = cls._answer_space(db=db)
+
+        # Scores and sorted scores in float64 per combination
+        estimated_bytes = len(combinations) * bm25.corpus_size * 8 * 2
+        if not combinations or estimated_bytes > max_bytes:
+            return None
+
+        all_scores = bm25.get_batch_scores([tokenized_query for _, tokenized_query in combinations])
+        bands = (bm25_service.GOOD_FITS_PERCENTILES, bm25_service.MISMATCH_PERCENTILES)
+
+        entries = {}
+        for (key, tokenized_query), scores in zip(combinations, all_scores):
+            scores.flags.writeable = False
+            entries[key] = BM25TableEntry(
+                tokenized_query=tokenized_query,
+                scores=scores,
+                score_metadata=ScoreMetadata(scores),
+                top_indices=scores.argsort()[::-1][:NUM_TOP_DOCUMENTS],
+                bands={band: bm25_service.get_percentile_band(scores=scores, min_p=band[0], max_p=band[1])
+                       for band in bands})
+
+        return cls(entries=entries, question_ids=question_ids)
+
+    # Entry for the answers of a (validated) questionnaire, None if the combination is unknown
+    def lookup(self, user_answers: UserAnswerSubmission) -> BM25TableEntry | None:
+        answer_ids = {answer.question_id: answer.answer_id for answer in user_answers.answers}
+        key = tuple(answer_ids.get(question_id) for question_id in self.question_ids)
+        return self.entries.get(key)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def memory_bytes(self) -> int:
+        return int(sum(entry.scores.nbytes + entry.score_metadata.sorted_scores.nbytes
+                       + entry.top_indices.nbytes + sum(band.nbytes for band in entry.bands.values())
+                       for entry in self.entries.values()))
@@ -1,11 +1,19 @@
 import random
 import numpy as np
 from sqlalchemy.orm import Session
-from app.models import Plant, Answer, Question, Bm25Metadata, Recommendation
+from app.models import Plant, Bm25Metadata
 from app.schemas import UserAnswerSubmission, Plant as PlantSchema, PlantMetadata
 from .bm25_mappings import DB_ANSWER_MAPPING_GROWTH, DB_ANSWER_MAPPING_WATER, DB_ANSWER_MAPPING_SOIL, \
                       DB_ANSWER_MAPPING_SUN, DB_ANSWER_MAPPING_FERTILIZER
 from app.schemas import RecommendationMetadataBM25
+from app.recommender.recommendation_writer import store_recommendations
+from app.recommender.score_metadata import ScoreMetadata
+from app.services.question_registry import question_registry
+from app.services.timing import timed
+
+# Percentile bands of the score distribution, good fits and mismatches are sampled from
+GOOD_FITS_PERCENTILES = (70, 90)
+MISMATCH_PERCENTILES = (5, 20)
 
 """ -----------------------------------------------------------------------------------------------
  Helper the creates a "corpus" for the BM25 model. This is a preprocessing step. It takes each
@@ -14,7 +22,7 @@ from app.schemas import RecommendationMetadataBM25
  Returns the plant corpus.
 ----------------------------------------------------------------------------------------------- """
 def create_plant_corpus(db: Session) -> list[str]:
-    all_plants = db.query(Plant).all()
+    all_plants = db.query(Plant).order_by(Plant.id).all()
     plant_corpus: list = []
 
     for plant in all_plants:
@@ -35,7 +43,8 @@ def create_plant_corpus(db: Session) -> list[str]:
 
 
 """ -----------------------------------------------------------------------------------------------
- Builds a query based on the user questionnaire. The answers are mapped to the specific db entries.
+ Builds a query based on the user questionnaire. The answers are mapped to the question and answer
+ entries of the question registry.
  "Don't care" answers are ignored, and free text is also ignored here, because BM25 does keyword
  search, and we changed the corpus in regards of customizing it to make entries unique.
  Returns the query as string.
@@ -44,54 +53,71 @@ def create_query(db: Session, user_answers: UserAnswerSubmission) -> str:
 
     user_query: list = []
 
+    questions = question_registry.get(db=db)
+
     for answer in user_answers.answers:
-        question = db.query(Question).filter_by(id=answer.question_id).first()
-        answer = db.query(Answer).filter_by(id=answer.answer_id).first()
+        question = questions.questions_by_id[answer.question_id]
+        answer = questions.answers_by_id[answer.answer_id]
 
-        plant_type = str(question.type.value)
-        ans_value = str(answer.answer)
+        query_term = create_query_term(plant_type=str(question.type.value), ans_value=str(answer.answer))
 
-        if ans_value != "don't care":
-            user_query.append(f"{str(plant_type)}_{str(ans_value)}")
+        if query_term is not None:
+            user_query.append(query_term)
 
     clean_preprocessed_user_query = " ".join(user_query)
 
     return clean_preprocessed_user_query
 
 
+""" -----------------------------------------------------------------------------------------------
+ Maps one answer of the questionnaire to a query term, e.g. "water_low". "Don't care" answers
+ don't add a term (returns None).
+----------------------------------------------------------------------------------------------- """
+def create_query_term(plant_type: str, ans_value: str) -> str | None:
+    if ans_value == "don't care":
+        return None
+
+    return f"{plant_type}_{ans_value}"
+
+
 """ -----------------------------------------------------------------------------------------------
  The BM25 returns the documents that fit the best. This helper method extracts the plant id from
- the documents, and searches for the plants based on this id in the db. It also calculates metadata
- for each recommendation and stores it in the database.
+ the documents (given by their index in the corpus), and searches for the plants based on this id
+ in the db. It also calculates metadata for each recommendation (stored later, together with the
+ other labels, see store_recommendation_and_metadata_to_db).
  Returns list of Plants, which are the base for a Plant recommendation. Plant entries with image
  url are preferred.
 ----------------------------------------------------------------------------------------------- """
+@timed("bm25.plant_lookup")
 def get_plant_based_on_bm25_document(db: Session,
-                                     results: list, max_results: int, all_scores: list,
-                                     tokenized_query: list, submission_id: int, label: str) -> list[PlantMetadata]:
+                                     indices: list, corpus: list, max_results: int, score_metadata: ScoreMetadata,
+                                     tokenized_query: list, score_positions: list | None = None) -> list[PlantMetadata]:
     all_recommendations: list = []
-    final_recommendations: list = []
 
-    ranks = map_scores_to_rank(all_scores=all_scores)
+    # Positions of the documents in the scores of the score metadata, if they are not the corpus indices
+    score_positions = indices if score_positions is None else score_positions
+
+    # Calculate metadata for all documents at once
+    raw_scores = score_metadata.raw(score_positions).tolist()
+    ranks = score_metadata.ranks(score_positions).tolist()
+    scores_norm = score_metadata.normalized(score_positions).tolist()
+    scores_percentile = score_metadata.percentiles(score_positions).tolist()
 
-    for doc in results:
-        doc_text, score = doc[:2]
+    for position, doc_index in enumerate(indices):
+        doc_text = corpus[doc_index]
         plant_id = doc_text.split(" ")[0]
 
         # Get plant from db per id
         plant = db.query(Plant).filter_by(id=plant_id).first()
         plant_schema = PlantSchema.model_validate(plant)
 
-        # Calculate metadata
-        score_norm = calculate_min_max_normalization(all_scores=all_scores, score=score)
-        score_percentile = get_score_percentile(all_scores=all_scores, score=score)
         plant_tokens = doc_text.split()[2:]
         matched, unmatched = get_matched_and_unmatched_terms(query=tokenized_query, document=plant_tokens)
 
-        plant_metadata = RecommendationMetadataBM25(score_raw=round(score, 4),
-                                                    score_normalized=score_norm,
-                                                    score_percentile=score_percentile,
-                                                    rank=ranks[score],
+        plant_metadata = RecommendationMetadataBM25(score_raw=round(raw_scores[position], 4),
+                                                    score_normalized=round(scores_norm[position], 2),
+                                                    score_percentile=round(scores_percentile[position], 3),
+                                                    rank=ranks[position],
                                                     matched_terms=matched,
                                                     unmatched_terms=unmatched,
                                                     max_matches=len(plant_tokens),
@@ -100,17 +126,11 @@ def get_plant_based_on_bm25_document(db: Session,
 
         # Building the recommendation with the plant itself + metadata
         plant_recommendation = PlantMetadata(**plant_schema.model_dump(), metadata=plant_metadata)
-
-        # Preferring those with image present, store metadata in db, return final recommendations
         all_recommendations.append((plant_recommendation, bool(plant.image_url != "")))
-        all_recommendations.sort(key=lambda x: not x[1])
-        final_recommendations = [recom for (recom, img_url) in all_recommendations[:max_results]]
 
-    # Store in db for later use
-    store_recommendation_and_metadata_to_db(db=db,
-                                            sub_id=submission_id,
-                                            label=label,
-                                            recommendations=final_recommendations)
+    # Preferring those with image present (stable sort keeps the score order)
+    all_recommendations.sort(key=lambda x: not x[1])
+    final_recommendations = [recom for (recom, img_url) in all_recommendations[:max_results]]
 
     return final_recommendations
 
@@ -120,70 +140,34 @@ def get_plant_based_on_bm25_document(db: Session,
  For that we take the scores returned by the BM25 (each score corresponds to a plant entry in the
  corpus), and manually choose the percentile of the fit we want to get. Mismatches are in the lowest
  percentiles, moderate/good fits we search in the 70th-90th percentile.
+ Returns the indices of the chosen documents in the corpus.
 ----------------------------------------------------------------------------------------------- """
-def get_fits_in_percentile(scores: list, dataset_corpus: list, n: int, min_p: int, max_p: int) -> list[
-    tuple[str, float]]:
-    p1_threshold = np.percentile(scores, min_p)
-    p2_threshold = np.percentile(scores, max_p)
-
-    candidates = np.where((scores >= p1_threshold) & (scores <= p2_threshold))[0]
-
-    # Necessary because np and array format problems in case there are too little results
-    candidates = np.atleast_1d(candidates).tolist()
-
-    # if more than the requested num of results are found, choose randomly
-    if len(candidates) > n:
-        random_n = random.sample(candidates, k=n)
-    else:
-        random_n = candidates
-
-    # basic search per index
-    good_fits: list[tuple[str, float]] = []
-    for element in random_n:
-        good_fits.append((dataset_corpus[element], scores[element]))
-
-    return good_fits
+def get_fits_in_percentile(scores: np.ndarray, n: int, min_p: int, max_p: int) -> list[int]:
+    candidates = get_percentile_band(scores=scores, min_p=min_p, max_p=max_p)
+    return sample_from_band(candidates=candidates, n=n)
 
 
 """ -----------------------------------------------------------------------------------------------
- Normalizes the raw score for easier comparison. Method Min-Max normalization oriented on:
- https://www.codecademy.com/article/min-max-zscore-normalization
+ The two steps of get_fits_in_percentile: finding all documents with a score between the two
+ percentiles (deterministic, can be precomputed, see bm25_score_table.py), and choosing n of them.
 ----------------------------------------------------------------------------------------------- """
-def calculate_min_max_normalization(all_scores: list, score: float) -> float:
-    minimum = min(all_scores)
-    maximum = max(all_scores)
-
-    normalized_score = (score - minimum) / (maximum - minimum)
-
-    return round(normalized_score, 2)
+def get_percentile_band(scores: np.ndarray, min_p: int, max_p: int) -> np.ndarray:
+    p1_threshold, p2_threshold = np.percentile(scores, [min_p, max_p])
 
+    candidates = np.where((scores >= p1_threshold) & (scores <= p2_threshold))[0]
 
-""" -----------------------------------------------------------------------------------------------
- Maps scores to ranks, returns a dictionary with key value pairs of {score: rank}
------------------------------------------------------------------------------------------------ """
-def map_scores_to_rank(all_scores: list) -> dict[float, int]:
-    sorted_scores = sorted(all_scores, reverse=True)
-
-    score_and_rank = {}
-    rank = 1
-    for score in sorted_scores:
-        if score not in score_and_rank:
-            score_and_rank[score] = rank
-        rank += 1
-
-    return score_and_rank
+    # Necessary because np and array format problems in case there are too little results
+    return np.atleast_1d(candidates)
 
 
-""" -----------------------------------------------------------------------------------------------
- Calculates the percentile position of the score. Eg. if the percentile rank of the current score
- is 0.6, this means that the current score is higher than 60% of all scores in the list
------------------------------------------------------------------------------------------------ """
-def get_score_percentile(all_scores: list, score: float) -> float:
+def sample_from_band(candidates: np.ndarray, n: int) -> list[int]:
+    candidates = candidates.tolist()
 
-    num_scores_below_target = sum(1 for s in all_scores if s < score)
-    percentile_rank = (num_scores_below_target / len(all_scores))
+    # if more than the requested num of results are found, choose randomly (fresh sample per request)
+    if len(candidates) > n:
+        return random.sample(candidates, k=n)
 
-    return round(percentile_rank, 3)
+    return candidates
 
 
 """ -----------------------------------------------------------------------------------------------
@@ -204,53 +188,30 @@ def get_matched_and_unmatched_terms(query: list, document: list) -> tuple[list,
 
 
 """ -----------------------------------------------------------------------------------------------
- Helper for storing recommendation data in database. Returns recommendation id for metadata table.
------------------------------------------------------------------------------------------------ """
-def store_bm25_recommendation_in_db(db: Session, sub_id: int, label: str, plant_id: int) -> int:
-
-    recommendation = Recommendation(label=label,
-                          algorithm="bm25",
-                          plant_id=plant_id,
-                          submission_id=sub_id)
-
-    db.add(recommendation)
-    db.flush()
-    db.commit()
-
-    return recommendation.id
-
-
-""" -----------------------------------------------------------------------------------------------
- Helper for storing metadata of each recommendation in database.
+ Maps the metadata of one recommendation to the columns of the bm25_metadata table.
 ----------------------------------------------------------------------------------------------- """
-def store_bm25_metadata_in_db(db: Session, metadata: RecommendationMetadataBM25, rec_id: int):
-
-    db.add(Bm25Metadata(score_raw=round(metadata.score_raw, 4),
-                        score_norm=metadata.score_normalized,
-                        score_percentile=metadata.score_percentile,
-                        rank=metadata.rank,
-                        matched_terms=str(metadata.matched_terms),
-                        unmatched_terms=str(metadata.unmatched_terms),
-                        max_matches=metadata.max_matches,
-                        match_count=metadata.match_count,
-                        match_ratio=metadata.match_ratio,
-                        recommendation_id=rec_id))
-
-    db.commit()
+def bm25_metadata_row(metadata: RecommendationMetadataBM25) -> dict:
+    return {"score_raw": round(metadata.score_raw, 4),
+            "score_norm": metadata.score_normalized,
+            "score_percentile": metadata.score_percentile,
+            "rank": metadata.rank,
+            "matched_terms": str(metadata.matched_terms),
+            "unmatched_terms": str(metadata.unmatched_terms),
+            "max_matches": metadata.max_matches,
+            "match_count": metadata.match_count,
+            "match_ratio": metadata.match_ratio}
 
 
 """ -----------------------------------------------------------------------------------------------
  Helper for storing both, metadata and recommendation data in the db. Needed because each
- metadata entry corresponds to a recommendation (FK)
+ metadata entry corresponds to a recommendation (FK). All labels of a submission are stored at
+ once, in one transaction (see recommendation_writer.py).
 ----------------------------------------------------------------------------------------------- """
-def store_recommendation_and_metadata_to_db(db: Session, sub_id: int, label: str, recommendations: list) -> None:
-
-    for plant in recommendations:
-        recommendation_id = store_bm25_recommendation_in_db(db=db,
-                                        sub_id=sub_id,
-                                        plant_id=plant.id,
-                                        label=label)
-
-        store_bm25_metadata_in_db(db=db,
-                                  metadata=plant.metadata,
-                                  rec_id=recommendation_id)
+@timed("bm25.store")
+def store_recommendation_and_metadata_to_db(db: Session, sub_id: int, recommendations_per_label: dict):
+    store_recommendations(db=db,
+                          submission_id=sub_id,
+                          algorithm="bm25",
+                          metadata_model=Bm25Metadata,
+                          recommendations_per_label=recommendations_per_label,
+                          metadata_row=bm25_metadata_row)
@@ -1 +1,2 @@
-from .sbert_service import create_text_representation_plants
\ No newline at end of file
+from .sbert_service import create_text_representation_plants
+from .sbert_registry import SBertRegistry, SBertSnapshot, sbert_registry
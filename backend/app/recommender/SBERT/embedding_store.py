@@ -0,0 +1,108 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+from app.recommender.SBERT.vector_index import load_index
+
+EMBEDDING_CACHE_PATH = Path(__file__).parent / "embedding_cache"
+
+""" -----------------------------------------------------------------------------------------------
+ Persistent on-disk store for the corpus embeddings, such that a cold start (or a new uvicorn
+ worker) does not need to encode the whole plant catalog again.
+ Per key two .npy files are stored next to each other: the embedding matrix (one row per plant)
+ and the plant ids in the same order. The embeddings are loaded memory mapped, so all workers on
+ one machine share the same pages of the OS page cache.
+ The key combines the model name and a hash of the text representation of the plants, changing
+ the text of a single plant results in a different key, which triggers a rebuild automatically.
+----------------------------------------------------------------------------------------------- """
+class EmbeddingStore:
+    def __init__(self, path: Path = EMBEDDING_CACHE_PATH):
+        self.path = path
+
+    # Key of the cache entry, plant ids are part of the hash, because the row order matters
+    @staticmethod
+    def make_key(model_name: str, plants_text_tuples: list[tuple[int, str]]) -> str:
+        corpus_hash = hashlib.sha256()
+        for plant_id, text in plants_text_tuples:
+            corpus_hash.update(f"{plant_id}\t{text}\n".encode("utf-8"))
+
+        model_slug = model_name.replace("/", "--")
+        return f"{model_slug}-{corpus_hash.hexdigest()[:16]}"
+
+    def _embeddings_file(self, key: str) -> Path:
+        return self.path / f"{key}.embeddings.npy"
+
+    def _plant_ids_file(self, key: str) -> Path:
+        return self.path / f"{key}.plant_ids.npy"
+
+    def _index_file(self, key: str, kind: str) -> Path:
+        return self.path / f"{key}.{kind}.npz"
+
+    # Returns the memory mapped embeddings, or None if nothing (valid) is stored for this key
+    def load(self, key: str, plant_ids: np.ndarray) -> np.ndarray | None:
+        embeddings_file = self._embeddings_file(key)
+        plant_ids_file = self._plant_ids_file(key)
+
+        if not embeddings_file.exists() or not plant_ids_file.exists():
+            return None
+
+        try:
+            stored_ids = np.load(plant_ids_file)
+            embeddings = np.load(embeddings_file, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+        # Defensive check, a half written or foreign file must never be used
+        if not np.array_equal(stored_ids, plant_ids) or embeddings.shape[0] != len(plant_ids):
+            return None
+
+        return embeddings
+
+    # Stores the embeddings, written to a temporary file first and renamed, so readers never see half files
+    def save(self, key: str, plant_ids: np.ndarray, embeddings: np.ndarray):
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self._write_atomic(self._plant_ids_file(key), np.asarray(plant_ids, dtype=np.int64))
+        self._write_atomic(self._embeddings_file(key), np.asarray(embeddings, dtype=np.float32))
+
+        self._remove_stale_entries(keep_key=key)
+
+    # Vector indexes (see vector_index.py) that are expensive to build are stored next to the embeddings
+    def load_index(self, key: str, kind: str):
+        index_file = self._index_file(key, kind)
+        if not index_file.exists():
+            return None
+
+        try:
+            return load_index(index_file)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save_index(self, key: str, kind: str, index):
+        self.path.mkdir(parents=True, exist_ok=True)
+        file_descriptor, tmp_name = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        os.close(file_descriptor)
+        try:
+            index.save(Path(tmp_name))
+            os.replace(tmp_name, self._index_file(key, kind))
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def _write_atomic(self, target: Path, array: np.ndarray):
+        file_descriptor, tmp_name = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "wb") as tmp_file:
+                np.save(tmp_file, array)
+            os.replace(tmp_name, target)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    # Outdated corpus versions of the same model are not needed anymore
+    def _remove_stale_entries(self, keep_key: str):
+        model_slug = keep_key.rsplit("-", 1)[0]
+        for file in self.path.glob(f"{model_slug}-*.np[yz]"):
+            if not file.name.startswith(f"{keep_key}."):
+                file.unlink(missing_ok=True)
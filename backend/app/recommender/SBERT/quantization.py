@@ -0,0 +1,139 @@
+import numpy as np
+
+# Rows that are converted back to float32 at once while scoring, bounds the temporary memory per query
+CHUNK_ROWS = 16384
+
+DTYPES = ("float32", "float16", "int8")
+
+""" -----------------------------------------------------------------------------------------------
+ Compact storage of L2 normalized corpus embeddings, scored directly in the quantized form.
+ - float32: reference, 4 bytes per dimension
+ - float16: 2 bytes per dimension
+ - int8: 1 byte per dimension plus one float32 scale per vector (symmetric, scale = max|v| / 127)
+ The norm of every dequantized vector is kept as well, so the scores stay true cosine similarities
+ (between the query and the quantized vector), and all metadata derived from them (normalized score,
+ percentile, distance, gap to best) keeps its meaning.
+----------------------------------------------------------------------------------------------- """
+class QuantizedMatrix:
+    def __init__(self, vectors: np.ndarray, dtype: str = "float32"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown embedding dtype: {dtype}, choose one of {DTYPES}")
+
+        self.dtype = dtype
+        self.codes, self.scales, self.norms = self._quantize(vectors)
+
+    def _quantize(self, vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray | None, np.ndarray]:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+
+        if self.dtype == "int8":
+            max_abs = np.abs(vectors).max(axis=1) if len(vectors) else np.zeros(0, dtype=np.float32)
+            scales = np.where(max_abs > 0, max_abs / 127, 1.0).astype(np.float32)
+            codes = np.round(vectors / scales[:, None]).astype(np.int8)
+            dequantized = codes.astype(np.float32) * scales[:, None]
+        else:
+            scales = None
+            codes = vectors.astype(self.dtype)
+            dequantized = codes.astype(np.float32)
+
+        norms = np.linalg.norm(dequantized, axis=1).astype(np.float32)
+        norms[norms == 0] = 1.0
+        return codes, scales, norms
+
+    # Incremental add, only the new rows are quantized
+    def append(self, vectors: np.ndarray):
+        codes, scales, norms = self._quantize(vectors)
+        self.codes = np.vstack([self.codes, codes]) if len(self) else codes
+        self.norms = np.concatenate([self.norms, norms])
+        if scales is not None:
+            self.scales = np.concatenate([self.scales, scales])
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.codes.shape
+
+    @property
+    def memory_bytes(self) -> int:
+        scales_bytes = self.scales.nbytes if self.scales is not None else 0
+        return self.codes.nbytes + scales_bytes + self.norms.nbytes
+
+    # float32 version of all (or the selected) rows
+    def dequantize(self, rows: np.ndarray | None = None) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        vectors = codes.astype(np.float32)
+        if self.scales is not None:
+            vectors *= (self.scales if rows is None else self.scales[rows])[:, None]
+        return vectors
+
+    # Cosine similarities against a normalized query, chunk by chunk to keep the float32 copies small
+    def scores(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        if rows is None:
+            rows = slice(None)
+            num_rows = len(self)
+        else:
+            rows = np.asarray(rows)
+            num_rows = len(rows)
+
+        if self.dtype == "float32":
+            return (self.codes[rows] @ query) / self.norms[rows]
+
+        scores = np.empty(num_rows, dtype=np.float32)
+        row_ids = np.arange(len(self))[rows]
+        for start in range(0, num_rows, CHUNK_ROWS):
+            chunk = row_ids[start:start + CHUNK_ROWS]
+            raw = self.codes[chunk].astype(np.float32) @ query
+            if self.scales is not None:
+                raw *= self.scales[chunk]
+            scores[start:start + len(chunk)] = raw / self.norms[chunk]
+
+        return scores
+
+
+""" -----------------------------------------------------------------------------------------------
+ Report about memory saved and ranking drift of the quantized modes against float32, for a given
+ set of corpus embeddings and queries. Ranking drift is measured as the mean overlap of the top k,
+ the mean Spearman rank correlation of the complete ranking and the largest absolute score error.
+----------------------------------------------------------------------------------------------- """
+def quantization_report(embeddings: np.ndarray, queries: np.ndarray, k: int = 10) -> dict[str, dict]:
+    vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+    reference = QuantizedMatrix(vectors, dtype="float32")
+    report: dict[str, dict] = {}
+
+    for dtype in DTYPES:
+        matrix = QuantizedMatrix(vectors, dtype=dtype)
+        overlaps, correlations, errors = [], [], []
+
+        for query in queries:
+            expected = reference.scores(query)
+            actual = matrix.scores(query)
+
+            top_expected = set(np.argsort(-expected, kind="stable")[:k].tolist())
+            top_actual = set(np.argsort(-actual, kind="stable")[:k].tolist())
+            overlaps.append(len(top_expected & top_actual) / k)
+
+            correlations.append(_spearman(expected, actual))
+            errors.append(float(np.max(np.abs(expected - actual))))
+
+        report[dtype] = {
+            "memory_bytes": matrix.memory_bytes,
+            "memory_saved": round(1 - matrix.memory_bytes / reference.memory_bytes, 4),
+            f"top_{k}_overlap": round(float(np.mean(overlaps)), 4),
+            "spearman": round(float(np.mean(correlations)), 6),
+            "max_score_error": round(float(np.max(errors)), 6),
+        }
+
+    return report
+
+
+def _spearman(a: np.ndarray, b: np.ndarray) -> float:
+    rank_a = np.argsort(np.argsort(a, kind="stable"), kind="stable").astype(np.float64)
+    rank_b = np.argsort(np.argsort(b, kind="stable"), kind="stable").astype(np.float64)
+    if rank_a.std() == 0 or rank_b.std() == 0:
+        return 1.0
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
@@ -0,0 +1,158 @@
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+import numpy as np
+
+MAX_BATCH_SIZE = int(os.getenv("SBERT_MAX_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.getenv("SBERT_MAX_WAIT_MS", "5"))
+
+""" -----------------------------------------------------------------------------------------------
+ One free text query waiting in the queue. The calling request thread waits on the event until
+ the batch worker has put the embedding (or the error) in place.
+----------------------------------------------------------------------------------------------- """
+@dataclass
+class _PendingQuery:
+    text: str
+    enqueued_at: float = field(default_factory=time.perf_counter)
+    done: threading.Event = field(default_factory=threading.Event)
+    embedding: np.ndarray | None = None
+    error: BaseException | None = None
+
+
+""" -----------------------------------------------------------------------------------------------
+ Micro-batching layer in front of the SBERT encoder. Concurrent requests put their query into a
+ queue, one worker thread collects all queries arriving within max_wait_ms (or until
+ max_batch_size is reached), encodes them with a single encode call and hands every caller its
+ own vector. A small window costs a few milliseconds latency, but replaces many single sentence
+ forward passes under load. Setting max_batch_size to 1 disables batching.
+----------------------------------------------------------------------------------------------- """
+class QueryBatcher:
+    def __init__(self, encode_fn: Callable[[list[str]], np.ndarray],
+                 max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+
+        self._queue: queue.Queue[_PendingQuery | None] = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._worker_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._num_batches = 0
+        self._num_queries = 0
+        self._max_batch_size_seen = 0
+        self._batch_size_counts: dict[int, int] = {}
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+        self._total_encode = 0.0
+
+    # Called by the request threads, blocks until the own embedding is available
+    def encode(self, text: str) -> np.ndarray:
+        pending = _PendingQuery(text=text)
+
+        if self.max_batch_size == 1:
+            self._encode_batch([pending])
+        else:
+            self._ensure_worker()
+            self._queue.put(pending)
+            pending.done.wait()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.embedding
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="sbert-query-batcher", daemon=True)
+                self._worker.start()
+
+    # Worker loop: wait for the first query, then collect more until the window closes or the batch is full
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            deadline = first.enqueued_at + self.max_wait
+            stop = False
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    pending = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if pending is None:
+                    stop = True
+                    break
+                batch.append(pending)
+
+            self._encode_batch(batch)
+
+            if stop:
+                return
+
+    # One encode call for the whole batch, every caller receives its own row
+    def _encode_batch(self, batch: list[_PendingQuery]):
+        started_at = time.perf_counter()
+
+        try:
+            embeddings = np.atleast_2d(self.encode_fn([pending.text for pending in batch]))
+            for pending, embedding in zip(batch, embeddings):
+                pending.embedding = embedding
+        except BaseException as error:
+            for pending in batch:
+                pending.error = error
+
+        finished_at = time.perf_counter()
+        self._record(batch=batch, started_at=started_at, finished_at=finished_at)
+
+        for pending in batch:
+            pending.done.set()
+
+    def _record(self, batch: list[_PendingQuery], started_at: float, finished_at: float):
+        waits = [started_at - pending.enqueued_at for pending in batch]
+
+        with self._stats_lock:
+            self._num_batches += 1
+            self._num_queries += len(batch)
+            self._max_batch_size_seen = max(self._max_batch_size_seen, len(batch))
+            self._batch_size_counts[len(batch)] = self._batch_size_counts.get(len(batch), 0) + 1
+            self._total_wait += sum(waits)
+            self._max_wait_seen = max(self._max_wait_seen, max(waits))
+            self._total_encode += finished_at - started_at
+
+    # Per-batch size and wait time statistics, to trade latency against throughput
+    def stats(self) -> dict:
+        with self._stats_lock:
+            num_batches = self._num_batches or 1
+            num_queries = self._num_queries or 1
+
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "queue_depth": self._queue.qsize(),
+                "batches": self._num_batches,
+                "queries": self._num_queries,
+                "avg_batch_size": round(self._num_queries / num_batches, 3),
+                "max_batch_size_seen": self._max_batch_size_seen,
+                "batch_size_counts": dict(sorted(self._batch_size_counts.items())),
+                "avg_wait_ms": round(self._total_wait / num_queries * 1000, 3),
+                "max_wait_ms_seen": round(self._max_wait_seen * 1000, 3),
+                "avg_encode_ms": round(self._total_encode / num_batches * 1000, 3),
+            }
+
+    # Stops the worker after the queries that are already queued
+    def close(self):
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join(timeout=5)
@@ -0,0 +1,107 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.services.question_service import sanitize_free_text
+
+MAX_CACHE_BYTES = int(os.getenv("SBERT_QUERY_CACHE_BYTES", str(8 * 1024 * 1024)))
+TTL_SECONDS = float(os.getenv("SBERT_QUERY_CACHE_TTL", "0"))
+
+""" -----------------------------------------------------------------------------------------------
+ Normalized form of a free text, used as cache key and as the text that is actually encoded:
+ sanitized like the free text stored in the db, lower case (MiniLM is uncased anyway) and with
+ collapsed whitespaces. That way "Low light,  little water" and "low light, little water" share
+ one embedding.
+----------------------------------------------------------------------------------------------- """
+def normalize_query_text(text: str) -> str:
+    return re.sub(r"\s+", " ", sanitize_free_text(text)).lower()
+
+
+""" -----------------------------------------------------------------------------------------------
+ Bounded LRU cache of query embeddings, sized in bytes (key + vector) instead of entries. An
+ optional TTL expires entries after some seconds (0 disables it). The stored vectors are read-only,
+ so a caller can never change the embedding of another request.
+ Hits, misses, evictions and expirations are counted for monitoring.
+----------------------------------------------------------------------------------------------- """
+class QueryEmbeddingCache:
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES, ttl_seconds: float = TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: OrderedDict[str, tuple[np.ndarray, float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._size_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _entry_size(key: str, embedding: np.ndarray) -> int:
+        return sys.getsizeof(key) + embedding.nbytes
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            embedding, expires_at, size = entry
+            if self.ttl_seconds > 0 and time.monotonic() > expires_at:
+                del self._entries[key]
+                self._size_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, key: str, embedding: np.ndarray):
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.flags.writeable = False
+        size = self._entry_size(key, embedding)
+
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size_bytes -= previous[2]
+
+            self._entries[key] = (embedding, time.monotonic() + self.ttl_seconds, size)
+            self._size_bytes += size
+
+            # Evicting the least recently used entries until the cache fits again
+            while self._size_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._size_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
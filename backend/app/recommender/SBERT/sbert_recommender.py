@@ -1,8 +1,10 @@
-import torch
+import numpy as np
 from sqlalchemy.orm import Session
 from app.recommender.SBERT import sbert_service
+from app.recommender.SBERT.sbert_registry import SBertRegistry, sbert_registry
+from app.recommender.score_metadata import ScoreMetadata
 from app.schemas import PlantRecommendation, UserFreeTextSubmission
-from sentence_transformers import SentenceTransformer, SimilarityFunction
+from app.services.timing import span
 
 PADDING = 5
 
@@ -10,94 +12,106 @@ PADDING = 5
 Class that represents a sentence transformer model (SBERT), namely MiniLM-L6-v2, see
 https://www.kaggle.com/refs/hf-model/sentence-transformers/all-MiniLM-L6-v2. 
 It maps sentences and paragraphs into a 384 dimensional vector space and can then be used for 
-clusterings or semantic search. After initialization of this pre-trained model, a text-representation
-and embeddings of the dataset and the user query (free text) is being done. 
+clusterings or semantic search. The pre-trained model and the embeddings of the dataset are shared
+by all requests (see sbert_registry.py), per request only the user query (free text) is embedded. 
 By finding the cosine similarities (of different percentiles) different recommendations are returned.
+The top matches are retrieved from a vector index (see vector_index.py): an exact scan over all plants
+by default, or an approximate HNSW graph for large catalogs (SBERT_INDEX_MODE=hnsw).
 
 Calculation of similarities oriented on the documentation at 
 https://sbert.net/docs/sentence_transformer/usage/semantic_textual_similarity.html
 ----------------------------------------------------------------------------------------------- """
 class SBertRecommender:
-    def __init__(self, db: Session, submission_id: int):
+    def __init__(self, db: Session, submission_id: int, registry: SBertRegistry = sbert_registry):
         self.db = db
         self.submission_id = submission_id
-        self.sbert = self._create_sbert_model()
-        self.dataset_text_representation = self._create_dataset_text_representation()
-        self.dataset_embeddings = self._create_dataset_embeddings()
+        self.registry = registry
 
-    # Initialization of the model
-    @staticmethod
-    def _create_sbert_model():
-        return SentenceTransformer(
-            'sentence-transformers/all-MiniLM-L6-v2',
-            similarity_fn_name=SimilarityFunction.COSINE)
-
-    # Text representation creation of database entries - is a preprocessing step
-    def _create_dataset_text_representation(self):
-        return sbert_service.create_text_representation_plants(db=self.db)
-
-    # Dataset embeddings are created from the database entries
-    def _create_dataset_embeddings(self):
-        plants_text_tuples = sbert_service.create_text_representation_plants(db=self.db)
-        plant_sentences = [text for _, text in plants_text_tuples]
-        return self.sbert.encode(plant_sentences)
+        # Model and dataset embeddings are owned by the process-wide registry, built once upon startup
+        with span("sbert.snapshot"):
+            snapshot = registry.get(db=db)
+        self.sbert = snapshot.model
+        self.dataset_text_representation = snapshot.plant_texts
+        self.dataset_plant_ids = snapshot.plant_ids
+        self.dataset_embeddings = snapshot.embeddings
+        self.index = snapshot.index
+        self.score_sample = snapshot.score_sample
 
 
     # The recommendation step itself
-    def recommend(self, user_free_text: UserFreeTextSubmission, num_perfect: int, num_good: int, num_bad: int):
+    def recommend(self, user_free_text: UserFreeTextSubmission, num_perfect: int, num_good: int, num_bad: int,
+                  store: bool = True):
 
-        # Dataset embeddings are already created in constructor. Now building text embeddings from user input
+        # Dataset embeddings are already created in constructor. Now building text embeddings from user input,
+        # the registry batches the encoding together with the queries of concurrent requests
         user_query_text = sbert_service.create_text_representation_user_query(user_query=user_free_text)
-        user_query_embeddings = self.sbert.encode(user_query_text)
-
-        # Calculate cosine similarity
-        similarities = self.sbert.similarity(self.dataset_embeddings, user_query_embeddings)
-        scores = similarities.flatten()
-
-        # Fancy retrieve top n matches. Applied Padding to be able to prioritize plants with existing image url
-        top_scores, top_indices = torch.topk(scores, k=num_perfect + PADDING)
-
-        # Getting the rank based on the scores and mapping them together
-        scores_and_rank = sbert_service.map_scores_to_rank(all_scores=scores.tolist())
+        with span("sbert.encode"):
+            user_query_embeddings = self.registry.encode_query(user_query_text)
+
+        # Fancy retrieve top n matches from the vector index. Applied Padding to be able to prioritize plants with
+        # existing image url
+        with span("sbert.search"):
+            _, top_indices = self.index.search(user_query_embeddings, k=num_perfect + PADDING)
+
+        # Cosine similarities for rank, percentiles and the good/bad bands. The exact index scores the whole catalog,
+        # with an approximate index a uniform sample of the catalog plus the top matches is scored instead
+        with span("sbert.similarity"):
+            if self.index.exact:
+                score_rows = np.arange(len(self.index))
+            else:
+                score_rows = np.union1d(self.score_sample, top_indices)
+
+            scores = self.index.scores(user_query_embeddings, rows=score_rows)
+            top_positions = np.searchsorted(score_rows, top_indices)
+
+            # Sorting the scores once, rank, percentile etc. are looked up by position afterwards. Ranks within the
+            # sample are scaled up to the whole catalog, the top matches are counted as they are
+            if self.index.exact:
+                score_metadata = ScoreMetadata(scores, distinct=True)
+            else:
+                score_metadata = ScoreMetadata(scores, distinct=True, population_size=len(self.index),
+                                               exact_positions=top_positions)
 
         # Retrieve plants from db, but also prioritize those with image url
         perfect_plants = sbert_service.get_plant_data_from_score_indices(db=self.db,
                                                                          top_indices=top_indices.tolist(),
-                                                                         top_scores=top_scores.tolist(),
+                                                                         score_positions=top_positions.tolist(),
                                                                          num=num_perfect,
-                                                                         scores_rank=scores_and_rank,
-                                                                         submission_id=self.submission_id,
-                                                                         label="perfect")
+                                                                         score_metadata=score_metadata,
+                                                                         plant_ids=self.dataset_plant_ids)
 
         # Get percentiles to find good and bad matches too
-        percentiles = torch.quantile(scores, torch.tensor([0.25, 0.75]))
-        p25, p75 = percentiles.tolist()
+        p25, p75 = np.quantile(scores, [0.25, 0.75]).tolist()
 
-        # Get good matches above 75 percentile, elegantly with the torch library
-        good_matches_indices = torch.where(scores >= p75)[0]
-        good_matches_indices = good_matches_indices[:num_good + PADDING].tolist()
-        good_match_scores = [float(scores[i]) for i in good_matches_indices]
+        # Get good matches above 75 percentile
+        good_positions = np.where(scores >= p75)[0][:num_good + PADDING]
+        good_matches_indices = score_rows[good_positions].tolist()
 
         # Retrieve plants from db, but also prioritize those with image url
         good_plants = sbert_service.get_plant_data_from_score_indices(db=self.db,
                                                                       top_indices=good_matches_indices,
-                                                                      top_scores=good_match_scores,
+                                                                      score_positions=good_positions.tolist(),
                                                                       num=num_good,
-                                                                      scores_rank=scores_and_rank,
-                                                                      submission_id=self.submission_id,
-                                                                      label="good")
+                                                                      score_metadata=score_metadata,
+                                                                      plant_ids=self.dataset_plant_ids)
         # Get mismatches under 25th percentile
-        bad_indices = torch.where(scores <= p25)[0]
-        bad_indices = bad_indices[:num_bad + PADDING].tolist()
-        bad_match_scores = [float(scores[i]) for i in bad_indices]
+        bad_positions = np.where(scores <= p25)[0][:num_bad + PADDING]
+        bad_indices = score_rows[bad_positions].tolist()
 
         bad_plants = sbert_service.get_plant_data_from_score_indices(db=self.db,
                                                                      top_indices=bad_indices,
-                                                                     top_scores=bad_match_scores,
+                                                                     score_positions=bad_positions.tolist(),
                                                                      num=num_bad,
-                                                                     scores_rank=scores_and_rank,
-                                                                     submission_id = self.submission_id,
-                                                                     label = "mismatch")
+                                                                     score_metadata=score_metadata,
+                                                                     plant_ids=self.dataset_plant_ids)
+
+        # Storing all recommendations of the submission at once, in one transaction (not for the warm-up upon startup)
+        if store:
+            sbert_service.store_recommendation_and_metadata_to_db(db=self.db,
+                                                                  sub_id=self.submission_id,
+                                                                  recommendations_per_label={"perfect": perfect_plants,
+                                                                                             "good": good_plants,
+                                                                                             "mismatch": bad_plants})
 
         return [PlantRecommendation(label="perfect", submission_id=self.submission_id, recommendation=perfect_plants),
                 PlantRecommendation(label="good", submission_id=self.submission_id, recommendation=good_plants),
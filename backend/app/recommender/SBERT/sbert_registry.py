@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+import numpy as np
+from sqlalchemy.orm import Session
+from app.database.plant_events import on_plants_changed
+from app.recommender.SBERT import sbert_service
+from app.recommender.SBERT.embedding_store import EmbeddingStore
+from app.recommender.SBERT.query_batcher import QueryBatcher
+from app.recommender.SBERT.query_cache import QueryEmbeddingCache, normalize_query_text
+from app.recommender.SBERT.vector_index import ExactIndex, HNSWIndex
+from app.services.snapshot_registry import SnapshotRegistry
+
+# sentence_transformers pulls in torch and transformers (seconds of imports), it is only imported when the
+# model is loaded, so importing the app (workers, scripts, routers) does not pay for it
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+# "exact" scans the whole catalog (reference mode), "hnsw" uses the approximate nearest neighbour graph
+INDEX_MODE = os.getenv("SBERT_INDEX_MODE", "exact")
+
+# Storage of the vectors in the exact index: "float32", "float16" or "int8" (see quantization.py). The HNSW
+# graph always keeps float32 vectors, so it only goes together with "float32"
+EMBEDDING_DTYPE = os.getenv("SBERT_EMBEDDING_DTYPE", "float32")
+
+# Size of the catalog sample used for estimating the score distribution with an approximate index
+SCORE_SAMPLE_SIZE = 4096
+
+""" -----------------------------------------------------------------------------------------------
+ Immutable view on everything the SBERT recommender needs for answering a query: the loaded model,
+ the text representation of the plants, the corresponding corpus embeddings (one row per plant)
+ and the vector index over them. score_sample holds the rows used for estimating the score
+ distribution, if the index is approximate (all rows, as long as the catalog is small).
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class SBertSnapshot:
+    model: "SentenceTransformer"
+    plant_ids: np.ndarray
+    plant_texts: tuple[str, ...]
+    embeddings: np.ndarray
+    index: ExactIndex | HNSWIndex
+    score_sample: np.ndarray
+
+
+""" -----------------------------------------------------------------------------------------------
+ Process-wide registry that owns the SBERT model and the corpus embeddings. It is built once upon
+ startup (see lifespan in main.py), every request only reads from it.
+ Readers never lock: they grab the current snapshot, which is replaced as a whole and never
+ mutated. Only building takes the lock, so a rebuild never runs twice at the same time (see
+ snapshot_registry.py, a build that overlaps a change of the plants is not installed).
+ The corpus embeddings are read from the on-disk store (see embedding_store.py) and are only
+ encoded, if the store has no entry for the current model and corpus version.
+ invalidate() is the hook for changes of the plants table, the next reader rebuilds the corpus
+ embeddings (the model itself stays loaded).
+ The model (and with it torch) is imported and loaded on first use. Upon startup that happens in
+ the background warm-up (see startup.py), so the API serves everything else right away; an SBERT
+ request arriving earlier waits for the running build instead of starting another one.
+----------------------------------------------------------------------------------------------- """
+class SBertRegistry(SnapshotRegistry[SBertSnapshot]):
+    def __init__(self, model_name: str = MODEL_NAME, store: EmbeddingStore | None = None,
+                 index_mode: str = INDEX_MODE, embedding_dtype: str = EMBEDDING_DTYPE):
+        if index_mode == "hnsw" and embedding_dtype != "float32":
+            raise ValueError(f"SBERT index mode hnsw stores float32 vectors, embedding dtype {embedding_dtype} "
+                             f"is only supported by the exact index")
+
+        super().__init__()
+        self.model_name = model_name
+        self.index_mode = index_mode
+        self.embedding_dtype = embedding_dtype
+        self.store = store if store is not None else EmbeddingStore()
+        self._model_lock = threading.Lock()
+        self._model: "SentenceTransformer | None" = None
+        self._model_load_ms: float | None = None
+        self._build_ms: float | None = None
+
+        # Free text queries of concurrent requests are encoded together, see query_batcher.py. Repeated
+        # queries do not reach the model at all, see query_cache.py
+        self.query_batcher = QueryBatcher(encode_fn=self._encode_queries)
+        self.query_cache = QueryEmbeddingCache()
+
+    # Initialization of the model, happens only once per process
+    def _load_model(self) -> "SentenceTransformer":
+        with self._model_lock:
+            if self._model is None:
+                started = time.perf_counter()
+                from sentence_transformers import SentenceTransformer, SimilarityFunction
+
+                self._model = SentenceTransformer(self.model_name, similarity_fn_name=SimilarityFunction.COSINE)
+                self._model_load_ms = (time.perf_counter() - started) * 1000
+            return self._model
+
+    def _encode_queries(self, texts: list[str]) -> np.ndarray:
+        return self._load_model().encode(texts)
+
+    # Embedding of a single user query, from the cache or batched together with queries of other requests
+    def encode_query(self, text: str) -> np.ndarray:
+        normalized_text = normalize_query_text(text)
+
+        embedding = self.query_cache.get(normalized_text)
+        if embedding is None:
+            embedding = self.query_batcher.encode(normalized_text)
+            self.query_cache.put(normalized_text, embedding)
+
+        return embedding
+
+    # Text representation and embeddings of the database entries - is a preprocessing step
+    def _create(self, db: Session, generation: int) -> SBertSnapshot:
+        started = time.perf_counter()
+        model = self._load_model()
+        plants_text_tuples = sbert_service.create_text_representation_plants(db=db)
+
+        plant_ids = np.array([plant_id for plant_id, _ in plants_text_tuples], dtype=np.int64)
+        plant_texts = tuple(text for _, text in plants_text_tuples)
+
+        # Encoding the corpus only if the on-disk store has nothing for this model and corpus version
+        key = self.store.make_key(model_name=self.model_name, plants_text_tuples=plants_text_tuples)
+        embeddings = self.store.load(key=key, plant_ids=plant_ids)
+
+        if embeddings is None:
+            self.store.save(key=key, plant_ids=plant_ids, embeddings=model.encode(list(plant_texts)))
+            embeddings = self.store.load(key=key, plant_ids=plant_ids)
+
+        snapshot = SBertSnapshot(model=model,
+                                 plant_ids=plant_ids,
+                                 plant_texts=plant_texts,
+                                 embeddings=embeddings,
+                                 index=self._build_index(key=key, embeddings=embeddings),
+                                 score_sample=self._draw_score_sample(num_rows=len(plant_ids)))
+        self._build_ms = (time.perf_counter() - started) * 1000
+        return snapshot
+
+    # The HNSW graph is expensive to build, so it is stored next to the embeddings
+    def _build_index(self, key: str, embeddings: np.ndarray) -> ExactIndex | HNSWIndex:
+        if self.index_mode == "exact":
+            return ExactIndex(embeddings, dtype=self.embedding_dtype)
+
+        if self.index_mode != "hnsw":
+            raise ValueError(f"Unknown SBERT index mode: {self.index_mode}")
+
+        index = self.store.load_index(key=key, kind="hnsw")
+        if index is None or len(index) != len(embeddings):
+            index = HNSWIndex(dim=embeddings.shape[1])
+            index.add(embeddings)
+            self.store.save_index(key=key, kind="hnsw", index=index)
+
+        return index
+
+    @staticmethod
+    def _draw_score_sample(num_rows: int) -> np.ndarray:
+        if num_rows <= SCORE_SAMPLE_SIZE:
+            return np.arange(num_rows)
+
+        rng = np.random.default_rng(42)
+        return np.sort(rng.choice(num_rows, size=SCORE_SAMPLE_SIZE, replace=False))
+
+    # Some numbers about the index in use, e.g. to check the memory saved by quantization
+    def index_stats(self) -> dict:
+        snapshot = self._snapshot
+        stats = {
+            "model_loaded": self._model is not None,
+            "model_load_ms": None if self._model_load_ms is None else round(self._model_load_ms, 1),
+            "build_ms": None if self._build_ms is None else round(self._build_ms, 1),
+        }
+        if snapshot is None:
+            return {"built": False, "index_mode": self.index_mode, "embedding_dtype": self.embedding_dtype, **stats}
+
+        return {
+            "built": True,
+            **stats,
+            "index_mode": self.index_mode,
+            "embedding_dtype": getattr(snapshot.index, "dtype", "float32"),
+            "num_plants": len(snapshot.index),
+            "index_memory_bytes": snapshot.index.memory_bytes,
+            "float32_memory_bytes": int(snapshot.embeddings.nbytes),
+        }
+
+    # Called upon shutdown
+    def close(self):
+        self.query_batcher.close()
+
+
+sbert_registry = SBertRegistry()
+on_plants_changed(sbert_registry.invalidate)
@@ -0,0 +1,313 @@
+import heapq
+import math
+from pathlib import Path
+import numpy as np
+from app.recommender.SBERT.quantization import QuantizedMatrix
+
+""" -----------------------------------------------------------------------------------------------
+ Vector indexes for the SBERT retrieval, written in pure NumPy. Both indexes store L2 normalized
+ vectors, such that the dot product equals the cosine similarity, and share the same interface:
+ build (constructor + add), add (incremental), search (top k), scores (exact cosine similarity of
+ selected rows), save and load.
+----------------------------------------------------------------------------------------------- """
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+""" -----------------------------------------------------------------------------------------------
+ Exact scan over all vectors, the reference mode. Cost is one matrix-vector product over the whole
+ catalog per query, which is totally fine for some thousand plants. The vectors can be kept in a
+ compact float16 or int8 form (see quantization.py), scoring works directly on that form.
+----------------------------------------------------------------------------------------------- """
+class ExactIndex:
+    exact = True
+
+    def __init__(self, vectors: np.ndarray | None = None, dim: int | None = None, dtype: str = "float32"):
+        self.matrix = QuantizedMatrix(np.zeros((0, dim or 0), dtype=np.float32), dtype=dtype)
+        if vectors is not None:
+            self.add(vectors)
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    @property
+    def dtype(self) -> str:
+        return self.matrix.dtype
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.matrix.memory_bytes
+
+    def add(self, vectors: np.ndarray):
+        vectors = normalize_rows(vectors)
+        if len(self) == 0:
+            self.matrix = QuantizedMatrix(vectors, dtype=self.matrix.dtype)
+        else:
+            self.matrix.append(vectors)
+
+    # Cosine similarity of the query against all rows, or only against the given rows
+    def scores(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        return self.matrix.scores(normalize_rows(query)[0], rows=rows)
+
+    # Top k rows by cosine similarity, sorted descending
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return scores[top], top.astype(np.int64)
+
+    def save(self, path: Path):
+        with open(path, "wb") as file:
+            np.savez(file, kind="exact", vectors=self.matrix.dequantize(), dtype=self.matrix.dtype)
+
+    @classmethod
+    def load(cls, path: Path) -> "ExactIndex":
+        with np.load(path) as data:
+            return cls.from_arrays(data)
+
+    # From the arrays of a saved index (an open .npz file)
+    @classmethod
+    def from_arrays(cls, data) -> "ExactIndex":
+        return cls(data["vectors"], dtype=str(data["dtype"]))
+
+
+""" -----------------------------------------------------------------------------------------------
+ Hierarchical Navigable Small World graph (Malkov & Yashunin, https://arxiv.org/abs/1603.09320).
+ Every vector gets a random level, on each level it is connected to its m nearest neighbours
+ (2*m on the bottom level). A search greedily descends from the entry point on the top level and
+ runs a best-first search with a candidate list of size ef_search on the bottom level, so only a
+ small part of the catalog is ever compared with the query.
+ Vectors can be added incrementally, the graph does not need to be rebuilt.
+----------------------------------------------------------------------------------------------- """
+class HNSWIndex:
+    exact = False
+
+    def __init__(self, dim: int, m: int = 16, ef_construction: int = 100, ef_search: int = 64, seed: int = 42):
+        self.dim = dim
+        self.m = m
+        self.m_max0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.level_mult = 1 / math.log(m)
+        self.rng = np.random.default_rng(seed)
+
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._count = 0
+        self.node_levels: list[int] = []
+        self.graph: list[dict[int, list[int]]] = []
+        self.entry_point = -1
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.vectors.nbytes
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._count]
+
+    def add(self, vectors: np.ndarray):
+        vectors = normalize_rows(vectors)
+        self._reserve(self._count + len(vectors))
+
+        for vector in vectors:
+            node = self._count
+            self._vectors[node] = vector
+            self._count += 1
+            self._insert(node)
+
+    # Growing the vector buffer geometrically, such that adding single vectors stays cheap
+    def _reserve(self, size: int):
+        if size <= self._vectors.shape[0]:
+            return
+        buffer = np.zeros((max(size, 2 * self._vectors.shape[0], 64), self.dim), dtype=np.float32)
+        buffer[:self._count] = self._vectors[:self._count]
+        self._vectors = buffer
+
+    def _random_level(self) -> int:
+        return int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+
+    def _distances(self, query: np.ndarray, nodes: list[int]) -> np.ndarray:
+        return 1.0 - self._vectors[nodes] @ query
+
+    def _insert(self, node: int):
+        level = self._random_level()
+        self.node_levels.append(level)
+        while len(self.graph) <= level:
+            self.graph.append({})
+        for lc in range(level + 1):
+            self.graph[lc][node] = []
+
+        if self.entry_point < 0:
+            self.entry_point = node
+            return
+
+        query = self._vectors[node]
+        entry = self.entry_point
+        top_level = self.node_levels[entry]
+
+        # Greedy descent on the levels above the level of the new node
+        for lc in range(top_level, level, -1):
+            entry = self._search_layer(query, [entry], ef=1, level=lc)[0][1]
+
+        # Connecting the new node on every level it lives on
+        entries = [entry]
+        for lc in range(min(level, top_level), -1, -1):
+            candidates = self._search_layer(query, entries, ef=self.ef_construction, level=lc)
+            max_neighbours = self.m_max0 if lc == 0 else self.m
+            neighbours = self._select_neighbours(candidates, self.m)
+            self.graph[lc][node] = neighbours
+
+            for neighbour in neighbours:
+                links = self.graph[lc][neighbour]
+                links.append(node)
+                if len(links) > max_neighbours:
+                    self._shrink(neighbour, links, max_neighbours, lc)
+
+            entries = [candidate for _, candidate in candidates]
+
+        if level > top_level:
+            self.entry_point = node
+
+    # Neighbour selection heuristic of the paper: a candidate is only linked if it is closer to the node than
+    # to any already selected neighbour. That keeps links pointing into different directions (clusters).
+    def _select_neighbours(self, candidates: list[tuple[float, int]], max_neighbours: int) -> list[int]:
+        selected: list[int] = []
+        for distance, candidate in candidates:
+            if len(selected) >= max_neighbours:
+                break
+            if not selected or np.all(self._distances(self._vectors[candidate], selected) > distance):
+                selected.append(candidate)
+        return selected
+
+    # Pruning the links of a node that has too many
+    def _shrink(self, node: int, links: list[int], max_neighbours: int, level: int):
+        distances = self._distances(self._vectors[node], links)
+        order = np.argsort(distances, kind="stable")
+        candidates = [(float(distances[i]), links[i]) for i in order]
+        self.graph[level][node] = self._select_neighbours(candidates, max_neighbours)
+
+    # Best-first search on one level, returns (distance, node) pairs sorted ascending by distance
+    def _search_layer(self, query: np.ndarray, entries: list[int], ef: int, level: int) -> list[tuple[float, int]]:
+        visited = set(entries)
+        entry_distances = self._distances(query, entries)
+
+        candidates = [(float(d), e) for d, e in zip(entry_distances, entries)]
+        heapq.heapify(candidates)
+        results = [(-d, e) for d, e in candidates]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        layer = self.graph[level]
+        while candidates:
+            distance, current = heapq.heappop(candidates)
+            if distance > -results[0][0] and len(results) >= ef:
+                break
+
+            neighbours = [n for n in layer[current] if n not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+
+            for neighbour_distance, neighbour in zip(self._distances(query, neighbours).tolist(), neighbours):
+                if len(results) < ef or neighbour_distance < -results[0][0]:
+                    heapq.heappush(candidates, (neighbour_distance, neighbour))
+                    heapq.heappush(results, (-neighbour_distance, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted((-d, n) for d, n in results)
+
+    def scores(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        query = normalize_rows(query)[0]
+        vectors = self.vectors if rows is None else self._vectors[rows]
+        return vectors @ query
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        if self._count == 0 or k <= 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        query = normalize_rows(query)[0]
+        entry = self.entry_point
+        for lc in range(self.node_levels[entry], 0, -1):
+            entry = self._search_layer(query, [entry], ef=1, level=lc)[0][1]
+
+        results = self._search_layer(query, [entry], ef=max(self.ef_search, k), level=0)[:k]
+        scores = np.array([1.0 - d for d, _ in results], dtype=np.float32)
+        indices = np.array([n for _, n in results], dtype=np.int64)
+        return scores, indices
+
+    # The adjacency lists are flattened per level (nodes, offsets, neighbours) to fit into one .npz file
+    def save(self, path: Path):
+        arrays = {
+            "kind": "hnsw",
+            "params": np.array([self.dim, self.m, self.ef_construction, self.ef_search, self.entry_point]),
+            "vectors": self.vectors,
+            "node_levels": np.array(self.node_levels, dtype=np.int32),
+        }
+        for lc, layer in enumerate(self.graph):
+            nodes = np.array(list(layer.keys()), dtype=np.int64)
+            lengths = np.array([len(layer[n]) for n in nodes], dtype=np.int64)
+            arrays[f"nodes_{lc}"] = nodes
+            arrays[f"offsets_{lc}"] = np.concatenate([[0], np.cumsum(lengths)])
+            arrays[f"links_{lc}"] = np.array([l for n in nodes for l in layer[n]], dtype=np.int64)
+
+        with open(path, "wb") as file:
+            np.savez(file, **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> "HNSWIndex":
+        with np.load(path) as data:
+            return cls.from_arrays(data)
+
+    # From the arrays of a saved index (an open .npz file)
+    @classmethod
+    def from_arrays(cls, data) -> "HNSWIndex":
+        dim, m, ef_construction, ef_search, entry_point = (int(v) for v in data["params"])
+
+        index = cls(dim=dim, m=m, ef_construction=ef_construction, ef_search=ef_search)
+        index._vectors = np.array(data["vectors"], dtype=np.float32)
+        index._count = index._vectors.shape[0]
+        index.node_levels = data["node_levels"].tolist()
+        index.entry_point = entry_point
+
+        lc = 0
+        while f"nodes_{lc}" in data:
+            nodes, offsets, links = data[f"nodes_{lc}"], data[f"offsets_{lc}"], data[f"links_{lc}"].tolist()
+            index.graph.append({int(n): links[offsets[i]:offsets[i + 1]] for i, n in enumerate(nodes)})
+            lc += 1
+
+        return index
+
+
+""" -----------------------------------------------------------------------------------------------
+ Recall@k of an (approximate) index against the exact scan: the share of the true top k rows that
+ the index returns, averaged over all queries.
+----------------------------------------------------------------------------------------------- """
+def recall_at_k(index, reference: ExactIndex, queries: np.ndarray, k: int) -> float:
+    recalls: list[float] = []
+    for query in np.atleast_2d(queries):
+        _, approx = index.search(query, k)
+        _, exact = reference.search(query, k)
+        recalls.append(len(set(approx.tolist()) & set(exact.tolist())) / max(len(exact), 1))
+
+    return float(np.mean(recalls)) if recalls else 1.0
+
+
+INDEX_TYPES = {"exact": ExactIndex, "hnsw": HNSWIndex}
+
+
+# Opens the file once, the kind of index is stored in it
+def load_index(path: Path):
+    with np.load(path) as data:
+        return INDEX_TYPES[str(data["kind"])].from_arrays(data)
@@ -0,0 +1,43 @@
+from typing import Callable
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.database.write_behind import write_behind_queue
+from app.models import Recommendation
+
+""" -----------------------------------------------------------------------------------------------
+ Bulk writer for the recommendations of one submission, shared by both recommenders. All
+ recommendations (perfect fits, good fits and mismatches) and their metadata are stored in a
+ single transaction, so one commit (one fsync) per request instead of two per plant:
+ - one executemany insert into the recommendation table, RETURNING gives the new ids in the order
+   of the rows (SQLite >= 3.35)
+ - one executemany insert into the metadata table of the algorithm, with these ids as FK
+ If anything fails, nothing of the submission is stored.
+ metadata_row maps the metadata of a recommended plant to the columns of metadata_model. The rows
+ are built within the request, storing them can be deferred by the write-behind queue (see
+ write_behind.py).
+----------------------------------------------------------------------------------------------- """
+def store_recommendations(db: Session, submission_id: int, algorithm: str, metadata_model,
+                          recommendations_per_label: dict[str, list], metadata_row: Callable[[object], dict]):
+    recommendation_rows: list[dict] = []
+    metadata_rows: list[dict] = []
+
+    for label, recommendations in recommendations_per_label.items():
+        for plant in recommendations:
+            recommendation_rows.append({"label": label,
+                                        "algorithm": algorithm,
+                                        "plant_id": plant.id,
+                                        "submission_id": submission_id})
+            metadata_rows.append(metadata_row(plant.metadata))
+
+    if not recommendation_rows:
+        return
+
+    def write(session: Session):
+        statement = insert(Recommendation).returning(Recommendation.id, sort_by_parameter_order=True)
+        recommendation_ids = list(session.scalars(statement, recommendation_rows))
+
+        session.execute(insert(metadata_model),
+                        [{**row, "recommendation_id": recommendation_id}
+                         for row, recommendation_id in zip(metadata_rows, recommendation_ids)])
+
+    write_behind_queue.submit(db=db, write=write)
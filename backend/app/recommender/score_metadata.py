@@ -0,0 +1,96 @@
+import numpy as np
+
+""" -----------------------------------------------------------------------------------------------
+ Shared metadata engine for both recommenders. The scores of one query are sorted once, afterwards
+ ranks, percentiles, normalized scores and the gap to the best score of any set of plants (given
+ by their index in the score vector) are looked up with binary search (np.searchsorted).
+ That replaces per plant loops over all scores and the {score: rank} dictionaries.
+
+ - Ranks: standard competition ranking (1 + number of strictly higher scores), or dense ranking
+   over distinct scores with distinct=True (like SBERT did before).
+ - Percentile: share of scores strictly below the score, with distinct=True share of the distinct
+   scores.
+ - Normalized: Min-Max normalization, see https://www.codecademy.com/article/min-max-zscore-normalization
+ If the scores are only a uniform sample of a larger population (population_size documents), the
+ percentiles are estimates and the ranks are scaled up to the population. Scores known to be the
+ top of the population (exact_positions, e.g. the top matches of a vector index) are not part of
+ the sample: higher scores among them are counted as they are, only the rest is scaled up.
+----------------------------------------------------------------------------------------------- """
+class ScoreMetadata:
+    def __init__(self, scores, distinct: bool = False, population_size: int | None = None, exact_positions=()):
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.distinct = distinct
+        self.population_size = population_size if population_size is not None else len(self.scores)
+
+        # One sort per query, all lookups below are binary searches in this array
+        self.sorted_scores = np.unique(self.scores) if distinct else np.sort(self.scores)
+
+        exact_scores = self.scores[np.unique(np.asarray(exact_positions, dtype=np.int64))]
+        self.sorted_exact_scores = np.unique(exact_scores) if distinct else np.sort(exact_scores)
+
+        self.minimum = float(self.sorted_scores[0]) if len(self.sorted_scores) else 0.0
+        self.maximum = float(self.sorted_scores[-1]) if len(self.sorted_scores) else 0.0
+
+    def _scores_of(self, indices) -> np.ndarray:
+        return self.scores[np.asarray(indices, dtype=np.int64)]
+
+    def raw(self, indices) -> np.ndarray:
+        return self._scores_of(indices)
+
+    def ranks(self, indices) -> np.ndarray:
+        scores = self._scores_of(indices)
+        num_higher = len(self.sorted_scores) - np.searchsorted(self.sorted_scores, scores, side="right")
+        if self.population_size != len(self.scores) and len(self.sorted_scores):
+            num_exact = len(self.sorted_exact_scores)
+            num_higher_exact = num_exact - np.searchsorted(self.sorted_exact_scores, scores, side="right")
+            scale = (self.population_size - num_exact) / max(len(self.sorted_scores) - num_exact, 1)
+            num_higher = num_higher_exact + np.round((num_higher - num_higher_exact) * scale).astype(np.int64)
+        return num_higher + 1
+
+    def percentiles(self, indices) -> np.ndarray:
+        scores = self._scores_of(indices)
+        if len(self.sorted_scores) == 0:
+            return np.zeros(len(scores))
+        return np.searchsorted(self.sorted_scores, scores, side="left") / len(self.sorted_scores)
+
+    def normalized(self, indices) -> np.ndarray:
+        scores = self._scores_of(indices)
+        score_range = self.maximum - self.minimum
+        if score_range == 0:
+            return np.zeros(len(scores))
+        return (scores - self.minimum) / score_range
+
+    def gap_to_best(self, indices) -> np.ndarray:
+        return self.maximum - self._scores_of(indices)
+
+
+""" -----------------------------------------------------------------------------------------------
+ Exact metadata from the scores of a subset of the documents (e.g. the candidates left after top-k
+ pruning, see bm25_inverted_index.py). Valid for every document of the subset, as long as the
+ subset contains every document that scores at least as high as its lowest member: then all
+ higher scores (ranks) and all scores that are not lower (percentiles) are known.
+ The minimum of all scores must be given, the maximum is the best score of the subset.
+----------------------------------------------------------------------------------------------- """
+class PartialScoreMetadata(ScoreMetadata):
+    def __init__(self, indices, scores, population_size: int, minimum: float):
+        super().__init__(scores)
+        self.population_size = population_size
+        self.minimum = float(minimum)
+
+        # The documents are given by their index in the full score vector, looked up with binary search
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self._order = np.argsort(self.indices)
+        self._sorted_indices = self.indices[self._order]
+
+    def _scores_of(self, indices) -> np.ndarray:
+        positions = np.searchsorted(self._sorted_indices, np.asarray(indices, dtype=np.int64))
+        return self.scores[self._order[positions]]
+
+    def ranks(self, indices) -> np.ndarray:
+        scores = self._scores_of(indices)
+        return len(self.sorted_scores) - np.searchsorted(self.sorted_scores, scores, side="right") + 1
+
+    def percentiles(self, indices) -> np.ndarray:
+        scores = self._scores_of(indices)
+        num_not_lower = len(self.sorted_scores) - np.searchsorted(self.sorted_scores, scores, side="left")
+        return (self.population_size - num_not_lower) / self.population_size
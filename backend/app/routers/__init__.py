@@ -1,4 +1,7 @@
 from .plant_router import plants_router
 from .questions_router import question_router
 from .recommendations_router import recommendations_router
-from .user_study_router import user_study_router
\ No newline at end of file
+from .user_study_router import user_study_router
+from .monitoring_router import monitoring_router
+from .health_router import health_router
+from .metrics_router import metrics_router
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, HTTPException, Response
+from starlette import status
+from ..startup import startup_warm_up
+
+health_router = APIRouter(prefix="/health", tags=["Health"])
+
+
+""" -----------------------------------------------------------------------------------------------
+ Liveness probe: the process is up and answers requests, also while it is still warming up. 503
+ once all attempts of the warm-up failed or the app is not ready by the deadline, so the
+ orchestrator restarts the worker instead of keeping one that never becomes ready.
+----------------------------------------------------------------------------------------------- """
+@health_router.get("/live",
+                   summary="Check if the API is alive",
+                   status_code=status.HTTP_200_OK)
+
+def get_live(response: Response):
+
+    """
+    Returns 200 as long as the API answers requests and can still become ready (503 otherwise).
+    """
+    try:
+        if not startup_warm_up.alive:
+            response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+            return {"status": "failed"}
+        return {"status": "alive"}
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching liveness")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Readiness probe for the load balancer: 200 only once the startup and the warm-up (SBERT model,
+ corpus embeddings, a synthetic query through each recommender) are done, 503 before that, while
+ a failed warm-up is retried or after all attempts failed. Returns the timings of the startup phases as well.
+----------------------------------------------------------------------------------------------- """
+@health_router.get("/ready",
+                   summary="Check if the API is warmed up and ready for traffic",
+                   status_code=status.HTTP_200_OK)
+
+def get_ready(response: Response):
+
+    """
+    Returns 200 once the warm-up is done (503 before), with the duration of every startup phase in milliseconds.
+    """
+    try:
+        stats = startup_warm_up.stats()
+        if not stats["ready"]:
+            response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return stats
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching readiness")
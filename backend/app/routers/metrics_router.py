@@ -0,0 +1,57 @@
+from fastapi import APIRouter, HTTPException, Response
+from starlette import status
+from ..database.commit_stats import commit_stats
+from ..database.write_behind import write_behind_queue
+from ..recommender.BM25 import bm25_registry
+from ..recommender.SBERT import sbert_registry
+from ..services import plant_catalog_cache, plant_name_index, plant_like_counter
+from ..services.prometheus import CONTENT_TYPE, format_histogram, format_stats
+from ..services.timing import request_histogram, stage_histogram
+from ..startup import startup_warm_up
+
+metrics_router = APIRouter(tags=["Monitoring"])
+
+# Component name (metric prefix air_<component>_) -> its statistics, the same as the /monitoring endpoints
+COMPONENT_STATS = {
+    "startup": startup_warm_up.stats,
+    "database": commit_stats,
+    "write_behind": write_behind_queue.stats,
+    "plant_catalog": plant_catalog_cache.stats,
+    "plant_name_index": plant_name_index.stats,
+    "like_counter": plant_like_counter.stats,
+    "bm25_index": bm25_registry.stats,
+    "sbert_index": sbert_registry.index_stats,
+    "sbert_batching": sbert_registry.query_batcher.stats,
+    "sbert_query_cache": sbert_registry.query_cache.stats,
+}
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint for Prometheus: the duration of the requests per route and of their stages (see
+ timing.py, the same stages as in the Server-Timing header) as histograms, and the statistics of
+ all components of the /monitoring endpoints, in the Prometheus text format.
+----------------------------------------------------------------------------------------------- """
+@metrics_router.get("/metrics",
+                    summary="Get all metrics in the Prometheus text format",
+                    status_code=status.HTTP_200_OK)
+
+def get_metrics():
+
+    """
+    Get request and stage latency histograms and the statistics of all components, for scraping by Prometheus.
+    """
+    try:
+        lines = format_histogram("http_request_duration_seconds", "Duration of the requests per route",
+                                 request_histogram)
+        lines += format_histogram("stage_duration_seconds", "Duration of the timed stages of the requests",
+                                  stage_histogram)
+        for component, stats in COMPONENT_STATS.items():
+            lines += format_stats(component, stats())
+
+        return Response(content="\n".join(lines) + "\n", media_type=CONTENT_TYPE)
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching metrics")
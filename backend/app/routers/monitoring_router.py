@@ -0,0 +1,209 @@
+from fastapi import APIRouter, HTTPException
+from starlette import status
+from ..database.commit_stats import commit_stats
+from ..database.write_behind import write_behind_queue
+from ..recommender.BM25 import bm25_registry
+from ..recommender.SBERT import sbert_registry
+from ..services import plant_catalog_cache, plant_name_index, plant_like_counter
+
+monitoring_router = APIRouter(prefix="/monitoring", tags=["Monitoring"])
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that returns the statistics of the SBERT query batching (batch sizes, wait times), to
+ be able to tune the batching window under load.
+----------------------------------------------------------------------------------------------- """
+@monitoring_router.get("/sbert_batching",
+                       summary="Get SBERT query batching statistics",
+                       status_code=status.HTTP_200_OK)
+
+def get_sbert_batching_stats():
+
+    """
+    Get batch sizes and wait times of the free text query encoding.
+    """
+    try:
+        return sbert_registry.query_batcher.stats()
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching sbert batching statistics")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that returns information about the SBERT vector index, e.g. mode and memory usage.
+----------------------------------------------------------------------------------------------- """
+@monitoring_router.get("/sbert_index",
+                       summary="Get SBERT vector index information",
+                       status_code=status.HTTP_200_OK)
+
+def get_sbert_index_stats():
+
+    """
+    Get mode, embedding storage type and memory usage of the SBERT vector index.
+    """
+    try:
+        return sbert_registry.index_stats()
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching sbert index information")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that returns the counters of the SBERT query embedding cache.
+----------------------------------------------------------------------------------------------- """
+@monitoring_router.get("/sbert_query_cache",
+                       summary="Get SBERT query embedding cache statistics",
+                       status_code=status.HTTP_200_OK)
+
+def get_sbert_query_cache_stats():
+
+    """
+    Get size, hits, misses and evictions of the free text query embedding cache.
+    """
+    try:
+        return sbert_registry.query_cache.stats()
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching sbert query cache statistics")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that returns the state of the shared BM25 index, e.g. if a rebuild is running.
+----------------------------------------------------------------------------------------------- """
+@monitoring_router.get("/bm25_index",
+                       summary="Get BM25 index information",
+                       status_code=status.HTTP_200_OK)
+
+def get_bm25_index_stats():
+
+    """
+    Get size and rebuild state of the BM25 index.
+    """
+    try:
+        return bm25_registry.stats()
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching bm25 index information")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that returns the number of database commits (transactions) since startup. Together with
+ the number of requests this gives the commits per request.
+----------------------------------------------------------------------------------------------- """
+@monitoring_router.get("/database_commits",
+                       summary="Get the number of database commits",
+                       status_code=status.HTTP_200_OK)
+
+def get_database_commit_stats():
+
+    """
+    Get the total number of database commits since startup.
+    """
+    try:
+        return commit_stats()
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching database commit statistics")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that returns depth and lag of the write-behind queue for answers and recommendations.
+----------------------------------------------------------------------------------------------- """
+@monitoring_router.get("/write_behind",
+                       summary="Get write-behind queue statistics",
+                       status_code=status.HTTP_200_OK)
+
+def get_write_behind_stats():
+
+    """
+    Get queue depth, written and failed writes and the lag between queueing and storing.
+    """
+    try:
+        return write_behind_queue.stats()
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching write-behind statistics")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that returns the state of the pre-serialized plant catalog cache of GET /plants/all.
+----------------------------------------------------------------------------------------------- """
+@monitoring_router.get("/plant_catalog",
+                       summary="Get plant catalog cache statistics",
+                       status_code=status.HTTP_200_OK)
+
+def get_plant_catalog_stats():
+
+    """
+    Get size, cached pages and hits of the plant catalog cache.
+    """
+    try:
+        return plant_catalog_cache.stats()
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching plant catalog information")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that returns the state of the trigram name index of the plant search and autocomplete.
+----------------------------------------------------------------------------------------------- """
+@monitoring_router.get("/plant_name_index",
+                       summary="Get plant name index statistics",
+                       status_code=status.HTTP_200_OK)
+
+def get_plant_name_index_stats():
+
+    """
+    Get number of plants, trigrams and memory of the plant name index.
+    """
+    try:
+        return plant_name_index.stats()
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching plant name index information")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that returns the state of the like counter (likes counted in memory and their flushes).
+----------------------------------------------------------------------------------------------- """
+@monitoring_router.get("/like_counter",
+                       summary="Get like counter statistics",
+                       status_code=status.HTTP_200_OK)
+
+def get_like_counter_stats():
+
+    """
+    Get pending plants, flushes and errors of the like counter.
+    """
+    try:
+        return plant_like_counter.stats()
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error fetching like counter statistics")
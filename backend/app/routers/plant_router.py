@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Query, Depends, HTTPException, Path
+from fastapi import APIRouter, Query, Depends, HTTPException, Path, Header, Response
 from sqlalchemy.orm import Session
 from starlette import status
 from starlette.status import HTTP_404_NOT_FOUND
-from app.database.database import get_db
-from app.schemas import Plant, PlantLikeResponse
+from app.database.database import get_db, get_read_db
+from app.schemas import Plant, PlantLikeResponse, PlantFilterResponse, PlantSearchResponse, PlantSuggestionResponse
 from app.services import plant_service
 from app.enums import Growth, Soil, SunLight, Watering, Fertilization
 
@@ -20,20 +20,37 @@ plants_router = APIRouter(prefix="/plants", tags=["Plants"])
 
 def get_all_plants(skip: int = Query(0, ge=0, description="Number of entries to skip"),
                    limit: int = Query(10, gt=0, le=600, description="Number of entries to return"),
-                   db: Session = Depends(get_db)):
+                   after_id: int | None = Query(None, ge=0, description="Return plants after this id"),
+                   if_none_match: str | None = Header(None, description="ETag of a previously received page"),
+                   db: Session = Depends(get_read_db)):
 
     """
-    Get all available plants. Pagination possible.
+    Get all available plants. Pagination possible, with skip or after the last id of the previous page.
+    Sends an ETag, if it is sent back in If-None-Match and the page did not change, the answer is a 304.
     """
     try:
-        plants = plant_service.fetch_plants(db=db, skip=skip, limit=limit)
-        return plants
+        page = plant_service.fetch_plants(db=db, skip=skip, limit=limit, after_id=after_id)
+
+        headers = {"ETag": page.etag, "Cache-Control": "no-cache"}
+        if _etag_matches(if_none_match=if_none_match, etag=page.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response(content=page.body, media_type="application/json", headers=headers)
     except HTTPException:
         raise
     except:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unexpected error fetching all plants")
 
 
+# If-None-Match holds one or more (possibly weak) ETags separated by commas, or *
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
 """ -----------------------------------------------------------------------------------------------
  Endpoint that allows filtering by given criteria
 ----------------------------------------------------------------------------------------------- """
@@ -48,7 +65,7 @@ def filter_plants(name: str = Query(None, description="Search for exact or simil
                   sun: SunLight = Query(None, description="Filter by sun light"),
                   water: Watering = Query(None, description="Filter by water options"),
                   fertilization: Fertilization = Query(None, description="Filter by fertilization type"),
-                  db: Session = Depends(get_db)):
+                  db: Session = Depends(get_read_db)):
 
     """
     Filter plants by different options. If no filter option - all plants are returned
@@ -61,13 +78,101 @@ def filter_plants(name: str = Query(None, description="Search for exact or simil
                                                       sun=sun,
                                                       water=water,
                                                       fertilization=fertilization)
-        return filtered_plants
+        return filtered_plants.plants
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unexpected error filtering plants")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that filters like the previous one and adds the facet counts, so the filter UI can show
+ the number of plants per option without extra requests
+----------------------------------------------------------------------------------------------- """
+@plants_router.get("/filter/facets",
+                 summary="Filter Plants with facet counts",
+                 response_model=PlantFilterResponse,
+                 status_code=status.HTTP_200_OK)
+
+def filter_plants_with_facets(name: str = Query(None, description="Search for exact or similar names"),
+                              growth: Growth = Query(None, description="Filter by growth speed"),
+                              soil: Soil = Query(None, description="Filter by soil type"),
+                              sun: SunLight = Query(None, description="Filter by sun light"),
+                              water: Watering = Query(None, description="Filter by water options"),
+                              fertilization: Fertilization = Query(None, description="Filter by fertilization type"),
+                              db: Session = Depends(get_read_db)):
+
+    """
+    Filter plants by different options and get, per filter, the number of plants for each option
+    (combined with all other selected filters).
+    """
+    try:
+        filtered_plants = plant_service.filter_plants(db=db,
+                                                      name=name,
+                                                      growth=growth,
+                                                      soil=soil,
+                                                      sun=sun,
+                                                      water=water,
+                                                      fertilization=fertilization,
+                                                      with_facets=True)
+        return PlantFilterResponse(total=len(filtered_plants.plants),
+                                   plants=filtered_plants.plants,
+                                   facets=filtered_plants.facets)
     except HTTPException:
         raise
     except:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unexpected error filtering plants")
 
 
+""" -----------------------------------------------------------------------------------------------
+ Endpoint for a ranked search of plant names, tolerating typos
+----------------------------------------------------------------------------------------------- """
+@plants_router.get("/search",
+                 summary="Search Plants by name",
+                 response_model=list[PlantSearchResponse],
+                 status_code=status.HTTP_200_OK)
+
+def search_plants(q: str = Query(..., min_length=1, max_length=100, description="Name or part of a name"),
+                  limit: int = Query(20, gt=0, le=100, description="Number of matches to return"),
+                  fuzzy: bool = Query(True, description="Include similar names, e.g. with typos"),
+                  db: Session = Depends(get_read_db)):
+
+    """
+    Search plants by name. Best matches first: exact name, name or a word starting with the query,
+    name containing it and (with fuzzy) similar names.
+    """
+    try:
+        return plant_service.search_plants(db=db, query=q, limit=limit, fuzzy=fuzzy)
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unexpected error searching plants")
+
+
+""" -----------------------------------------------------------------------------------------------
+ Endpoint for suggestions while typing a plant name
+----------------------------------------------------------------------------------------------- """
+@plants_router.get("/autocomplete",
+                 summary="Autocomplete Plant names",
+                 response_model=list[PlantSuggestionResponse],
+                 status_code=status.HTTP_200_OK)
+
+def autocomplete_plants(prefix: str = Query(..., min_length=1, max_length=100, description="Typed start of a name"),
+                        limit: int = Query(10, gt=0, le=50, description="Number of suggestions to return"),
+                        db: Session = Depends(get_read_db)):
+
+    """
+    Get plant names starting with the prefix (or with a word starting with it), names starting with
+    it first, then shorter names first.
+    """
+    try:
+        return plant_service.autocomplete_plants(db=db, prefix=prefix, limit=limit)
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unexpected error autocompleting plant names")
+
+
 """ -----------------------------------------------------------------------------------------------
  Endpoint that lets the user store likes to a plant
 ----------------------------------------------------------------------------------------------- """
@@ -156,13 +261,14 @@ def unlike_plant(plant_id: int = Path(description="The id of a plant"),
                    response_model=list[PlantLikeResponse],
                    status_code=status.HTTP_200_OK)
 
-def get_all_liked_plants(db: Session = Depends(get_db)):
+def get_all_liked_plants(limit: int | None = Query(None, gt=0, le=600, description="Return only the most liked plants"),
+                         db: Session = Depends(get_read_db)):
 
     """
-    Get all liked plants of the user
+    Get all liked plants of the user with their like counter, most liked first
     """
     try:
-        all_liked_plants = plant_service.get_all_liked_plants(db=db)
+        all_liked_plants = plant_service.get_all_liked_plants(db=db, limit=limit)
         return all_liked_plants
 
     except HTTPException:
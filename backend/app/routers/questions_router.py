@@ -58,7 +58,7 @@ def post_questions_receive_recommendation(
 
     try:
         # First step input validation, all 5 questions must be answered
-        question_service.validate_questionnaire(user_answers=questionnaire)
+        question_service.validate_questionnaire(user_answers=questionnaire, db=db)
 
         # Then storing the answers to database, for further use later (e.g. evaluations)
         submission_id = question_service.store_user_answers(user_answers=questionnaire, db=db)
@@ -1,7 +1,10 @@
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from starlette import status
-from app.database.database import get_db
+from app.database.database import get_db, get_read_db
+from app.enums import Algorithm, ExportFormat, Label
 from app.schemas import DeleteMetadataResponse
 from ..schemas.recommendations_schema import RecommendationRatingResponse, AllRecommendations
 from ..services import recommendations_service
@@ -54,14 +57,21 @@ def rate_recommendation(submission_id: int = Path(description="The submission id
                             status_code=status.HTTP_200_OK)
 
 def get_all_ratings(include_unrated: bool = True,
-                    db: Session = Depends(get_db)):
+                    after_submission_id: int | None = Query(None, ge=0, description="Return submissions after this id"),
+                    limit: int | None = Query(None, gt=0, le=recommendations_service.MAX_PAGE_SIZE,
+                                              description="Number of submissions to return (default all)"),
+                    db: Session = Depends(get_read_db)):
 
     """
-    Get all past received recommendations, decide whether to include unrated recommendations too
+    Get all past received recommendations, decide whether to include unrated recommendations too.
+    Pagination possible: the next page starts after the last submission id of the previous one.
     """
 
     try:
-        all_recs = recommendations_service.get_all_recommendations(db=db, include_non_rated=include_unrated)
+        all_recs = recommendations_service.get_all_recommendations(db=db,
+                                                                   include_non_rated=include_unrated,
+                                                                   after_submission_id=after_submission_id,
+                                                                   limit=limit)
         return all_recs
 
     except HTTPException:
@@ -71,6 +81,53 @@ def get_all_ratings(include_unrated: bool = True,
                             detail="Unexpected error fetching all received recommendations")
 
 
+""" -----------------------------------------------------------------------------------------------
+ Endpoint that streams the whole recommendation history for offline analysis, one line per
+ recommendation, as JSON lines or CSV. Filter options for algorithm, label, rating and date range.
+----------------------------------------------------------------------------------------------- """
+@recommendations_router.get("/export",
+                            summary="Export the recommendation history",
+                            response_class=StreamingResponse,
+                            status_code=status.HTTP_200_OK)
+
+def export_recommendations(export_format: ExportFormat = Query(ExportFormat.ndjson, alias="format",
+                                                               description="ndjson or csv"),
+                           algorithm: Algorithm = Query(None, description="Filter by algorithm"),
+                           label: Label = Query(None, description="Filter by label"),
+                           min_rating: int = Query(None, ge=1, le=5, description="Minimum rating of the submission"),
+                           max_rating: int = Query(None, ge=1, le=5, description="Maximum rating of the submission"),
+                           created_from: datetime = Query(None, description="Submissions created at or after"),
+                           created_to: datetime = Query(None, description="Submissions created at or before")):
+
+    """
+    Export all recommendations with submission, plant and metadata, one line per recommendation.
+    """
+    if min_rating is not None and max_rating is not None and min_rating > max_rating:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="min_rating is greater than max_rating")
+    if created_from is not None and created_to is not None and created_from > created_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="created_from is after created_to")
+
+    try:
+        query = recommendations_service.create_export_query(algorithm=algorithm,
+                                                            label=label,
+                                                            min_rating=min_rating,
+                                                            max_rating=max_rating,
+                                                            created_from=created_from,
+                                                            created_to=created_to)
+
+        media_type = "text/csv" if export_format == ExportFormat.csv else "application/x-ndjson"
+        return StreamingResponse(
+            recommendations_service.stream_recommendation_export(query=query, export_format=export_format),
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename=recommendations.{export_format.value}"})
+
+    except HTTPException:
+        raise
+    except:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail="Unexpected error exporting recommendations")
+
+
 """ -----------------------------------------------------------------------------------------------
  Endpoint that deletes all stored user data about recommendations (user studys stay!) This
  is a helper for development
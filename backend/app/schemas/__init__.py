@@ -1,5 +1,6 @@
 from .plant_schema import (Plant, PlantRecommendation, RecommendationMetadataBM25, RecommendationMetadataSBERT,
-                           PlantMetadata, PlantLikeResponse)
+                           PlantMetadata, PlantLikeResponse, PlantFilterResponse, PlantSearchResponse,
+                           PlantSuggestionResponse)
 from .question_schema import Question
 from .answer_schema import Answer, UserAnswer, UserAnswerSubmission, UserFreeTextSubmission
 from .recommendations_schema import RecommendationRatingResponse, DeleteMetadataResponse, UserInput, UserInputQuestionnaire
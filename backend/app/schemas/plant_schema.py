@@ -79,3 +79,30 @@ class PlantLikeResponse(BaseModel):
     fertilization: str
     image_url: str | None
     like_counter: int
+
+
+""" -----------------------------------------------------------------------------------------------
+ Schema for returning filtered plants together with the facet counts: per filter, the number of
+ plants per option, given all other active filters
+----------------------------------------------------------------------------------------------- """
+class PlantFilterResponse(BaseModel):
+    total: int
+    plants: list[Plant]
+    facets: dict[str, dict[str, int]]
+
+
+""" -----------------------------------------------------------------------------------------------
+ Schema for returning a match of the name search, score from 0 to 1 (1 for the exact name)
+----------------------------------------------------------------------------------------------- """
+class PlantSearchResponse(BaseModel):
+    id: int
+    name: str
+    score: float
+
+
+""" -----------------------------------------------------------------------------------------------
+ Schema for returning a suggestion of the name autocomplete
+----------------------------------------------------------------------------------------------- """
+class PlantSuggestionResponse(BaseModel):
+    id: int
+    name: str
@@ -0,0 +1,121 @@
+import sys
+import time
+import numpy as np
+from app.recommender.BM25 import bm25_service
+from app.recommender.BM25.bm25_inverted_index import BM25InvertedIndex
+from app.recommender.BM25.bm25_matrix import SparseBM25
+from app.recommender.score_metadata import ScoreMetadata
+
+CATALOG_SIZES = (10_000, 100_000, 1_000_000)
+NUM_QUERIES = 50
+NUM_NAMES = 5_000
+K = 8
+
+# Attributes of the plants with the number of possible values: like in the real corpus (every term is in a
+# large share of the plants), and with more selective terms (e.g. richer plant descriptions)
+CORPUS_PROFILES = {
+    "questionnaire attributes": {"growth": 3, "soil": 3, "water": 3, "sun": 5, "fertilizer": 2},
+    "selective attributes": {"growth": 3, "soil": 20, "water": 3, "sun": 50, "fertilizer": 2, "color": 100},
+}
+
+""" -----------------------------------------------------------------------------------------------
+ Synthetic catalog in the format of the BM25 plant corpus (see bm25_service.create_plant_corpus):
+ the plant id, the name and one term per attribute. Queries have one term per attribute, some are
+ left out ("don't care"). Pruning depends on how selective the query terms are, so both profiles
+ are measured.
+ Run from the backend/ folder with: python -m app.scripts.benchmark_bm25_retrieval [num_plants ...]
+----------------------------------------------------------------------------------------------- """
+def create_synthetic_corpus(num_plants: int, attributes: dict[str, int],
+                            rng: np.random.Generator) -> list[list[str]]:
+    values = {name: rng.integers(0, num_values, size=num_plants) for name, num_values in attributes.items()}
+    names = rng.integers(0, NUM_NAMES, size=num_plants)
+
+    return [[str(i), f"plant_{names[i]}"] + [f"{name}_{values[name][i]}" for name in attributes]
+            for i in range(num_plants)]
+
+
+def create_queries(attributes: dict[str, int], rng: np.random.Generator) -> list[list[str]]:
+    queries = []
+    for _ in range(NUM_QUERIES):
+        query = [f"{name}_{rng.integers(0, num_values)}" for name, num_values in attributes.items()
+                 if rng.random() > 0.2]
+        queries.append(query or ["growth_0"])
+    return queries
+
+
+def time_per_query(function, queries: list[list[str]]) -> float:
+    started = time.perf_counter()
+    for query in queries:
+        function(query)
+    return (time.perf_counter() - started) / len(queries) * 1000
+
+
+""" -----------------------------------------------------------------------------------------------
+ Path 1 (top-k): exhaustive scoring + argsort against the pruned inverted index, results must be
+ equal (scores and metadata of the top documents).
+ Path 2 (percentile bands): percentile band of all scores against the band of the fixed sample.
+----------------------------------------------------------------------------------------------- """
+def benchmark(num_plants: int, profile: str) -> bool:
+    rng = np.random.default_rng(3)
+    corpus = create_synthetic_corpus(num_plants, CORPUS_PROFILES[profile], rng)
+    queries = create_queries(CORPUS_PROFILES[profile], rng)
+
+    started = time.perf_counter()
+    bm25 = SparseBM25(corpus)
+    index = BM25InvertedIndex(bm25)
+    print(f"{num_plants} plants ({profile}), build: {time.perf_counter() - started:.1f}s, "
+          f"posting lists: {index.memory_bytes / 1024 / 1024:.1f} MiB")
+
+    def exhaustive_top_k(query):
+        scores = bm25.get_scores(query)
+        return scores.argsort()[::-1][:K], ScoreMetadata(scores)
+
+    def exhaustive_bands(query):
+        scores = bm25.get_scores(query)
+        return [bm25_service.get_percentile_band(scores=scores, min_p=low, max_p=high)
+                for low, high in (bm25_service.GOOD_FITS_PERCENTILES, bm25_service.MISMATCH_PERCENTILES)]
+
+    def sampled_bands(query):
+        _, metadata = index.band_scores(query)
+        return [bm25_service.get_percentile_band(scores=metadata.scores, min_p=low, max_p=high)
+                for low, high in (bm25_service.GOOD_FITS_PERCENTILES, bm25_service.MISMATCH_PERCENTILES)]
+
+    print(f"  top-k exhaustive: {time_per_query(exhaustive_top_k, queries):.2f} ms per query")
+    print(f"  top-k inverted (MaxScore, incl. sample scores): "
+          f"{time_per_query(lambda q: index.top_k(q, K), queries):.2f} ms per query")
+    print(f"  bands exhaustive: {time_per_query(exhaustive_bands, queries):.2f} ms per query")
+    print(f"  bands sampled ({len(index.band_sample)} plants): "
+          f"{time_per_query(sampled_bands, queries):.2f} ms per query")
+
+    # Equivalence of the top-k path
+    for query in queries:
+        expected_indices, expected = exhaustive_top_k(query)
+        actual_indices, actual = index.top_k(query, K)
+
+        checks = [
+            np.allclose(expected.raw(expected_indices), actual.raw(actual_indices)),
+            np.array_equal(expected.ranks(actual_indices), actual.ranks(actual_indices)),
+            np.allclose(expected.percentiles(actual_indices), actual.percentiles(actual_indices)),
+            np.allclose(expected.normalized(actual_indices), actual.normalized(actual_indices)),
+        ]
+        if not all(checks):
+            print(f"  top-k of the inverted index differs for query {query}!")
+            return False
+
+    return True
+
+
+def main():
+    catalog_sizes = [int(size) for size in sys.argv[1:]] or CATALOG_SIZES
+
+    all_equal = True
+    for num_plants in catalog_sizes:
+        for profile in CORPUS_PROFILES:
+            all_equal &= benchmark(num_plants, profile)
+
+    if not all_equal:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import csv
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from sqlalchemy import insert, select
+from sqlalchemy.orm import sessionmaker
+from app.database.database import create_sqlite_engine
+from app.database.migrations import migrate
+from app.models import Plant
+from app.services.plant_name_index import NameSnapshot
+from app.services.database_service import FILE_PATH
+
+NUM_PLANTS = 1_000_000
+NUM_QUERIES = 200
+NUM_SQL_QUERIES = 20
+LIMIT = 20
+
+# p95 latency per kind of query that the index has to meet on the synthetic catalog
+LATENCY_TARGET_MS = 50.0
+
+# Cultivar names are built from syllables, so the catalog has many distinct trigrams like real names
+SYLLABLES = ("ka", "ri", "mo", "lu", "sa", "ne", "to", "vi", "ga", "pe", "zo", "bel", "dra", "fin", "hor", "qui")
+
+""" -----------------------------------------------------------------------------------------------
+ Latency benchmark of the plant name search (see plant_name_index.py) on a synthetic catalog of
+ NUM_PLANTS names: the real plant names of the dataset combined with generated cultivar names.
+ Measured per kind of query: substring search (parts of names, 2 to 8 characters), fuzzy search
+ (names with a typo) and autocomplete (starts of words, 1 to 4 characters), compared with the
+ previous name LIKE '%query%' on the plants table.
+ Run from the backend/ folder with: python -m app.scripts.benchmark_name_search [num_plants]
+ Fails with exit code 1, if the p95 latency of a kind is above LATENCY_TARGET_MS.
+----------------------------------------------------------------------------------------------- """
+def create_names(num_plants: int, rng: np.random.Generator) -> list[str]:
+    with open(FILE_PATH, newline="", encoding="utf-8") as file:
+        plant_names = sorted({row["plant name"].lower() for row in csv.DictReader(file) if row["plant name"]})
+
+    bases = rng.integers(0, len(plant_names), size=num_plants)
+    syllables = rng.integers(0, len(SYLLABLES), size=(num_plants, 3))
+    return [f"{plant_names[base]} {''.join(SYLLABLES[s] for s in cultivar)}"
+            for base, cultivar in zip(bases, syllables)]
+
+
+def create_queries(names: list[str], rng: np.random.Generator) -> dict[str, list[str]]:
+    samples = [names[i] for i in rng.integers(0, len(names), size=NUM_QUERIES)]
+
+    substrings = []
+    for name in samples:
+        length = int(rng.integers(2, 9))
+        start = int(rng.integers(0, max(1, len(name) - length + 1)))
+        substrings.append(name[start:start + length])
+
+    typos = []
+    for name in samples:
+        base = name.rsplit(" ", 1)[0]
+        position = int(rng.integers(0, len(base)))
+        typos.append(base[:position] + base[position + 1:])
+
+    prefixes = []
+    for name in samples:
+        word = str(rng.choice(name.split()))
+        prefixes.append(word[:int(rng.integers(1, 5))])
+
+    return {"substring": substrings, "fuzzy": typos, "autocomplete": prefixes}
+
+
+def measure(run, queries: list[str]) -> dict:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        run(query)
+        latencies.append(time.perf_counter() - started)
+
+    return {"p50_ms": np.percentile(latencies, 50) * 1000, "p95_ms": np.percentile(latencies, 95) * 1000,
+            "max_ms": max(latencies) * 1000}
+
+
+def measure_sql(names: list[str], queries: list[str]) -> dict:
+    with tempfile.TemporaryDirectory() as folder:
+        engine = create_sqlite_engine(path=Path(folder) / "benchmark.db")
+        migrate(engine=engine)
+
+        with engine.begin() as connection:
+            connection.execute(insert(Plant), [{"name": name, "growth": "slow", "soil": "sandy",
+                                                "sunlight": "full sunlight", "watering": "keep moist",
+                                                "fertilization": "low-nitrogen"} for name in names])
+
+        db = sessionmaker(bind=engine)()
+        try:
+            return measure(lambda query: db.execute(select(Plant.id, Plant.name)
+                                                    .where(Plant.name.ilike(f"%{query}%"))).all(), queries)
+        finally:
+            db.close()
+            engine.dispose()
+
+
+def report(kind: str, values: dict):
+    print(f"  {kind}: p50 {values['p50_ms']:.2f} ms, p95 {values['p95_ms']:.2f} ms, max {values['max_ms']:.2f} ms")
+
+
+def main():
+    num_plants = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_PLANTS
+    rng = np.random.default_rng(0)
+    names = create_names(num_plants, rng)
+    queries = create_queries(names, rng)
+
+    started = time.perf_counter()
+    snapshot = NameSnapshot.from_rows(enumerate(names, start=1))
+    print(f"{num_plants} plants, index built in {time.perf_counter() - started:.1f}s, "
+          f"{snapshot.trigrams.size} trigrams, {snapshot.postings.size} postings")
+
+    print(f"before (name LIKE '%query%', {NUM_SQL_QUERIES} queries):")
+    report("substring", measure_sql(names, queries["substring"][:NUM_SQL_QUERIES]))
+
+    results = {
+        "substring": measure(lambda query: snapshot.search(query, limit=LIMIT, fuzzy=False), queries["substring"]),
+        "fuzzy": measure(lambda query: snapshot.search(query, limit=LIMIT), queries["fuzzy"]),
+        "autocomplete": measure(lambda query: snapshot.autocomplete(query, limit=LIMIT), queries["autocomplete"]),
+    }
+
+    print(f"after (trigram index, {NUM_QUERIES} queries per kind, target p95 {LATENCY_TARGET_MS:.0f} ms):")
+    for kind, values in results.items():
+        report(kind, values)
+
+    if any(values["p95_ms"] > LATENCY_TARGET_MS for values in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app.database.database import Base, create_sqlite_engine
+from app.models import Plant, UserSubmission, UserAnswer
+
+NUM_PLANTS = 5_000
+NUM_READERS = 16
+NUM_WRITERS = 4
+DURATION_SECONDS = 5.0
+PAGE_SIZE = 100
+ANSWERS_PER_SUBMISSION = 5
+
+""" -----------------------------------------------------------------------------------------------
+ Concurrency benchmark of the sqlite engine profile (see database.py). Readers page through the
+ plants like GET /plants/all, writers store a submission with its answers like POST /questionnaire,
+ all at the same time for a fixed duration, on a fresh database file in a temp folder:
+ - before: create_engine with defaults, as it was (rollback journal, one engine for everything)
+ - after: tuned profile (WAL, pragmas, pool sizing) with a separate read-only engine for readers
+ Reports throughput, latency percentiles and the number of "database is locked" errors.
+ Run from the backend/ folder with: python -m app.scripts.benchmark_sqlite_engine [duration_seconds]
+----------------------------------------------------------------------------------------------- """
+def create_database(path: Path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as connection:
+        connection.execute(insert(Plant), [{"name": f"plant {i}", "growth": "slow", "soil": "sandy",
+                                            "sunlight": "full sunlight", "watering": "keep moist",
+                                            "fertilization": "low-nitrogen", "image_url": ""}
+                                           for i in range(NUM_PLANTS)])
+    engine.dispose()
+
+
+def run_workload(write_sessions: sessionmaker, read_sessions: sessionmaker, duration: float) -> dict:
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+
+    def reader(seed: int):
+        rng = np.random.default_rng(seed)
+        while not stop.is_set():
+            started = time.perf_counter()
+            db = read_sessions()
+            failed = False
+            try:
+                db.query(Plant).offset(int(rng.integers(0, NUM_PLANTS - PAGE_SIZE))).limit(PAGE_SIZE).all()
+            except OperationalError:
+                failed = True
+            finally:
+                db.close()
+            record("read", failed, started)
+
+    def writer():
+        while not stop.is_set():
+            started = time.perf_counter()
+            db = write_sessions()
+            failed = False
+            try:
+                submission = UserSubmission(free_text="", created_at=datetime.now())
+                db.add(submission)
+                db.flush()
+                db.execute(insert(UserAnswer), [{"question_id": q, "answer_id": q, "submission_id": submission.id}
+                                                for q in range(1, ANSWERS_PER_SUBMISSION + 1)])
+                db.commit()
+            except OperationalError:
+                db.rollback()
+                failed = True
+            finally:
+                db.close()
+            record("write", failed, started)
+
+    def record(kind: str, failed: bool, started: float):
+        with lock:
+            if failed:
+                errors[kind] += 1
+            else:
+                latencies[kind].append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(NUM_READERS)]
+    threads += [threading.Thread(target=writer) for _ in range(NUM_WRITERS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {kind: {"per_second": len(latencies[kind]) / duration,
+                   "p50_ms": np.percentile(latencies[kind], 50) * 1000 if latencies[kind] else float("nan"),
+                   "p99_ms": np.percentile(latencies[kind], 99) * 1000 if latencies[kind] else float("nan"),
+                   "errors": errors[kind]}
+            for kind in ("read", "write")}
+
+
+def benchmark(name: str, duration: float) -> dict:
+    with tempfile.TemporaryDirectory() as folder:
+        path = Path(folder) / "benchmark.db"
+        create_database(path)
+
+        if name == "before":
+            engine = create_engine(f"sqlite:///{path}")
+            read_engine = engine
+        else:
+            engine = create_sqlite_engine(path=path)
+            read_engine = create_sqlite_engine(path=path, read_only=True)
+
+        result = run_workload(write_sessions=sessionmaker(bind=engine),
+                              read_sessions=sessionmaker(bind=read_engine),
+                              duration=duration)
+        engine.dispose()
+        read_engine.dispose()
+
+    print(f"{name}:")
+    for kind, values in result.items():
+        print(f"  {kind}s: {values['per_second']:.0f}/s, p50 {values['p50_ms']:.2f} ms, "
+              f"p99 {values['p99_ms']:.2f} ms, errors (database is locked): {values['errors']}")
+    return result
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else DURATION_SECONDS
+    print(f"{NUM_READERS} readers, {NUM_WRITERS} writers, {NUM_PLANTS} plants, {duration:.0f}s each")
+
+    benchmark("before", duration)
+    benchmark("after", duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import sys
+import time
+import numpy as np
+from rank_bm25 import BM25Okapi
+from app.database.database import SessionLocal
+from app.recommender.BM25 import bm25_service
+from app.recommender.BM25.bm25_matrix import SparseBM25
+
+NUM_SYNTHETIC_DOCUMENTS = 5_000
+NUM_QUERIES = 300
+VOCABULARY_SIZE = 800
+RELATIVE_TOLERANCE = 1e-9
+ABSOLUTE_TOLERANCE = 1e-9
+
+""" -----------------------------------------------------------------------------------------------
+ Equivalence check of the sparse BM25 engine (see bm25_matrix.py) against rank_bm25.BM25Okapi.
+ Checked on the plant corpus of the database (if it was already filled upon startup) and on a
+ synthetic corpus with repeated terms, different document lengths and terms in more than half of
+ the documents (negative idf). The queries contain repeated and unknown terms as well.
+ Run from the backend/ folder with: python -m app.scripts.check_bm25_engine
+ Fails with exit code 1, if any score differs more than the tolerance.
+----------------------------------------------------------------------------------------------- """
+def create_synthetic_corpus(rng: np.random.Generator) -> list[list[str]]:
+    # Zipf like term distribution, so some terms are in (almost) every document
+    probabilities = 1 / np.arange(1, VOCABULARY_SIZE + 1)
+    probabilities /= probabilities.sum()
+
+    corpus = []
+    for _ in range(NUM_SYNTHETIC_DOCUMENTS):
+        length = rng.integers(3, 40)
+        corpus.append([f"term_{t}" for t in rng.choice(VOCABULARY_SIZE, size=length, p=probabilities)])
+    return corpus
+
+
+def create_queries(corpus: list[list[str]], rng: np.random.Generator) -> list[list[str]]:
+    terms = sorted({term for document in corpus for term in document})
+    queries = []
+    for _ in range(NUM_QUERIES):
+        query = [terms[i] for i in rng.integers(0, len(terms), size=rng.integers(1, 8))]
+        query += query[:1] + ["unknown_term"]
+        queries.append(query)
+    return queries
+
+
+def load_plant_corpus() -> list[list[str]]:
+    db = SessionLocal()
+    try:
+        return [doc.split(" ") for doc in bm25_service.create_plant_corpus(db=db)]
+    except Exception:
+        return []
+    finally:
+        db.close()
+
+
+""" -----------------------------------------------------------------------------------------------
+ Compares single and batch scoring with BM25Okapi, prints the largest deviation and the timings.
+----------------------------------------------------------------------------------------------- """
+def check(name: str, corpus: list[list[str]], queries: list[list[str]]) -> bool:
+    okapi = BM25Okapi(corpus)
+    engine = SparseBM25(corpus)
+
+    started = time.perf_counter()
+    expected = np.array([okapi.get_scores(query) for query in queries])
+    okapi_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    single = np.array([engine.get_scores(query) for query in queries])
+    single_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = engine.get_batch_scores(queries)
+    batch_time = time.perf_counter() - started
+
+    max_error = max(float(np.max(np.abs(expected - single))), float(np.max(np.abs(expected - batch))))
+    equal = (np.allclose(single, expected, rtol=RELATIVE_TOLERANCE, atol=ABSOLUTE_TOLERANCE)
+             and np.allclose(batch, expected, rtol=RELATIVE_TOLERANCE, atol=ABSOLUTE_TOLERANCE))
+
+    print(f"{name}: {len(corpus)} documents, {len(queries)} queries, max abs error {max_error:.2e}")
+    print(f"  BM25Okapi: {okapi_time / len(queries) * 1000:.3f} ms per query")
+    print(f"  sparse single: {single_time / len(queries) * 1000:.3f} ms per query")
+    print(f"  sparse batch: {batch_time / len(queries) * 1000:.3f} ms per query")
+    return equal
+
+
+def main():
+    rng = np.random.default_rng(11)
+    all_equal = True
+
+    plant_corpus = load_plant_corpus()
+    if plant_corpus:
+        all_equal &= check("plant corpus", plant_corpus, create_queries(plant_corpus, rng))
+    else:
+        print("plant corpus: database is empty, start the app once to fill it")
+
+    synthetic_corpus = create_synthetic_corpus(rng)
+    all_equal &= check("synthetic corpus", synthetic_corpus, create_queries(synthetic_corpus, rng))
+
+    if not all_equal:
+        print("Scores of the sparse engine differ from BM25Okapi!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from app.database.commit_stats import commit_stats
+from app.database.database import create_sqlite_engine
+from app.database.migrations import migrate
+from app.models import UserPlantLike
+from app.services import store_csv_entries_to_db
+from app.services.like_counter import LikeCounter
+from app.services.plant_service import get_all_liked_plants
+
+NUM_THREADS = 16
+LIKES_PER_THREAD = 200
+# Plants liked by the threads, the first one by all of them (hot plant)
+PLANT_IDS = (1, 2, 3, 4)
+TOP_N = 3
+
+""" -----------------------------------------------------------------------------------------------
+ Check of the like counter (see like_counter.py) on a fresh database in a temp folder. NUM_THREADS
+ threads like the plants at the same time (every thread the first plant and one of the others,
+ every tenth like is taken back), once storing every like within the request and once counted in
+ memory with flushes. Both have to end with the exact number of likes; reported are the time and
+ the number of commits. GET /plants/all/likes has to be one query, with the top-N ordered by likes.
+ Run from the backend/ folder with: python -m app.scripts.check_like_counter
+ Fails with exit code 1, if likes got lost or the liked plants are not loaded in one query.
+----------------------------------------------------------------------------------------------- """
+def like_concurrently(counter: LikeCounter, sessions: sessionmaker) -> float:
+    def like(thread: int):
+        db = sessions()
+        try:
+            for i in range(LIKES_PER_THREAD):
+                for plant_id in (PLANT_IDS[0], PLANT_IDS[1 + thread % (len(PLANT_IDS) - 1)]):
+                    counter.add(db=db, plant_id=plant_id, delta=-1 if i % 10 == 9 else 1)
+        finally:
+            db.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=like, args=(thread,)) for thread in range(NUM_THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.close()
+    return time.perf_counter() - started
+
+
+def expected_likes() -> dict[int, int]:
+    # Every tenth like is taken back, a counter never goes below 0 as it starts with likes
+    per_thread = LIKES_PER_THREAD - 2 * (LIKES_PER_THREAD // 10)
+    expected = {PLANT_IDS[0]: NUM_THREADS * per_thread}
+    for thread in range(NUM_THREADS):
+        plant_id = PLANT_IDS[1 + thread % (len(PLANT_IDS) - 1)]
+        expected[plant_id] = expected.get(plant_id, 0) + per_thread
+    return expected
+
+
+def main():
+    passed = True
+    expected = expected_likes()
+
+    for name, enabled in (("stored per like", False), ("counted in memory", True)):
+        with tempfile.TemporaryDirectory() as folder:
+            engine = create_sqlite_engine(path=Path(folder) / "check.db")
+            migrate(engine=engine)
+            sessions = sessionmaker(bind=engine)
+            db = sessions()
+
+            try:
+                store_csv_entries_to_db(db=db)
+
+                commits = commit_stats()["total_commits"]
+                elapsed = like_concurrently(LikeCounter(session_factory=sessions, enabled=enabled), sessions)
+                commits = commit_stats()["total_commits"] - commits
+
+                likes = dict(db.query(UserPlantLike.plant_id, UserPlantLike.like_counter).all())
+                exact = likes == expected
+                print(f"{name}: {NUM_THREADS * LIKES_PER_THREAD * 2} likes in {elapsed:.2f}s, {commits} commits, "
+                      f"counters exact: {exact}")
+                passed &= exact
+
+                num_queries = 0
+
+                def count(*args):
+                    nonlocal num_queries
+                    num_queries += 1
+
+                event.listen(engine, "before_cursor_execute", count)
+                top = get_all_liked_plants(db=db, limit=TOP_N)
+                event.remove(engine, "before_cursor_execute", count)
+
+                ordered = [plant.like_counter for plant in top] == sorted(expected.values(), reverse=True)[:TOP_N]
+                print(f"  top {TOP_N} liked plants: {num_queries} query, ordered by likes: {ordered}")
+                passed &= num_queries == 1 and ordered
+            finally:
+                db.close()
+                engine.dispose()
+
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import event, insert
+from sqlalchemy.orm import sessionmaker
+from app.database.database import create_sqlite_engine
+from app.database.migrations import migrate
+from app.models import UserSubmission, UserAnswer, Recommendation, Bm25Metadata, SbertMetadata
+from app.services import store_csv_entries_to_db, store_questions_to_db, store_answer_options_to_db, question_registry
+from app.services.recommendations_service import get_all_recommendations, MAX_PAGE_SIZE
+
+NUM_SUBMISSIONS = 1_200
+RECOMMENDATIONS_PER_SUBMISSION = 15
+PAGE_SIZES = (1, 50, MAX_PAGE_SIZE)
+
+# Submissions, their user answers and their recommendations (joined with plant and metadata)
+MAX_QUERIES_PER_PAGE = 3
+
+""" -----------------------------------------------------------------------------------------------
+ Check of the query count of GET /recommendation/all (see recommendations_service.py). A fresh
+ database in a temp folder is filled with synthetic submissions (questionnaires with BM25 and free
+ texts with SBERT recommendations). Every page, whatever its size, must be loaded with at most
+ MAX_QUERIES_PER_PAGE queries, and paging through all submissions must return each one once.
+ Run from the backend/ folder with: python -m app.scripts.check_recommendation_queries
+ Fails with exit code 1, if a page needs more queries or the pages are not complete.
+----------------------------------------------------------------------------------------------- """
+def fill_database(db):
+    store_csv_entries_to_db(db=db)
+    store_questions_to_db(db=db)
+    store_answer_options_to_db(db=db)
+    questions = question_registry.build(db=db).questions
+
+    submission_ids = db.scalars(insert(UserSubmission).returning(UserSubmission.id, sort_by_parameter_order=True),
+                                [{"free_text": f"text {i}", "created_at": datetime.now(), "rating": i % 5 or None}
+                                 for i in range(NUM_SUBMISSIONS)]).all()
+
+    answers, recommendations = [], []
+    for i, submission_id in enumerate(submission_ids):
+        algorithm = "bm25" if i % 2 == 0 else "sbert"
+        if algorithm == "bm25":
+            answers += [{"question_id": question.id, "answer_id": question.answer_option[0].id,
+                         "submission_id": submission_id} for question in questions]
+        recommendations += [{"label": "perfect", "algorithm": algorithm, "plant_id": r + 1,
+                             "submission_id": submission_id} for r in range(RECOMMENDATIONS_PER_SUBMISSION)]
+
+    db.execute(insert(UserAnswer), answers)
+    recommendation_ids = db.scalars(insert(Recommendation).returning(Recommendation.id, sort_by_parameter_order=True),
+                                    recommendations).all()
+
+    bm25_rows = [{"recommendation_id": recommendation_id, "score_raw": 1.0, "score_norm": 1.0,
+                  "score_percentile": 100.0, "rank": 1, "matched_terms": "",
+                  "unmatched_terms": "", "max_matches": 5, "match_count": 5, "match_ratio": 1.0}
+                 for recommendation_id, row in zip(recommendation_ids, recommendations) if row["algorithm"] == "bm25"]
+    sbert_rows = [{"recommendation_id": recommendation_id, "cosine_similarity_raw": 0.5,
+                   "cosine_similarity_norm": 0.5, "cosine_similarity_percentile": 50.0, "cosine_distance": 0.5,
+                   "rank": 1, "gap_to_best": 0.5}
+                  for recommendation_id, row in zip(recommendation_ids, recommendations) if row["algorithm"] == "sbert"]
+    db.execute(insert(Bm25Metadata), bm25_rows)
+    db.execute(insert(SbertMetadata), sbert_rows)
+    db.commit()
+
+
+def main():
+    passed = True
+
+    with tempfile.TemporaryDirectory() as folder:
+        engine = create_sqlite_engine(path=Path(folder) / "check.db")
+        migrate(engine=engine)
+        db = sessionmaker(bind=engine)()
+
+        try:
+            fill_database(db)
+
+            num_queries = 0
+
+            def count(*args):
+                nonlocal num_queries
+                num_queries += 1
+
+            event.listen(engine, "before_cursor_execute", count)
+
+            for include_non_rated in (True, False):
+                for page_size in PAGE_SIZES:
+                    seen, after_submission_id, max_queries, num_pages = [], None, 0, 0
+                    while True:
+                        num_queries = 0
+                        page = get_all_recommendations(db=db, include_non_rated=include_non_rated,
+                                                       after_submission_id=after_submission_id, limit=page_size)
+                        max_queries = max(max_queries, num_queries)
+                        if not page:
+                            break
+
+                        num_pages += 1
+                        seen += [submission.submission_id for submission in page]
+                        after_submission_id = page[-1].submission_id
+
+                    expected = db.query(UserSubmission.id).order_by(UserSubmission.id)
+                    if not include_non_rated:
+                        expected = expected.filter(UserSubmission.rating.isnot(None))
+                    complete = seen == [submission_id for (submission_id,) in expected]
+
+                    print(f"include unrated {include_non_rated}, page size {page_size}: {num_pages} pages, "
+                          f"max. {max_queries} queries per page, complete: {complete}")
+                    passed &= max_queries <= MAX_QUERIES_PER_PAGE and complete
+
+            num_queries = 0
+            get_all_recommendations(db=db, include_non_rated=True)
+            print(f"all {NUM_SUBMISSIONS} submissions without limit: {num_queries} queries")
+        finally:
+            db.close()
+            engine.dispose()
+
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
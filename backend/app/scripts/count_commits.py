@@ -0,0 +1,70 @@
+import sys
+from datetime import datetime
+from app.database.commit_stats import get_commit_count
+from app.database.database import SessionLocal
+from app.database.write_behind import write_behind_queue
+from app.models import Recommendation, Bm25Metadata, UserAnswer, UserSubmission
+from app.recommender.BM25.bm25_recommender import BM25Recommender
+from app.schemas import UserAnswerSubmission, UserAnswer as UserAnswerSchema
+from app.services import question_service
+from app.services.question_registry import question_registry
+
+NUM_PERFECT = 5
+NUM_GOOD = 5
+NUM_BAD = 5
+
+# Submission, user answers and all recommendations with metadata, only the submission with WRITE_BEHIND=1
+EXPECTED_COMMITS = 1 if write_behind_queue.enabled else 3
+
+""" -----------------------------------------------------------------------------------------------
+ Counts the commits of one questionnaire request (same steps as POST /questionnaire, see
+ questions_router.py) with a session of its own, and checks that every recommendation has its
+ metadata stored (after the write-behind queue is flushed). The created rows are deleted again
+ afterwards.
+ Needs a database filled upon startup. Run from the backend/ folder with:
+ python -m app.scripts.count_commits
+ Fails with exit code 1, if the request needs more commits than expected.
+----------------------------------------------------------------------------------------------- """
+def main():
+    db = SessionLocal()
+    try:
+        questions = question_registry.get(db=db).questions
+        if not questions:
+            print("The database is empty, start the app once to fill it.")
+            sys.exit(1)
+
+        questionnaire = UserAnswerSubmission(
+            answers=[UserAnswerSchema(question_id=question.id, answer_id=question.answer_option[0].id)
+                     for question in questions],
+            free_text="",
+            created_at=datetime.now())
+
+        submission_id = question_service.store_user_answers(user_answers=questionnaire, db=db)
+        BM25Recommender(db=db, submission_id=submission_id).recommend(user_answers=questionnaire,
+                                                                       num_perfect=NUM_PERFECT,
+                                                                       num_good=NUM_GOOD,
+                                                                       num_bad=NUM_BAD)
+        commits = get_commit_count(db)
+        write_behind_queue.close()
+
+        recommendation_ids = [recommendation_id for (recommendation_id,) in
+                              db.query(Recommendation.id).filter_by(submission_id=submission_id)]
+        num_metadata = db.query(Bm25Metadata).filter(Bm25Metadata.recommendation_id.in_(recommendation_ids)).count()
+        print(f"{commits} commits for {len(recommendation_ids)} recommendations "
+              f"({num_metadata} with metadata), expected {EXPECTED_COMMITS} commits")
+
+        # Cleanup of the rows of this run
+        db.query(Bm25Metadata).filter(Bm25Metadata.recommendation_id.in_(recommendation_ids)).delete()
+        db.query(Recommendation).filter_by(submission_id=submission_id).delete()
+        db.query(UserAnswer).filter_by(submission_id=submission_id).delete()
+        db.query(UserSubmission).filter_by(id=submission_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    if commits > EXPECTED_COMMITS or num_metadata != len(recommendation_ids):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
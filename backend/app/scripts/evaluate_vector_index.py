@@ -0,0 +1,62 @@
+import sys
+import time
+import numpy as np
+from app.recommender.SBERT.vector_index import ExactIndex, HNSWIndex, recall_at_k
+
+NUM_PLANTS = 20_000
+NUM_QUERIES = 200
+NUM_CLUSTERS = 64
+DIMENSIONS = 384
+K = 10
+MIN_RECALL = 0.95
+
+""" -----------------------------------------------------------------------------------------------
+ Synthetic catalog that resembles sentence embeddings: plants cluster around some topics. Random
+ uniform vectors would be much harder for every ANN index and are not realistic.
+ Run from the backend/ folder with: python -m app.scripts.evaluate_vector_index [num_plants]
+----------------------------------------------------------------------------------------------- """
+def create_synthetic_embeddings(num_rows: int, rng: np.random.Generator, centers: np.ndarray) -> np.ndarray:
+    topics = rng.integers(0, len(centers), size=num_rows)
+    noise = rng.standard_normal((num_rows, centers.shape[1]))
+    return (centers[topics] + 0.7 * noise).astype(np.float32)
+
+
+""" -----------------------------------------------------------------------------------------------
+ Builds the HNSW index, checks recall@k against the exact scan and compares the query latency.
+ Fails with exit code 1, if the recall is below MIN_RECALL.
+----------------------------------------------------------------------------------------------- """
+def evaluate(num_plants: int) -> float:
+    rng = np.random.default_rng(7)
+    centers = rng.standard_normal((NUM_CLUSTERS, DIMENSIONS))
+    embeddings = create_synthetic_embeddings(num_plants, rng, centers)
+    queries = create_synthetic_embeddings(NUM_QUERIES, rng, centers)
+
+    exact = ExactIndex(embeddings)
+
+    started = time.perf_counter()
+    hnsw = HNSWIndex(dim=DIMENSIONS)
+    hnsw.add(embeddings)
+    print(f"HNSW build for {num_plants} plants: {time.perf_counter() - started:.1f}s")
+
+    for name, index in (("exact", exact), ("hnsw", hnsw)):
+        started = time.perf_counter()
+        for query in queries:
+            index.search(query, K)
+        print(f"{name}: {(time.perf_counter() - started) / NUM_QUERIES * 1000:.2f} ms per query")
+
+    recall = recall_at_k(hnsw, exact, queries, K)
+    print(f"recall@{K} of hnsw against the exact scan: {recall:.3f}")
+    return recall
+
+
+def main():
+    num_plants = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_PLANTS
+    recall = evaluate(num_plants)
+
+    if recall < MIN_RECALL:
+        print(f"Recall below {MIN_RECALL}!")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
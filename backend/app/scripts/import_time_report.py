@@ -0,0 +1,74 @@
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+MODULE = "app.main"
+TOP_N = 15
+
+# Cold start budget of importing the app, before the lifespan runs
+IMPORT_TIME_BUDGET_MS = 3000.0
+
+# Packages that must not be imported with the app, they are loaded on first use (see sbert_registry.py)
+HEAVY_PACKAGES = ("torch", "transformers", "sentence_transformers")
+
+BACKEND_FOLDER = Path(__file__).resolve().parents[2]
+
+
+# Lines of -X importtime look like "import time:  <self us> | <cumulative us> | <indentation><module>"
+def parse_import_times(output: str) -> list[tuple[str, int, int]]:
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+""" -----------------------------------------------------------------------------------------------
+ Import time report of the app, to catch regressions of the cold start (every uvicorn worker and
+ script pays it before serving anything). Imports MODULE in a fresh interpreter with -X importtime
+ and reports the total time, the slowest top-level packages (sum of their own import times) and
+ the slowest single modules (cumulative).
+ Run from the backend/ folder with: python -m app.scripts.import_time_report [module]
+ Fails with exit code 1, if one of HEAVY_PACKAGES is imported or the total is above
+ IMPORT_TIME_BUDGET_MS.
+----------------------------------------------------------------------------------------------- """
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else MODULE
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=BACKEND_FOLDER, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+        sys.exit(1)
+
+    imports = parse_import_times(result.stderr)
+    total_ms = next(cumulative for name, _, cumulative in imports if name == module) / 1000
+
+    packages = defaultdict(int)
+    for name, self_us, _ in imports:
+        packages[name.split(".")[0]] += self_us
+
+    print(f"import {module}: {total_ms:.0f} ms, {len(imports)} modules (budget {IMPORT_TIME_BUDGET_MS:.0f} ms)")
+    print("slowest packages:")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:TOP_N]:
+        print(f"  {package}: {self_us / 1000:.1f} ms")
+
+    print("slowest modules (cumulative):")
+    for name, _, cumulative_us in sorted(imports, key=lambda entry: -entry[2])[:TOP_N]:
+        print(f"  {name}: {cumulative_us / 1000:.1f} ms")
+
+    heavy = sorted(package for package in HEAVY_PACKAGES if package in packages)
+    if heavy:
+        print(f"imported with the app, should be lazy: {', '.join(heavy)}")
+
+    if heavy or total_ms > IMPORT_TIME_BUDGET_MS:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
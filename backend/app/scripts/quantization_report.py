@@ -0,0 +1,42 @@
+import json
+import sys
+import numpy as np
+from app.recommender.SBERT.embedding_store import EMBEDDING_CACHE_PATH
+from app.recommender.SBERT.quantization import quantization_report
+
+NUM_QUERIES = 200
+K = 10
+
+""" -----------------------------------------------------------------------------------------------
+ Loads the cached corpus embeddings (created upon startup of the API), or the .npy file given as
+ argument. Run from the backend/ folder with: python -m app.scripts.quantization_report [file.npy]
+----------------------------------------------------------------------------------------------- """
+def load_embeddings() -> np.ndarray:
+    if len(sys.argv) > 1:
+        return np.load(sys.argv[1])
+
+    cached = sorted(EMBEDDING_CACHE_PATH.glob("*.embeddings.npy"))
+    if not cached:
+        print("No cached embeddings found, start the API once or pass a .npy file.")
+        sys.exit(1)
+
+    return np.load(cached[-1])
+
+
+""" -----------------------------------------------------------------------------------------------
+ Queries are plants of the catalog with some noise, since the model itself is not needed for the
+ report. Prints memory saved and ranking drift of float16 and int8 against float32.
+----------------------------------------------------------------------------------------------- """
+def main():
+    embeddings = load_embeddings()
+    rng = np.random.default_rng(7)
+
+    picked = embeddings[rng.integers(0, len(embeddings), size=NUM_QUERIES)]
+    queries = picked + 0.05 * rng.standard_normal(picked.shape).astype(np.float32)
+
+    report = quantization_report(embeddings=embeddings, queries=queries, k=K)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
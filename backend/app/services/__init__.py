@@ -1,5 +1,10 @@
 from .database_service import store_csv_entries_to_db, store_questions_to_db, store_answer_options_to_db
-from .plant_service import fetch_plants, filter_plants
+from .plant_service import fetch_plants, filter_plants, search_plants, autocomplete_plants
 from .question_service import fetch_all_questions
+from .question_registry import QuestionRegistry, question_registry
+from .like_counter import LikeCounter, plant_like_counter
+from .plant_catalog import PlantCatalogCache, plant_catalog_cache
+from .plant_name_index import PlantNameIndex, plant_name_index
+from .plant_filter_index import PlantFilterIndex, plant_filter_index
 from .recommendations_service import add_rating_to_recommendation
 from .user_study_service import store_submission, validate_submission
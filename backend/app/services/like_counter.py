@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from sqlalchemy import func, update, delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.models import UserPlantLike
+
+# "1" counts likes in memory and stores them in batches, "0" stores every like within the request
+LIKE_COUNTER_BUFFER_ENABLED = os.getenv("LIKE_COUNTER_BUFFER", "0") == "1"
+LIKE_COUNTER_SHARDS = int(os.getenv("LIKE_COUNTER_SHARDS", "16"))
+LIKE_COUNTER_FLUSH_MS = float(os.getenv("LIKE_COUNTER_FLUSH_MS", "500"))
+
+
+""" -----------------------------------------------------------------------------------------------
+ Adds delta to the like counter of a plant in one statement (atomic, concurrent likes cannot get
+ lost), returns the new counter. A like is an upsert on the unique plant_id, an unlike decrements
+ (never below 0) and removes the row at 0, so only liked plants have a row. Does not commit.
+----------------------------------------------------------------------------------------------- """
+def store_like_delta(db: Session, plant_id: int, delta: int) -> int:
+    if delta > 0:
+        statement = insert(UserPlantLike).values(plant_id=plant_id, like_counter=delta)
+        statement = statement.on_conflict_do_update(
+            index_elements=[UserPlantLike.plant_id],
+            set_={"like_counter": func.coalesce(UserPlantLike.like_counter, 0) + statement.excluded.like_counter})
+        return db.execute(statement.returning(UserPlantLike.like_counter)).scalar_one()
+
+    counter = db.execute(update(UserPlantLike)
+                         .where(UserPlantLike.plant_id == plant_id)
+                         .values(like_counter=func.max(func.coalesce(UserPlantLike.like_counter, 0) + delta, 0))
+                         .returning(UserPlantLike.like_counter)).scalar_one_or_none()
+    if not counter:
+        db.execute(delete(UserPlantLike).where(UserPlantLike.plant_id == plant_id))
+    return counter or 0
+
+
+""" -----------------------------------------------------------------------------------------------
+ Like counter of the plants. Disabled (default), every like is stored with store_like_delta and
+ committed within the request. Enabled, likes are counted in memory and a flusher thread stores
+ the sum per plant every flush_interval_ms in one transaction, so a burst of likes costs one
+ write instead of one per like. The plants are spread over shards (by id), each with its own
+ lock, holding the current counter (loaded from the database on the first like) and the part of
+ it that is not stored yet. If a flush fails, its likes are kept for the next one; upon shutdown
+ (see lifespan in main.py) everything is stored. The counters in memory assume that only this
+ process changes the likes (one worker, like the SQLite setup).
+----------------------------------------------------------------------------------------------- """
+class LikeCounter:
+    def __init__(self, session_factory=SessionLocal, enabled: bool = LIKE_COUNTER_BUFFER_ENABLED,
+                 num_shards: int = LIKE_COUNTER_SHARDS, flush_interval_ms: float = LIKE_COUNTER_FLUSH_MS):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.flush_interval = max(1.0, flush_interval_ms) / 1000
+
+        num_shards = max(1, num_shards)
+        self._locks = [threading.Lock() for _ in range(num_shards)]
+        self._counters: list[dict[int, int]] = [{} for _ in range(num_shards)]
+        self._pending: list[dict[int, int]] = [{} for _ in range(num_shards)]
+
+        # One flush at a time (flusher thread, flush() of a request, shutdown)
+        self._flush_lock = threading.Lock()
+        self._flusher: threading.Thread | None = None
+        self._flusher_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._closed = False
+
+        self._stats_lock = threading.Lock()
+        self._num_buffered = 0
+        self._num_flushes = 0
+        self._num_flushed_plants = 0
+        self._num_failed_flushes = 0
+        self._last_flush_ms = 0.0
+        self._last_error: str | None = None
+
+    # Adds a like (delta 1) or removes one (delta -1), returns the counter of the plant
+    def add(self, db: Session, plant_id: int, delta: int) -> int:
+        if not self.enabled or self._closed:
+            try:
+                counter = store_like_delta(db=db, plant_id=plant_id, delta=delta)
+                db.commit()
+                return counter
+            except Exception:
+                db.rollback()
+                raise
+
+        self._ensure_flusher()
+        shard = plant_id % len(self._locks)
+        stored = None
+        if plant_id not in self._counters[shard]:
+            stored = db.query(UserPlantLike.like_counter).filter_by(plant_id=plant_id).scalar()
+
+        with self._locks[shard]:
+            # If another request loaded the counter in the meantime, that one is kept (it may have likes already)
+            counter = self._counters[shard].get(plant_id, stored or 0)
+            updated = max(counter + delta, 0)
+            self._counters[shard][plant_id] = updated
+            self._pending[shard][plant_id] = self._pending[shard].get(plant_id, 0) + updated - counter
+
+        with self._stats_lock:
+            self._num_buffered += 1
+        return updated
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+
+        with self._flusher_lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run, name="like-counter", daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _take_pending(self) -> dict[int, int]:
+        deltas: dict[int, int] = {}
+        for shard, lock in enumerate(self._locks):
+            with lock:
+                deltas.update((plant_id, delta) for plant_id, delta in self._pending[shard].items() if delta)
+                self._pending[shard] = {}
+        return deltas
+
+    # Stores all likes that are counted in memory, one transaction for all plants
+    def flush(self):
+        with self._flush_lock:
+            deltas = self._take_pending()
+            if not deltas:
+                return
+
+            started = time.perf_counter()
+            db = self.session_factory()
+            try:
+                for plant_id in sorted(deltas):
+                    store_like_delta(db=db, plant_id=plant_id, delta=deltas[plant_id])
+                db.commit()
+            except Exception as error:
+                db.rollback()
+                # Kept for the next flush
+                for plant_id, delta in deltas.items():
+                    shard = plant_id % len(self._locks)
+                    with self._locks[shard]:
+                        self._pending[shard][plant_id] = self._pending[shard].get(plant_id, 0) + delta
+                with self._stats_lock:
+                    self._num_failed_flushes += 1
+                    # First line only, SQLAlchemy errors append the statement and a link
+                    self._last_error = f"{type(error).__name__}: {str(error).partition(chr(10))[0]}"
+                return
+            finally:
+                db.close()
+
+            with self._stats_lock:
+                self._num_flushes += 1
+                self._num_flushed_plants += len(deltas)
+                self._last_flush_ms = (time.perf_counter() - started) * 1000
+
+    # Forgets all counters and likes that are not stored yet, before all likes are deleted
+    def reset(self):
+        with self._flush_lock:
+            for shard, lock in enumerate(self._locks):
+                with lock:
+                    self._counters[shard] = {}
+                    self._pending[shard] = {}
+
+    def stats(self) -> dict:
+        pending_plants = 0
+        for shard, lock in enumerate(self._locks):
+            with lock:
+                pending_plants += sum(1 for delta in self._pending[shard].values() if delta)
+
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "num_shards": len(self._locks),
+                "flush_interval_ms": self.flush_interval * 1000,
+                "pending_plants": pending_plants,
+                "buffered_likes": self._num_buffered,
+                "flushes": self._num_flushes,
+                "flushed_plants": self._num_flushed_plants,
+                "failed_flushes": self._num_failed_flushes,
+                "last_flush_ms": round(self._last_flush_ms, 3),
+                "last_error": self._last_error,
+            }
+
+    # Stops the flusher and stores what is left, later likes are stored synchronously
+    def close(self):
+        self._closed = True
+        self._stop.set()
+        if self._flusher is not None and self._flusher.is_alive():
+            self._flusher.join()
+        self.flush()
+
+
+plant_like_counter = LikeCounter()
@@ -0,0 +1,100 @@
+import bisect
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy.orm import Session
+from app.database.plant_events import on_plants_changed
+from app.services.plant_schema_registry import plant_schema_registry
+from app.services.snapshot_registry import SnapshotRegistry
+
+# Number of assembled pages (per after_id, skip and limit) kept in memory
+MAX_CACHED_PAGES = 256
+
+""" -----------------------------------------------------------------------------------------------
+ One page of GET /plants/all, as the JSON body of the response and its ETag (hash of the body).
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class CatalogPage:
+    body: bytes
+    etag: str
+
+
+""" -----------------------------------------------------------------------------------------------
+ The plant catalog ordered by id, every plant already serialized to JSON with the response schema.
+ ids is sorted, so the start of a keyset page is found with a binary search.
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    ids: tuple[int, ...]
+    plants_json: tuple[bytes, ...]
+    version: int
+
+
+""" -----------------------------------------------------------------------------------------------
+ In-memory cache of the plant catalog for GET /plants/all. Each plant is serialized once (from the
+ shared validated plants, see plant_schema_registry.py), a page is the concatenation of its plants
+ and is cached with its ETag as well, so repeated catalog loads neither query the database nor run
+ Pydantic, and a client sending the ETag back (If-None-Match) gets a 304 without a body.
+ Built, read and invalidated like the other snapshot registries (see snapshot_registry.py), the
+ cached pages are dropped together with the snapshot.
+----------------------------------------------------------------------------------------------- """
+class PlantCatalogCache(SnapshotRegistry[CatalogSnapshot]):
+    def __init__(self, max_cached_pages: int = MAX_CACHED_PAGES):
+        super().__init__()
+        self.max_cached_pages = max_cached_pages
+
+        self._pages_lock = threading.Lock()
+        self._pages: OrderedDict[tuple[int, int | None, int, int], CatalogPage] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def _create(self, db: Session, generation: int) -> CatalogSnapshot:
+        plants = plant_schema_registry.get(db=db)
+        return CatalogSnapshot(ids=tuple(plant.id for plant in plants),
+                               plants_json=tuple(plant.model_dump_json().encode() for plant in plants),
+                               version=generation)
+
+    # Plants with an id greater than after_id (all if None), then skip and limit like OFFSET/LIMIT
+    def get_page(self, db: Session, after_id: int | None, skip: int, limit: int) -> CatalogPage:
+        snapshot = self.get(db=db)
+        key = (snapshot.version, after_id, skip, limit)
+
+        with self._pages_lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self._hits += 1
+                return page
+            self._misses += 1
+
+        start = 0 if after_id is None else bisect.bisect_right(snapshot.ids, after_id)
+        body = b"[" + b",".join(snapshot.plants_json[start + skip:start + skip + limit]) + b"]"
+        page = CatalogPage(body=body, etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+        with self._pages_lock:
+            self._pages[key] = page
+            while len(self._pages) > self.max_cached_pages:
+                self._pages.popitem(last=False)
+        return page
+
+    def invalidate(self):
+        super().invalidate()
+        with self._pages_lock:
+            self._pages.clear()
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        with self._pages_lock:
+            return {
+                "built": snapshot is not None,
+                "num_plants": len(snapshot.ids) if snapshot is not None else 0,
+                "memory_bytes": sum(len(plant) for plant in snapshot.plants_json) if snapshot is not None else 0,
+                "cached_pages": len(self._pages),
+                "page_hits": self._hits,
+                "page_misses": self._misses,
+            }
+
+
+plant_catalog_cache = PlantCatalogCache()
+on_plants_changed(plant_catalog_cache.invalidate)
@@ -0,0 +1,127 @@
+from dataclasses import dataclass
+from enum import Enum
+from types import MappingProxyType
+from typing import Mapping
+import numpy as np
+from sqlalchemy.orm import Session
+from app.database.plant_events import on_plants_changed
+from app.enums import Growth, Soil, SunLight, Watering, Fertilization
+from app.schemas import Plant as PlantSchema
+from app.services.plant_name_index import plant_name_index
+from app.services.plant_schema_registry import plant_schema_registry
+from app.services.snapshot_registry import SnapshotRegistry
+
+# Filter name (query parameter of /plants/filter) -> enum of the options and plant column
+FACETS: dict[str, tuple[type[Enum], str]] = {
+    "growth": (Growth, "growth"),
+    "soil": (Soil, "soil"),
+    "sun": (SunLight, "sunlight"),
+    "water": (Watering, "watering"),
+    "fertilization": (Fertilization, "fertilization"),
+}
+
+
+# Values in the database of a filter option, growth is stored like its enum value
+def db_values(option: Enum) -> list[str]:
+    if not hasattr(option, "map_db_value"):
+        return [option.value]
+
+    values = option.map_db_value
+    return values if isinstance(values, list) else [values]
+
+
+# Bitset with bit i set for every True in mask, packed by numpy instead of setting the bits one by one
+def to_bitset(mask: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+# Positions of the set bits, in ascending order
+def to_positions(bits: int, size: int) -> np.ndarray:
+    packed = np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(packed, bitorder="little")[:size])
+
+
+""" -----------------------------------------------------------------------------------------------
+ Result of a filter: the matching plants (ordered by id) and, per filter, how many plants each of
+ its options would match together with the other active filters.
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class FilterResult:
+    plants: list[PlantSchema]
+    facets: dict[str, dict[str, int]]
+
+
+""" -----------------------------------------------------------------------------------------------
+ Immutable categorical index of the catalog. Plant i (ordered by id) is bit i. Per filter and
+ option there is one bitset (a Python int) of the plants with that value, so a combination of
+ filters is a bitwise AND and a count is a popcount.
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class FilterSnapshot:
+    plants: tuple[PlantSchema, ...]
+    ids: np.ndarray
+    all_plants: int
+    bitsets: Mapping[str, Mapping[str, int]]
+
+    def bitset(self, facet: str, option: Enum) -> int:
+        return self.bitsets[facet][option.value]
+
+    # Bitset of the plants with the given ids, ids that are not in the index are ignored
+    def ids_bitset(self, ids: np.ndarray) -> int:
+        return to_bitset(np.isin(self.ids, ids))
+
+    def plants_of(self, bits: int) -> list[PlantSchema]:
+        return [self.plants[position] for position in to_positions(bits, size=len(self.plants))]
+
+
+""" -----------------------------------------------------------------------------------------------
+ In-memory filter engine for /plants/filter, instead of a SQL query on unindexed text columns per
+ request. Besides the plants it returns facet counts: per filter, the number of plants of each
+ option given all other active filters (the own filter is left out, so the counts show what
+ choosing another option would return).
+ Built from the shared validated plants (see plant_schema_registry.py), read and invalidated like
+ the other snapshot registries (see snapshot_registry.py).
+----------------------------------------------------------------------------------------------- """
+class PlantFilterIndex(SnapshotRegistry[FilterSnapshot]):
+    def _create(self, db: Session, generation: int) -> FilterSnapshot:
+        plants = plant_schema_registry.get(db=db)
+
+        bitsets = {}
+        for facet, (options, column) in FACETS.items():
+            column_values = np.array([getattr(plant, column) for plant in plants], dtype=object)
+            bitsets[facet] = MappingProxyType({option.value: to_bitset(np.isin(column_values, db_values(option)))
+                                               for option in options})
+
+        return FilterSnapshot(plants=plants,
+                              ids=np.array([plant.id for plant in plants], dtype=np.int64),
+                              all_plants=(1 << len(plants)) - 1,
+                              bitsets=MappingProxyType(bitsets))
+
+    # Active filters by facet name (see FACETS), None or missing means not filtered
+    def filter(self, db: Session, name: str | None = None, with_facets: bool = False,
+               **filters: Enum | None) -> FilterResult:
+        snapshot = self.get(db=db)
+
+        # Case insensitive substring match of the name (like ILIKE '%name%'), see plant_name_index.py
+        base = snapshot.ids_bitset(plant_name_index.matching_ids(db=db, name=name)) if name else snapshot.all_plants
+        selected = {facet: snapshot.bitset(facet, option) for facet, option in filters.items() if option is not None}
+
+        bits = base
+        for facet_bits in selected.values():
+            bits &= facet_bits
+
+        facets = {}
+        if with_facets:
+            for facet, options in snapshot.bitsets.items():
+                # All active filters except the own one
+                others = base
+                for other, facet_bits in selected.items():
+                    if other != facet:
+                        others &= facet_bits
+                facets[facet] = {option: (others & option_bits).bit_count() for option, option_bits in options.items()}
+
+        return FilterResult(plants=snapshot.plants_of(bits), facets=facets)
+
+
+plant_filter_index = PlantFilterIndex()
+on_plants_changed(plant_filter_index.invalidate)
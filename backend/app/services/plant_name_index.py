@@ -0,0 +1,301 @@
+from dataclasses import dataclass
+from typing import Iterable
+import numpy as np
+from sqlalchemy.orm import Session
+from app.database.plant_events import on_plants_changed
+from app.services.plant_schema_registry import plant_schema_registry
+from app.services.snapshot_registry import SnapshotRegistry
+
+# Minimum trigram similarity of a fuzzy match (same default as pg_trgm)
+FUZZY_THRESHOLD = 0.3
+
+# Ranking of a search: substring matches by where they occur, always above fuzzy matches
+EXACT_SCORE = 0.9
+PREFIX_SCORE = 0.8
+WORD_PREFIX_SCORE = 0.7
+SUBSTRING_SCORE = 0.6
+# Added for the part of the name covered by the query, so shorter names rank higher
+COVERAGE_SCORE = 0.1
+
+# Names are padded, so the trigrams of a fuzzy match include the word boundaries (like in pg_trgm)
+# and every character of a name starts a trigram (queries of one or two characters are code ranges)
+PADDING_START = "  "
+PADDING_END = "  "
+SEPARATOR = "\0"
+SPACE = ord(" ")
+
+
+# Code of the trigram at every offset: three code points (< 2^21 each) in one int64
+def trigram_codes(codepoints: np.ndarray) -> np.ndarray:
+    codepoints = codepoints.astype(np.int64)
+    return (codepoints[:-2] << 42) | (codepoints[1:-1] << 21) | codepoints[2:]
+
+
+def to_codepoints(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+# Range [start, end) of the codes of all trigrams starting with the (up to three) code points
+def code_range(pattern: np.ndarray) -> tuple[int, int]:
+    shift = 42 - 21 * (min(pattern.size, 3) - 1)
+    start = 0
+    for codepoint in pattern[:3]:
+        start = (start << 21) | int(codepoint)
+    return start << shift, (start + 1) << shift
+
+
+""" -----------------------------------------------------------------------------------------------
+ Immutable trigram index of the plant names. All lowercase names are stored padded in one array
+ of code points (separated by a zero), postings hold the offsets of every trigram in that array,
+ sorted by trigram code. A substring is found at the offsets of its rarest trigram, then the other
+ characters are compared for all candidates at once; a shorter one is the range of codes starting
+ with it. The starts of the names and of all words are sorted by code as well, for prefixes.
+ Positions (ordered by id) refer to ids and names.
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class NameSnapshot:
+    ids: np.ndarray
+    names: tuple[str, ...]
+    codepoints: np.ndarray
+    owners: np.ndarray
+    name_starts: np.ndarray
+    name_lengths: np.ndarray
+    trigrams: np.ndarray
+    posting_starts: np.ndarray
+    postings: np.ndarray
+    name_posting_starts: np.ndarray
+    name_postings: np.ndarray
+    trigram_counts: np.ndarray
+    name_codes: np.ndarray
+    name_offsets: np.ndarray
+    word_codes: np.ndarray
+    word_starts: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[int, str | None]]) -> "NameSnapshot":
+        rows = list(rows)
+        ids = np.array([plant_id for plant_id, _ in rows], dtype=np.int64)
+        names = tuple(name or "" for _, name in rows)
+        keys = [name.lower() for name in names]
+
+        padded = [PADDING_START + key + PADDING_END + SEPARATOR for key in keys]
+        codepoints = to_codepoints("".join(padded))
+        padded_lengths = np.array([len(text) for text in padded], dtype=np.int64)
+        offset_type = np.int32 if codepoints.size < 2**31 else np.int64
+        owners = np.repeat(np.arange(len(keys), dtype=offset_type), padded_lengths)
+        name_starts = np.cumsum(padded_lengths) - padded_lengths + len(PADDING_START)
+
+        # Trigrams within a name, sorted by code and offset (stable sort keeps the offsets ascending)
+        codes = trigram_codes(codepoints)
+        valid = (codepoints[:-2] != 0) & (codepoints[1:-1] != 0) & (codepoints[2:] != 0)
+        offsets = np.flatnonzero(valid).astype(offset_type)
+        order = np.argsort(codes[offsets], kind="stable")
+        postings = offsets[order]
+        sorted_codes = codes[postings]
+        trigrams, posting_starts = np.unique(sorted_codes, return_index=True)
+
+        # Names per trigram (each once) and number of distinct trigrams per name, for fuzzy matches
+        posting_owners = owners[postings]
+        first = np.ones(postings.size, dtype=bool)
+        first[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (posting_owners[1:] != posting_owners[:-1])
+        name_postings = posting_owners[first]
+        name_posting_starts = np.searchsorted(sorted_codes[first], trigrams)
+        trigram_counts = np.bincount(name_postings, minlength=len(keys))
+
+        # Offsets of the first character of every name and of every word (after a space), by code
+        name_offsets = name_starts[np.argsort(codes[name_starts], kind="stable")]
+        word_starts = postings[(codepoints[postings - 1] == SPACE) & (codepoints[postings] != SPACE)]
+
+        return cls(ids=ids,
+                   names=names,
+                   codepoints=codepoints,
+                   owners=owners,
+                   name_starts=name_starts,
+                   name_lengths=np.array([len(key) for key in keys], dtype=np.int64),
+                   trigrams=trigrams,
+                   posting_starts=np.append(posting_starts, postings.size),
+                   postings=postings,
+                   name_posting_starts=np.append(name_posting_starts, name_postings.size),
+                   name_postings=name_postings,
+                   trigram_counts=trigram_counts,
+                   name_codes=codes[name_offsets],
+                   name_offsets=name_offsets,
+                   word_codes=codes[word_starts],
+                   word_starts=word_starts)
+
+    # Index of a trigram code, None if no name contains it
+    def _trigram(self, code: int) -> int | None:
+        index = int(np.searchsorted(self.trigrams, code))
+        return index if index < self.trigrams.size and self.trigrams[index] == code else None
+
+    # Offsets of a trigram code in the code point array (ascending), empty if no name contains it
+    def _posting(self, code: int) -> np.ndarray:
+        index = self._trigram(code)
+        if index is None:
+            return self.postings[:0]
+        return self.postings[self.posting_starts[index]:self.posting_starts[index + 1]]
+
+    # Offsets (not ordered) of every occurrence of the lowercase pattern within a name
+    def _occurrences(self, pattern: np.ndarray) -> np.ndarray:
+        if pattern.size >= 3:
+            postings = [self._posting(int(code)) for code in trigram_codes(pattern)]
+            shift = min(range(len(postings)), key=lambda index: postings[index].size)
+            hits = postings[shift].astype(np.int64) - shift
+            hits = hits[(hits >= 0) & (hits + pattern.size <= self.codepoints.size)]
+            for position, codepoint in enumerate(pattern):
+                hits = hits[self.codepoints[hits + position] == codepoint]
+        else:
+            start, end = np.searchsorted(self.trigrams, code_range(pattern))
+            hits = self.postings[self.posting_starts[start]:self.posting_starts[end]].astype(np.int64)
+
+        # Not within the padding of the name
+        owners = self.owners[hits]
+        start = hits - self.name_starts[owners]
+        return hits[(start >= 0) & (start + pattern.size <= self.name_lengths[owners])]
+
+    # Offsets out of offsets (sorted by the code of their trigram) where the pattern starts
+    def _starting_with(self, codes: np.ndarray, offsets: np.ndarray, pattern: np.ndarray) -> np.ndarray:
+        start, end = np.searchsorted(codes, code_range(pattern))
+        hits = offsets[start:end].astype(np.int64)
+        if pattern.size > 3:
+            hits = hits[hits + pattern.size <= self.codepoints.size]
+            for position, codepoint in enumerate(pattern[3:], start=3):
+                hits = hits[self.codepoints[hits + position] == codepoint]
+        return hits
+
+    # Positions (ascending) of the names that contain the query, case insensitive like ILIKE '%query%'
+    def contains(self, query: str) -> np.ndarray:
+        if not query:
+            return np.arange(self.ids.size)
+
+        found = np.zeros(self.ids.size, dtype=bool)
+        found[self.owners[self._occurrences(to_codepoints(query.lower()))]] = True
+        return np.flatnonzero(found)
+
+    # Score per position of the names with an occurrence (0 for the others), by the best occurrence
+    def _scores(self, hits: np.ndarray, length: int) -> np.ndarray:
+        scores = np.zeros(self.ids.size)
+        owners = self.owners[hits]
+        base = np.where(hits == self.name_starts[owners],
+                        np.where(self.name_lengths[owners] == length, EXACT_SCORE, PREFIX_SCORE),
+                        np.where(self.codepoints[hits - 1] == SPACE, WORD_PREFIX_SCORE, SUBSTRING_SCORE))
+
+        # Assigned from low to high, a higher score of the same name overwrites a lower one
+        for score in (SUBSTRING_SCORE, WORD_PREFIX_SCORE, PREFIX_SCORE, EXACT_SCORE):
+            scores[owners[base == score]] = score
+
+        found = np.flatnonzero(scores)
+        scores[found] += COVERAGE_SCORE * length / self.name_lengths[found]
+        return scores
+
+    # Positions and trigram similarity (shared / all distinct trigrams of query and name) of the
+    # names that share enough trigrams with the query to reach FUZZY_THRESHOLD
+    def _similarities(self, query: str) -> tuple[np.ndarray, np.ndarray]:
+        codes = np.unique(trigram_codes(to_codepoints(PADDING_START + query + PADDING_END)))
+        indexes = [index for index in map(self._trigram, codes.tolist()) if index is not None]
+        if not indexes:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        shared = np.bincount(np.concatenate([self.name_postings[self.name_posting_starts[index]:
+                                                                self.name_posting_starts[index + 1]]
+                                             for index in indexes]), minlength=self.ids.size)
+
+        # A similar name shares at least FUZZY_THRESHOLD * len(codes) trigrams (rounded down)
+        candidates = np.flatnonzero(shared >= max(1, int(FUZZY_THRESHOLD * codes.size)))
+        shared = shared[candidates]
+        return candidates, shared / (codes.size + self.trigram_counts[candidates] - shared)
+
+    # Positions ordered by the length of the name (then by position), at most limit
+    def _shortest(self, positions: np.ndarray, limit: int) -> np.ndarray:
+        order = self.name_lengths[positions] * self.ids.size + positions
+        if positions.size > limit:
+            keep = np.argpartition(order, limit - 1)[:limit]
+            positions, order = positions[keep], order[keep]
+        return positions[np.argsort(order)]
+
+    # Best matches as (position, score). The ranks are strictly ordered (exact name, name or word
+    # starting with the query, containing it, similar), so lower ones are only searched if the
+    # higher ones have less than limit matches
+    def search(self, query: str, limit: int, fuzzy: bool = True) -> list[tuple[int, float]]:
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        pattern = to_codepoints(query)
+        scores = self._scores(self._starting_with(self.word_codes, self.word_starts, pattern), length=len(query))
+        if np.count_nonzero(scores) < limit:
+            scores = self._scores(self._occurrences(pattern), length=len(query))
+
+        if fuzzy and np.count_nonzero(scores) < limit:
+            candidates, similarities = self._similarities(query)
+            similar = similarities >= FUZZY_THRESHOLD
+            candidates, similarities = candidates[similar], similarities[similar]
+            scores[candidates] = np.maximum(scores[candidates], SUBSTRING_SCORE * similarities)
+
+        # Candidates down to the score of the last one returned (with all ties), then ordered
+        candidates = np.flatnonzero(scores)
+        if candidates.size > limit:
+            lowest = -np.partition(-scores[candidates], limit - 1)[limit - 1]
+            candidates = candidates[scores[candidates] >= lowest]
+        ranked = candidates[np.lexsort((candidates, self.name_lengths[candidates], -scores[candidates]))][:limit]
+        return [(int(position), round(float(scores[position]), 4)) for position in ranked]
+
+    # Positions of the names starting with the prefix, then of the names with a later word starting
+    # with it (only searched if there are less than limit of the first), shorter names first
+    def autocomplete(self, prefix: str, limit: int) -> list[int]:
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+
+        pattern = to_codepoints(prefix)
+        ranked = self._shortest(self.owners[self._starting_with(self.name_codes, self.name_offsets, pattern)], limit)
+        if ranked.size < limit:
+            words = np.zeros(self.ids.size, dtype=bool)
+            words[self.owners[self._starting_with(self.word_codes, self.word_starts, pattern)]] = True
+            words[ranked] = False
+            ranked = np.concatenate([ranked, self._shortest(np.flatnonzero(words), limit - ranked.size)])
+        return [int(position) for position in ranked]
+
+
+""" -----------------------------------------------------------------------------------------------
+ In-memory name search of the plants, for the ranked (substring and fuzzy) search, the prefix
+ autocomplete and the name filter of /plants/filter, instead of a LIKE '%name%' table scan.
+ Built from the shared validated plants (see plant_schema_registry.py), read and invalidated like
+ the other snapshot registries (see snapshot_registry.py).
+----------------------------------------------------------------------------------------------- """
+class PlantNameIndex(SnapshotRegistry[NameSnapshot]):
+    def _create(self, db: Session, generation: int) -> NameSnapshot:
+        return NameSnapshot.from_rows((plant.id, plant.name) for plant in plant_schema_registry.get(db=db))
+
+    # Ids (ascending) of the plants whose name contains the query
+    def matching_ids(self, db: Session, name: str) -> np.ndarray:
+        snapshot = self.get(db=db)
+        return snapshot.ids[snapshot.contains(name)]
+
+    # Ranked matches as (plant id, name, score)
+    def search(self, db: Session, query: str, limit: int, fuzzy: bool = True) -> list[tuple[int, str, float]]:
+        snapshot = self.get(db=db)
+        return [(int(snapshot.ids[position]), snapshot.names[position], score)
+                for position, score in snapshot.search(query=query, limit=limit, fuzzy=fuzzy)]
+
+    # Suggestions as (plant id, name)
+    def autocomplete(self, db: Session, prefix: str, limit: int) -> list[tuple[int, str]]:
+        snapshot = self.get(db=db)
+        return [(int(snapshot.ids[position]), snapshot.names[position])
+                for position in snapshot.autocomplete(prefix=prefix, limit=limit)]
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"built": False, "num_plants": 0, "num_trigrams": 0, "memory_bytes": 0}
+
+        return {
+            "built": True,
+            "num_plants": int(snapshot.ids.size),
+            "num_trigrams": int(snapshot.trigrams.size),
+            "memory_bytes": int(sum(value.nbytes for value in vars(snapshot).values() if isinstance(value, np.ndarray))),
+        }
+
+
+plant_name_index = PlantNameIndex()
+on_plants_changed(plant_name_index.invalidate)
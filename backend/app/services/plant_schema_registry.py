@@ -0,0 +1,20 @@
+from sqlalchemy.orm import Session
+from app.database.plant_events import on_plants_changed
+from app.models import Plant
+from app.schemas import Plant as PlantSchema
+from app.services.snapshot_registry import SnapshotRegistry
+
+""" -----------------------------------------------------------------------------------------------
+ All plants ordered by id, validated once into the response schema. Shared by the registries that
+ are derived from the catalog (see plant_catalog.py, plant_filter_index.py, plant_name_index.py),
+ so a change of the plants costs one query and one validation pass instead of one per registry.
+ It subscribes to the plant changes before them (they import this module first), so a registry
+ that rebuilds right after a change never reads the plants of before.
+----------------------------------------------------------------------------------------------- """
+class PlantSchemaRegistry(SnapshotRegistry[tuple[PlantSchema, ...]]):
+    def _create(self, db: Session, generation: int) -> tuple[PlantSchema, ...]:
+        return tuple(PlantSchema.model_validate(plant) for plant in db.query(Plant).order_by(Plant.id).all())
+
+
+plant_schema_registry = PlantSchemaRegistry()
+on_plants_changed(plant_schema_registry.invalidate)
@@ -1,19 +1,26 @@
 from pathlib import Path
 from typing import Optional
-from sqlalchemy.orm import Session, Query
+from sqlalchemy.orm import Session
 from app.enums import Growth, Soil, SunLight, Watering, Fertilization
 from app.models import Plant, UserPlantLike
-from app.schemas import PlantLikeResponse
+from app.schemas import PlantLikeResponse, PlantSearchResponse, PlantSuggestionResponse
+from app.services.like_counter import plant_like_counter
+from app.services.plant_catalog import CatalogPage, plant_catalog_cache
+from app.services.plant_filter_index import FilterResult, plant_filter_index
+from app.services.plant_name_index import plant_name_index
+from app.services.timing import timed
 
 
 DATASET_PATH = Path(__file__).parent.parent / "dataset/plants_clean.csv"
 
 
 """ -----------------------------------------------------------------------------------------------
- Query all plants including pagination
+ All plants including pagination, served as pre-serialized JSON from the catalog cache. Keyset
+ pagination with after_id (plants with a greater id), skip and limit are applied after it
 ----------------------------------------------------------------------------------------------- """
-def fetch_plants(db: Session, skip: int, limit: int) -> list[type[Plant]]:
-    return db.query(Plant).offset(skip).limit(limit).all()
+@timed("plants.catalog")
+def fetch_plants(db: Session, skip: int, limit: int, after_id: int | None = None) -> CatalogPage:
+    return plant_catalog_cache.get_page(db=db, after_id=after_id, skip=skip, limit=limit)
 
 
 """ -----------------------------------------------------------------------------------------------
@@ -27,101 +34,95 @@ def get_plant_by_id(db: Session, plant_id: int) -> Optional[Plant]:
  Get like count
 ----------------------------------------------------------------------------------------------- """
 def get_plant_likes(db: Session, plant_id: int) -> int:
-    like_entry = db.query(UserPlantLike).filter_by(plant_id=plant_id).first()
-    return like_entry.like_counter
+    like_counter = db.query(UserPlantLike.like_counter).filter_by(plant_id=plant_id).scalar()
+    return like_counter or 0
 
 
 """ -----------------------------------------------------------------------------------------------
- Get a list of all liked plants of the user
+ Get a list of all liked plants of the user, most liked first, in one query joining the plants.
+ limit returns only the top-N most liked plants
 ----------------------------------------------------------------------------------------------- """
-def get_all_liked_plants(db: Session) -> Optional[list[PlantLikeResponse]]:
-    all_like_entries = db.query(UserPlantLike).all()
-
-    all_liked_plants: list = []
-    for entry in all_like_entries:
-
-        plant = get_plant_by_id(db=db, plant_id=entry.plant_id) # type: ignore
-
-        all_liked_plants.append(
-            PlantLikeResponse(
-                id=plant.id,
-                name=plant.name,
-                growth=plant.growth,
-                soil=plant.soil,
-                sunlight=plant.sunlight,
-                watering=plant.watering,
-                fertilization=plant.fertilization,
-                image_url=plant.image_url,
-                like_counter=entry.like_counter # type: ignore
-            )
+@timed("plants.liked")
+def get_all_liked_plants(db: Session, limit: int | None = None) -> Optional[list[PlantLikeResponse]]:
+    # Likes that are only counted in memory yet are stored first
+    plant_like_counter.flush()
+
+    liked_plants = (db.query(Plant, UserPlantLike.like_counter)
+                    .join(UserPlantLike, UserPlantLike.plant_id == Plant.id)
+                    .filter(UserPlantLike.like_counter > 0)
+                    .order_by(UserPlantLike.like_counter.desc(), Plant.id))
+
+    if limit is not None:
+        liked_plants = liked_plants.limit(limit)
+
+    return [
+        PlantLikeResponse(
+            id=plant.id,
+            name=plant.name,
+            growth=plant.growth,
+            soil=plant.soil,
+            sunlight=plant.sunlight,
+            watering=plant.watering,
+            fertilization=plant.fertilization,
+            image_url=plant.image_url,
+            like_counter=like_counter
         )
-
-    return all_liked_plants
+        for plant, like_counter in liked_plants
+    ]
 
 
 """ -----------------------------------------------------------------------------------------------
- Add a like to a plant
+ Add a like to a plant, returns the new like counter (see like_counter.py)
 ----------------------------------------------------------------------------------------------- """
 def add_like(db: Session, plant_id: int) -> int:
-    like_entry = db.query(UserPlantLike).filter_by(plant_id=plant_id).first()
-
-    if not like_entry:
-        like_entry = UserPlantLike(plant_id=plant_id, like_counter=1)
-        db.add(like_entry)
-    else:
-        like_entry.like_counter = 1
+    return plant_like_counter.add(db=db, plant_id=plant_id, delta=1)
 
-    db.commit()
-    db.refresh(like_entry)
-    return like_entry.like_counter
 
 """ -----------------------------------------------------------------------------------------------
- Remove a like from a plant
+ Remove a like from a plant, returns the new like counter (0 removes the plant from the liked ones)
 ----------------------------------------------------------------------------------------------- """
 def remove_like(db: Session, plant_id: int) -> int:
-    like_entry = db.query(UserPlantLike).filter_by(plant_id=plant_id).first()
-
-    if not like_entry:
-        return 0
-
-    db.delete(like_entry)
-    db.commit()
-
-    return 0
+    return plant_like_counter.add(db=db, plant_id=plant_id, delta=-1)
 
 
 """ -----------------------------------------------------------------------------------------------
- Query all plants with filter params
+ All plants matching the filter params, from the in-memory bitmap index (see plant_filter_index.py).
+ with_facets adds the number of plants per option of every filter
 ----------------------------------------------------------------------------------------------- """
+@timed("plants.filter")
 def filter_plants(db: Session,
                   name: str | None = None,
                   growth: Growth | None = None,
                   soil: Soil | None = None,
                   sun: SunLight | None = None,
                   water: Watering | None = None,
-                  fertilization: Fertilization | None = None
-                  ) -> Query[type[Plant]]:
-    found_plants = db.query(Plant)
-
-    if name:
-        found_plants = found_plants.filter(Plant.name.ilike(f"%{name}%"))
-
-    if growth:
-        found_plants = found_plants.filter(Plant.growth == growth.value)
+                  fertilization: Fertilization | None = None,
+                  with_facets: bool = False
+                  ) -> FilterResult:
+    return plant_filter_index.filter(db=db,
+                                     name=name,
+                                     with_facets=with_facets,
+                                     growth=growth,
+                                     soil=soil,
+                                     sun=sun,
+                                     water=water,
+                                     fertilization=fertilization)
 
-    if soil:
-        found_plants = found_plants.filter(Plant.soil == soil.map_db_value)
 
-    if sun:
-        found_plants = found_plants.filter(Plant.sunlight == sun.map_db_value)
-
-    if water:
-        db_values = water.map_db_value
-        found_plants = found_plants.filter(Plant.watering.in_(db_values))
-
-    if fertilization:
-        found_plants = found_plants.filter(Plant.fertilization == fertilization.map_db_value)
-
-    return found_plants
+""" -----------------------------------------------------------------------------------------------
+ Plants ranked by how well their name matches the query (see plant_name_index.py): exact name,
+ name or word starting with it, containing it and, with fuzzy, similar names (e.g. typos)
+----------------------------------------------------------------------------------------------- """
+@timed("plants.search")
+def search_plants(db: Session, query: str, limit: int, fuzzy: bool = True) -> list[PlantSearchResponse]:
+    return [PlantSearchResponse(id=plant_id, name=name, score=score)
+            for plant_id, name, score in plant_name_index.search(db=db, query=query, limit=limit, fuzzy=fuzzy)]
 
 
+""" -----------------------------------------------------------------------------------------------
+ Plants with a name or a word of the name starting with the prefix, names starting with it first
+----------------------------------------------------------------------------------------------- """
+@timed("plants.autocomplete")
+def autocomplete_plants(db: Session, prefix: str, limit: int) -> list[PlantSuggestionResponse]:
+    return [PlantSuggestionResponse(id=plant_id, name=name)
+            for plant_id, name in plant_name_index.autocomplete(db=db, prefix=prefix, limit=limit)]
@@ -0,0 +1,75 @@
+import math
+import re
+from app.services.timing import Histogram
+
+PREFIX = "air"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def metric_name(*parts: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join((PREFIX, *parts)))
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Numbers of a stats dict, booleans as 0/1. Strings and None (e.g. last_error) are left out
+def _numeric(value) -> float | int | None:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    return None
+
+
+""" -----------------------------------------------------------------------------------------------
+ Prometheus text format of the stats() dict of a component (see /monitoring): every number is a
+ metric air_<component>_<key>. A nested dict, e.g. batch_size_counts of the SBERT batching, is one
+ metric with its keys as label "key". The stats mix counters and gauges, so they are untyped.
+----------------------------------------------------------------------------------------------- """
+def format_stats(component: str, stats: dict) -> list[str]:
+    lines = []
+    for key, value in stats.items():
+        name = metric_name(component, key)
+
+        if isinstance(value, dict):
+            samples = [(sub_key, _numeric(sub_value)) for sub_key, sub_value in value.items()]
+            samples = [(sub_key, number) for sub_key, number in samples if number is not None]
+            if samples:
+                lines.append(f"# TYPE {name} untyped")
+                lines.extend(f"{name}{format_labels({'key': sub_key})} {format_value(number)}"
+                             for sub_key, number in samples)
+            continue
+
+        number = _numeric(value)
+        if number is not None:
+            lines.append(f"# TYPE {name} untyped")
+            lines.append(f"{name} {format_value(number)}")
+    return lines
+
+
+def format_histogram(name: str, description: str, histogram: Histogram) -> list[str]:
+    name = metric_name(name)
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+
+    for labels, (cumulative, total, count) in histogram.collect().items():
+        label_values = dict(zip(histogram.label_names, labels))
+        for bound, bucket_count in zip((*histogram.buckets, math.inf), cumulative):
+            lines.append(f"{name}_bucket{format_labels({**label_values, 'le': format_value(bound)})} {bucket_count}")
+        lines.append(f"{name}_sum{format_labels(label_values)} {format_value(total)}")
+        lines.append(f"{name}_count{format_labels(label_values)} {count}")
+    return lines
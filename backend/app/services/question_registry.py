@@ -0,0 +1,95 @@
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+from sqlalchemy.orm import Session, joinedload
+from app.enums import QuestionType
+from app.models import Question
+
+""" -----------------------------------------------------------------------------------------------
+ Immutable copies of the question and answer rows. The attribute names are the same as in the
+ ORM models, so the response schemas (see question_schema.py) can read them directly.
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class AnswerEntry:
+    id: int
+    type: QuestionType
+    answer: str
+    question_id: int
+
+
+@dataclass(frozen=True)
+class QuestionEntry:
+    id: int
+    type: QuestionType
+    question: str
+    answer_option: tuple[AnswerEntry, ...]
+
+
+""" -----------------------------------------------------------------------------------------------
+ All questions with their answer options (ordered by id), indexed by id, and the valid answer ids
+ per question, as read-only mappings.
+----------------------------------------------------------------------------------------------- """
+@dataclass(frozen=True)
+class QuestionSnapshot:
+    questions: tuple[QuestionEntry, ...]
+    questions_by_id: Mapping[int, QuestionEntry]
+    answers_by_id: Mapping[int, AnswerEntry]
+    valid_answer_ids: Mapping[int, frozenset[int]]
+
+
+""" -----------------------------------------------------------------------------------------------
+ Process-wide registry of the questionnaire (reference data, it never changes while the app is
+ running). Loaded once upon startup (see lifespan in main.py) instead of querying the question and
+ answer tables on every request. Same pattern as the recommender registries: readers never lock,
+ only building takes the lock.
+----------------------------------------------------------------------------------------------- """
+class QuestionRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: QuestionSnapshot | None = None
+
+    def _build(self, db: Session) -> QuestionSnapshot:
+        rows = db.query(Question).options(joinedload(Question.answer_option)).order_by(Question.id).all()
+
+        questions = tuple(
+            QuestionEntry(id=question.id,
+                          type=question.type,
+                          question=question.question,
+                          answer_option=tuple(AnswerEntry(id=answer.id,
+                                                          type=answer.type,
+                                                          answer=answer.answer,
+                                                          question_id=answer.question_id)
+                                              for answer in sorted(question.answer_option, key=lambda a: a.id)))
+            for question in rows)
+
+        snapshot = QuestionSnapshot(
+            questions=questions,
+            questions_by_id=MappingProxyType({question.id: question for question in questions}),
+            answers_by_id=MappingProxyType({answer.id: answer
+                                            for question in questions for answer in question.answer_option}),
+            valid_answer_ids=MappingProxyType({question.id: frozenset(answer.id for answer in question.answer_option)
+                                               for question in questions}))
+
+        # An empty table (startup did not fill it yet) is not cached
+        if questions:
+            self._snapshot = snapshot
+        return snapshot
+
+    # Loads the questions, called upon startup
+    def build(self, db: Session) -> QuestionSnapshot:
+        with self._lock:
+            return self._build(db=db)
+
+    # Returns the loaded questions, loads them lazily if startup did not happen
+    def get(self, db: Session) -> QuestionSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            return snapshot if snapshot is not None else self._build(db=db)
+
+
+question_registry = QuestionRegistry()
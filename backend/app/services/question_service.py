@@ -1,22 +1,27 @@
 import re
-from sqlalchemy.orm import Session, joinedload
-from app.models import Question
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.database.write_behind import write_behind_queue
 from app.schemas import UserAnswerSubmission, UserFreeTextSubmission
 from app.models import UserSubmission, UserAnswer as UserAnswerModel
+from app.services.question_registry import QuestionEntry, question_registry
+from app.services.timing import timed
 
 
 """ -----------------------------------------------------------------------------------------------
- Query all questions and the corresponding answer options
+ All questions and the corresponding answer options, served from the question registry
 ----------------------------------------------------------------------------------------------- """
-def fetch_all_questions(db: Session) -> list[type[Question]]:
-    questions = db.query(Question).options(joinedload(Question.answer_option)).all()
-    return questions
+def fetch_all_questions(db: Session) -> list[QuestionEntry]:
+    return list(question_registry.get(db=db).questions)
 
 
 """ -----------------------------------------------------------------------------------------------
  Helper that stores the user answers to the database. Each questionnaire is unique by datetime.
- Free text is sanitized before being stored to db
+ Free text is sanitized before being stored to db. The submission is stored right away (its id is
+ returned to the client), the answers can be deferred by the write-behind queue (see
+ write_behind.py)
 ----------------------------------------------------------------------------------------------- """
+@timed("questions.store_answers")
 def store_user_answers(user_answers: UserAnswerSubmission, db: Session) -> int:
 
     submission = UserSubmission(
@@ -27,18 +32,13 @@ def store_user_answers(user_answers: UserAnswerSubmission, db: Session) -> int:
     db.commit()
     db.refresh(submission)
 
-    for user_answer in user_answers.answers:
-        answer = {
-            "question_id": user_answer.question_id,
-            "answer_id": user_answer.answer_id,
-            "submission_id": submission.id
-        }
+    answer_rows = [{"question_id": user_answer.question_id,
+                    "answer_id": user_answer.answer_id,
+                    "submission_id": submission.id}
+                   for user_answer in user_answers.answers]
 
-        db.add(UserAnswerModel(question_id=answer["question_id"],
-                               answer_id=answer["answer_id"],
-                               submission_id=answer["submission_id"]))
-
-    db.commit()
+    if answer_rows:
+        write_behind_queue.submit(db=db, write=lambda session: session.execute(insert(UserAnswerModel), answer_rows))
 
     return submission.id
 
@@ -47,6 +47,7 @@ def store_user_answers(user_answers: UserAnswerSubmission, db: Session) -> int:
  Helper that stores the user's free text to the database. Each questionnaire is unique by datetime.
  Free text is being sanitized before storing to db
 ----------------------------------------------------------------------------------------------- """
+@timed("questions.store_free_text")
 def store_user_submission(user_submission: UserFreeTextSubmission, db: Session) -> int:
     submission = UserSubmission(
         free_text=sanitize_free_text(user_submission.free_text),
@@ -61,35 +62,31 @@ def store_user_submission(user_submission: UserFreeTextSubmission, db: Session)
 
 
 """ -----------------------------------------------------------------------------------------------
- Helper makes sure that all questions are correctly sent from the frontend.
+ Helper makes sure that all questions are correctly sent from the frontend. The valid question and
+ answer ids come from the question registry.
 ----------------------------------------------------------------------------------------------- """
 
-def validate_questionnaire(user_answers: UserAnswerSubmission):
+@timed("questions.validate")
+def validate_questionnaire(user_answers: UserAnswerSubmission, db: Session):
+    questions = question_registry.get(db=db)
+    num_questions = len(questions.questions)
 
     # Checking validity of questions
-    if len(user_answers.answers) < 5:
-        raise ValueError(f"Error! You must send all 5 answers!")
+    if len(user_answers.answers) < num_questions:
+        raise ValueError(f"Error! You must send all {num_questions} answers!")
 
-    if len(user_answers.answers) > 5:
+    if len(user_answers.answers) > num_questions:
         raise ValueError(f"Error! Too many answers!")
 
-    required_question_ids = {1, 2, 3, 4, 5}
+    required_question_ids = set(questions.questions_by_id)
     actual_present_ids = [element.question_id for element in user_answers.answers]
 
     if not required_question_ids.issubset(actual_present_ids):
         raise ValueError(f"Error! Not all questions are answered!")
 
     # Checking validity of provided answers, they must match the question.
-    correct_answer_ids = {
-        1: {1, 2, 3, 4},
-        2: {5, 6, 7},
-        3: {8, 9, 10, 11, 12, 13},
-        4: {14, 15, 16},
-        5: {17, 18, 19, 20}
-    }
-
     for answer in user_answers.answers:
-        valid_ids = correct_answer_ids.get(answer.question_id)
+        valid_ids = questions.valid_answer_ids.get(answer.question_id)
 
         if valid_ids is None or answer.answer_id not in valid_ids:
             raise ValueError(f"Error! Invalid answer_id for question: {answer.question_id}. "
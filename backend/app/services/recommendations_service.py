@@ -1,9 +1,20 @@
-from sqlalchemy.orm import Session
-from app.models import UserSubmission, Recommendation, Plant, SbertMetadata, Bm25Metadata, UserPlantLike, UserAnswer, \
-    Question, Answer
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Iterator
+from sqlalchemy import Select, func, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.database.database import ReadSessionLocal
+from app.database.write_behind import write_behind_queue
+from app.enums import Algorithm, ExportFormat, Label
+from app.models import UserSubmission, Recommendation, Plant, SbertMetadata, Bm25Metadata, UserPlantLike, UserAnswer
 from app.schemas import RecommendationMetadataSBERT, Plant as PlantSchema, PlantMetadata, PlantRecommendation, \
     RecommendationMetadataBM25, UserInputQuestionnaire
 from app.schemas.recommendations_schema import AllRecommendations, UserInput
+from app.services.like_counter import plant_like_counter
+from app.services.question_registry import question_registry
 
 """ -----------------------------------------------------------------------------------------------
  Query all plants including pagination
@@ -22,99 +33,67 @@ def add_rating_to_recommendation(db: Session, submission_id: int, rating: int):
     return submission_entry
 
 
+# Largest page of GET /recommendation/all, the eager loads of one page then fit into one IN (...) query each
+MAX_PAGE_SIZE = 500
+
 """ -----------------------------------------------------------------------------------------------
- Collects all ever received recommendations and returns a list of it.
+ Collects all ever received recommendations and returns a list of it, ordered by submission id.
+ Keyset pagination: only submissions after after_submission_id, at most limit of them (no limit
+ returns all). The next page starts after the last submission id of a page.
+ Everything of a page is loaded with a fixed number of queries, independent of the number of
+ submissions and recommendations: the submissions, their user answers and their recommendations
+ (joined with the plant and the metadata). Questions and answers come from the question registry.
 ----------------------------------------------------------------------------------------------- """
-def get_all_recommendations(db: Session, include_non_rated: bool):
-    global metadata
+def get_all_recommendations(db: Session, include_non_rated: bool, after_submission_id: int | None = None,
+                            limit: int | None = None) -> list[AllRecommendations]:
+    query = (db.query(UserSubmission)
+             .options(selectinload(UserSubmission.user_answers),
+                      selectinload(UserSubmission.recommendations).options(
+                          joinedload(Recommendation.plant),
+                          joinedload(Recommendation.bm25_metadata),
+                          joinedload(Recommendation.sbert_metadata)))
+             .order_by(UserSubmission.id))
+
+    # Skip not rated entries, just in case frontend wants some special logic
+    if include_non_rated is False:
+        query = query.filter(UserSubmission.rating.isnot(None))
+    if after_submission_id is not None:
+        query = query.filter(UserSubmission.id > after_submission_id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    # Questions and answers of the stored user answers come from the question registry
+    questions = question_registry.get(db=db)
+
     all_submissions_recs: list[AllRecommendations] = []
-    all_submissions = db.query(UserSubmission).all()
-    submission_type = ""
-
-    for sub in all_submissions:
-
-        # Skip not rated entries, just in case frontend wants some special logic
-        if sub.rating is None and include_non_rated is False:
-            continue
-
-        recommendations = db.query(Recommendation).filter_by(submission_id=sub.id).all()
-
-        recommendation_list: list = []
-        for recom in recommendations:
-            plant = db.query(Plant).filter_by(id=recom.plant_id).first()
-
-            if recom.algorithm == 'sbert':
-                submission_type = "free_text"
-                metadata_sbert = db.query(SbertMetadata).filter_by(recommendation_id=recom.id).first()
-
-                metadata = RecommendationMetadataSBERT(
-                    algorithm="SBERT",
-                    cosine_sim_raw=metadata_sbert.cosine_similarity_raw,
-                    cosine_sim_normalized=metadata_sbert.cosine_similarity_norm,
-                    rank=metadata_sbert.rank,
-                    cosine_sim_percentile=metadata_sbert.cosine_similarity_percentile,
-                    cosine_distance=metadata_sbert.cosine_distance,
-                    gap_to_best=metadata_sbert.gap_to_best,
-                )
-
-            elif recom.algorithm == 'bm25':
-                submission_type = "questionnaire"
-                metadata_bm25 = db.query(Bm25Metadata).filter_by(recommendation_id=recom.id).first()
-
-                metadata = RecommendationMetadataBM25(
-                    score_raw=metadata_bm25.score_raw,
-                    score_normalized=metadata_bm25.score_norm,
-                    score_percentile=metadata_bm25.score_percentile,
-                    rank=metadata_bm25.rank,
-                    matched_terms=[metadata_bm25.matched_terms],
-                    unmatched_terms=[metadata_bm25.unmatched_terms],
-                    max_matches=metadata_bm25.max_matches,
-                    match_count=metadata_bm25.match_count,
-                    match_ratio=metadata_bm25.match_ratio
-                )
-
-            plant_metadata = PlantMetadata(
-                **PlantSchema.model_validate(plant).model_dump(),
-                metadata=metadata)
-
-            recommendation_list.append(
-                PlantRecommendation(
-                    label=recom.label, # type: ignore
-                    submission_id=recom.submission_id, # type: ignore
-                    recommendation=[plant_metadata]))
+    for sub in query.all():
+        recommendation_list = [PlantRecommendation(label=recom.label,  # type: ignore
+                                                   submission_id=recom.submission_id,  # type: ignore
+                                                   recommendation=[create_plant_metadata(recom)])
+                               for recom in sub.recommendations]
 
         # Add user answers to the recommendation, such that frontend can display nicely
-        user_answer = db.query(UserAnswer).filter_by(submission_id=sub.id).all()
         user_input_questionnaire_list = []
-        user_input_free_text = ""
+        for user_answer in sub.user_answers:
+            question = questions.questions_by_id.get(user_answer.question_id)
+            answer = questions.answers_by_id.get(user_answer.answer_id)
 
-        if not user_answer:
-            user_input_free_text = sub.free_text
+            if question is not None and answer is not None:
+                user_input_questionnaire_list.append(UserInputQuestionnaire(
+                    question_type=question.type.value,
+                    question=str(question.question),
+                    answer=str(answer.answer)
+                ))
 
+        if sub.recommendations:
+            submission_type = "free_text" if sub.recommendations[0].algorithm == Algorithm.sbert else "questionnaire"
         else:
-            for answer in user_answer:
-                question_id = answer.question_id
-                answer_id = answer.answer_id
-
-                question = db.query(Question).filter_by(id=question_id).first()
-                answer = db.query(Answer).filter_by(id=answer_id).first()
-
-                if question is not None and answer is not None:
-                    question_type = question.type
-                    question_text = question.question
-                    answer_text = answer.answer
-
-                    user_input_questionnaire_list.append(UserInputQuestionnaire(
-                        question_type=question_type.value,
-                        question=str(question_text),
-                        answer=str(answer_text)
-                    ))
-
+            submission_type = "questionnaire" if sub.user_answers else "free_text"
 
         user_input = UserInput(
             type=submission_type,
             questionnaire=user_input_questionnaire_list,
-            free_text=user_input_free_text
+            free_text="" if sub.user_answers else sub.free_text
         )
 
         all_submissions_recs.append(
@@ -128,11 +107,153 @@ def get_all_recommendations(db: Session, include_non_rated: bool):
     return all_submissions_recs
 
 
+""" -----------------------------------------------------------------------------------------------
+ Maps a stored recommendation with its (eagerly loaded) plant and metadata to the response schema
+----------------------------------------------------------------------------------------------- """
+def create_plant_metadata(recom: Recommendation) -> PlantMetadata:
+    if recom.algorithm == Algorithm.sbert:
+        metadata_sbert = recom.sbert_metadata
+
+        metadata = RecommendationMetadataSBERT(
+            algorithm="SBERT",
+            cosine_sim_raw=metadata_sbert.cosine_similarity_raw,
+            cosine_sim_normalized=metadata_sbert.cosine_similarity_norm,
+            rank=metadata_sbert.rank,
+            cosine_sim_percentile=metadata_sbert.cosine_similarity_percentile,
+            cosine_distance=metadata_sbert.cosine_distance,
+            gap_to_best=metadata_sbert.gap_to_best,
+        )
+    else:
+        metadata_bm25 = recom.bm25_metadata
+
+        metadata = RecommendationMetadataBM25(
+            score_raw=metadata_bm25.score_raw,
+            score_normalized=metadata_bm25.score_norm,
+            score_percentile=metadata_bm25.score_percentile,
+            rank=metadata_bm25.rank,
+            matched_terms=[metadata_bm25.matched_terms],
+            unmatched_terms=[metadata_bm25.unmatched_terms],
+            max_matches=metadata_bm25.max_matches,
+            match_count=metadata_bm25.match_count,
+            match_ratio=metadata_bm25.match_ratio
+        )
+
+    return PlantMetadata(
+        **PlantSchema.model_validate(recom.plant).model_dump(),
+        metadata=metadata)
+
+
+# Rows fetched from the cursor at once while exporting, and sent as one chunk
+EXPORT_BATCH_SIZE = 1000
+
+""" -----------------------------------------------------------------------------------------------
+ Query for the export of the recommendation history: one flat row per recommendation, with its
+ submission, plant and the metadata of its algorithm (the columns of the other one are empty),
+ ordered by recommendation id. All filters are optional.
+----------------------------------------------------------------------------------------------- """
+def create_export_query(algorithm: Algorithm | None = None, label: Label | None = None,
+                        min_rating: int | None = None, max_rating: int | None = None,
+                        created_from: datetime | None = None, created_to: datetime | None = None) -> Select:
+    query = (select(Recommendation.id.label("recommendation_id"),
+                    UserSubmission.id.label("submission_id"),
+                    UserSubmission.created_at,
+                    UserSubmission.rating,
+                    UserSubmission.free_text,
+                    Recommendation.algorithm,
+                    Recommendation.label,
+                    Plant.id.label("plant_id"),
+                    Plant.name.label("plant_name"),
+                    func.coalesce(Bm25Metadata.rank, SbertMetadata.rank).label("rank"),
+                    Bm25Metadata.score_raw,
+                    Bm25Metadata.score_norm,
+                    Bm25Metadata.score_percentile,
+                    Bm25Metadata.matched_terms,
+                    Bm25Metadata.unmatched_terms,
+                    Bm25Metadata.max_matches,
+                    Bm25Metadata.match_count,
+                    Bm25Metadata.match_ratio,
+                    SbertMetadata.cosine_similarity_raw,
+                    SbertMetadata.cosine_similarity_norm,
+                    SbertMetadata.cosine_similarity_percentile,
+                    SbertMetadata.cosine_distance,
+                    SbertMetadata.gap_to_best)
+             .join(UserSubmission, Recommendation.submission_id == UserSubmission.id)
+             .join(Plant, Recommendation.plant_id == Plant.id)
+             .outerjoin(Bm25Metadata, Bm25Metadata.recommendation_id == Recommendation.id)
+             .outerjoin(SbertMetadata, SbertMetadata.recommendation_id == Recommendation.id)
+             .order_by(Recommendation.id))
+
+    if algorithm is not None:
+        query = query.where(Recommendation.algorithm == algorithm)
+    if label is not None:
+        query = query.where(Recommendation.label == label)
+    if min_rating is not None:
+        query = query.where(UserSubmission.rating >= min_rating)
+    if max_rating is not None:
+        query = query.where(UserSubmission.rating <= max_rating)
+    if created_from is not None:
+        query = query.where(UserSubmission.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(UserSubmission.created_at <= created_to)
+
+    return query
+
+
+def _export_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+""" -----------------------------------------------------------------------------------------------
+ Streams the result of an export query as JSON lines or CSV (with header), one line per
+ recommendation. The rows come from a server-side cursor in batches of EXPORT_BATCH_SIZE, each
+ batch is sent as one chunk, so memory stays constant whatever the size of the history.
+ The session is opened within the generator: it lives as long as the response is streamed, not
+ only as long as the endpoint function runs.
+----------------------------------------------------------------------------------------------- """
+def stream_recommendation_export(query: Select, export_format: ExportFormat) -> Iterator[str]:
+    db = ReadSessionLocal()
+    try:
+        result = db.execute(query, execution_options={"stream_results": True, "yield_per": EXPORT_BATCH_SIZE})
+        columns = list(result.keys())
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        if export_format == ExportFormat.csv:
+            writer.writerow(columns)
+
+        for rows in result.partitions():
+            for row in rows:
+                values = [_export_value(value) for value in row]
+                if export_format == ExportFormat.csv:
+                    writer.writerow(values)
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, values))) + "\n")
+
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        # Only the csv header, if nothing matched
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+
 """ -----------------------------------------------------------------------------------------------
  Clears all user specific data. Used especially in testing and development phase
 ----------------------------------------------------------------------------------------------- """
 def delete_all_entries(db: Session):
 
+    # Queued writes would otherwise be stored after the delete
+    write_behind_queue.flush()
+    # Likes counted in memory would otherwise be stored after the delete
+    plant_like_counter.reset()
+
     db.query(Bm25Metadata).delete()
     db.query(SbertMetadata).delete()
     db.query(Recommendation).delete()
@@ -0,0 +1,58 @@
+import threading
+from typing import Generic, TypeVar
+from sqlalchemy.orm import Session
+
+T = TypeVar("T")
+
+""" -----------------------------------------------------------------------------------------------
+ Base of the registries that hold an immutable snapshot derived from the plants table (catalog,
+ name index, filter index, ...). Built upon startup (see lifespan in main.py) or lazily by the
+ first reader; readers never lock, they grab the current snapshot.
+ _lock serializes the builds, _state_lock guards the snapshot and the generation. invalidate()
+ (the hook for changes of the plants table) raises the generation, a build only installs its
+ snapshot if the generation is still the one it started with. Comparing and installing happen
+ under _state_lock, so a change committed during a build is never overwritten by stale data,
+ while invalidate() does not have to wait for a running build.
+ Subclasses implement _create; generation is passed along, e.g. as version of the snapshot.
+----------------------------------------------------------------------------------------------- """
+class SnapshotRegistry(Generic[T]):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._snapshot: T | None = None
+        self._generation = 0
+
+    def _create(self, db: Session, generation: int) -> T:
+        raise NotImplementedError
+
+    def _build(self, db: Session) -> T:
+        with self._state_lock:
+            generation = self._generation
+
+        snapshot = self._create(db=db, generation=generation)
+
+        with self._state_lock:
+            if generation == self._generation:
+                self._snapshot = snapshot
+        return snapshot
+
+    # Builds the snapshot, called upon startup
+    def build(self, db: Session) -> T:
+        with self._lock:
+            return self._build(db=db)
+
+    # Returns the current snapshot, builds it lazily after a change or if startup did not happen
+    def get(self, db: Session) -> T:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            return snapshot if snapshot is not None else self._build(db=db)
+
+    # Hook for changes of the plants table, the next reader rebuilds
+    def invalidate(self):
+        with self._state_lock:
+            self._generation += 1
+            self._snapshot = None
@@ -0,0 +1,148 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextvars import ContextVar
+from starlette.datastructures import MutableHeaders
+
+# "1" times the stages of every request (histograms of /metrics), "0" turns all spans into no-ops
+TIMING_ENABLED = os.getenv("TIMING_SPANS", "1") == "1"
+
+# "1" sends the stage durations of a request in its Server-Timing header
+SERVER_TIMING_HEADER_ENABLED = os.getenv("SERVER_TIMING_HEADER", "1") == "1"
+
+# Upper bounds of the histogram buckets in seconds (the Prometheus defaults, plus 0.5 ms and 1 ms)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Spans of the current request, set by the middleware. Sync endpoints run in the threadpool with a copy of the
+# context, the copy refers to the same list
+_request_spans: ContextVar[list[tuple[str, float]] | None] = ContextVar("request_spans", default=None)
+
+
+""" -----------------------------------------------------------------------------------------------
+ Thread-safe histograms with fixed buckets (see BUCKETS), one series per tuple of label values.
+ An observation is a binary search and one short lock, cheap enough for every request.
+----------------------------------------------------------------------------------------------- """
+class Histogram:
+    def __init__(self, label_names: tuple[str, ...], buckets: tuple[float, ...] = BUCKETS):
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # Label values -> [counts per bucket (last one is +Inf), sum of the observations]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, labels: tuple[str, ...], seconds: float):
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += seconds
+
+    # Label values -> (cumulative counts per bucket, sum, count), like the Prometheus exposition
+    def collect(self) -> dict[tuple[str, ...], tuple[list[int], float, int]]:
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+
+        collected = {}
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = []
+            running = 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            collected[labels] = (cumulative, total, running)
+        return collected
+
+
+# Duration of the timed stages (spans) and of the requests per route
+stage_histogram = Histogram(label_names=("stage",))
+request_histogram = Histogram(label_names=("method", "route"))
+
+
+""" -----------------------------------------------------------------------------------------------
+ Times a stage of a request, e.g. with span("sbert.encode"): ... The duration goes into the stage
+ histogram and, within a request, into its Server-Timing header (see ServerTimingMiddleware).
+ A plain class instead of contextlib.contextmanager, as it is entered several times per request.
+----------------------------------------------------------------------------------------------- """
+class span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not TIMING_ENABLED:
+            return False
+
+        seconds = time.perf_counter() - self.started
+        stage_histogram.observe((self.name,), seconds)
+
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((self.name, seconds))
+        return False
+
+
+# Decorator form of span, times every call of the function
+def timed(name: str):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Header value like "sbert.encode;dur=3.1, sbert.plant_lookup;dur=1.2, total;dur=6.0", stages of the same name summed
+def server_timing_header(spans: list[tuple[str, float]], total: float) -> str:
+    durations: dict[str, float] = {}
+    for name, seconds in list(spans):
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in durations.items())
+
+
+""" -----------------------------------------------------------------------------------------------
+ ASGI middleware that collects the spans of each request (in a context variable), adds them to
+ the Server-Timing header of the response and records the duration of the request per route (the
+ path template, e.g. /plants/{plant_id}/like, so the number of series stays small). Streamed
+ responses get the spans until the response started in the header, all of them in the histograms.
+ Plain ASGI instead of BaseHTTPMiddleware, which adds a task and a wrapped body stream per request.
+----------------------------------------------------------------------------------------------- """
+class ServerTimingMiddleware:
+    def __init__(self, app, enabled: bool = TIMING_ENABLED, header_enabled: bool = SERVER_TIMING_HEADER_ENABLED):
+        self.app = app
+        self.enabled = enabled
+        self.header_enabled = header_enabled
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        spans: list[tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and self.header_enabled:
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing_header(spans, total=time.perf_counter() - started))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            route = scope.get("route")
+            request_histogram.observe((scope["method"], getattr(route, "path", "unmatched")),
+                                      time.perf_counter() - started)
@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from app.database.database import SessionLocal
+from app.recommender.BM25 import BM25Recommender
+from app.recommender.SBERT import sbert_registry
+from app.recommender.SBERT.sbert_recommender import SBertRecommender
+from app.schemas import UserAnswer, UserAnswerSubmission, UserFreeTextSubmission
+from app.services import question_registry
+
+# "1" runs the SBERT build and a synthetic query through each recommender before the app reports ready,
+# "0" reports ready right after the startup (the first SBERT request loads the model)
+STARTUP_WARM_UP_ENABLED = os.getenv("STARTUP_WARM_UP", "1") == "1"
+
+# A failed warm-up is retried up to this number of attempts, waiting the backoff in between (doubled per attempt)
+STARTUP_WARM_UP_ATTEMPTS = int(os.getenv("STARTUP_WARM_UP_ATTEMPTS", "5"))
+STARTUP_WARM_UP_BACKOFF_S = float(os.getenv("STARTUP_WARM_UP_BACKOFF_S", "2"))
+STARTUP_WARM_UP_MAX_BACKOFF_S = 60.0
+
+# Seconds after the start of the lifespan by which the app has to be ready, otherwise it reports not alive
+STARTUP_WARM_UP_DEADLINE_S = float(os.getenv("STARTUP_WARM_UP_DEADLINE_S", "600"))
+
+# Free text of the synthetic SBERT query
+WARM_UP_FREE_TEXT = "easy plant for a bright room, little water"
+
+# Number of recommendations per label of the synthetic queries, the defaults of the endpoints
+WARM_UP_NUM_FITS = 3
+
+
+# Synthetic questionnaire: the first answer option of every question
+def run_bm25_query(db: Session):
+    answers = [UserAnswer(question_id=question.id, answer_id=question.answer_option[0].id)
+               for question in question_registry.get(db=db).questions if question.answer_option]
+    user_answers = UserAnswerSubmission(answers=answers, created_at=datetime.now(timezone.utc))
+
+    BM25Recommender(db=db, submission_id=0).recommend(user_answers=user_answers, num_perfect=WARM_UP_NUM_FITS,
+                                                      num_good=WARM_UP_NUM_FITS, num_bad=WARM_UP_NUM_FITS,
+                                                      store=False)
+
+
+def run_sbert_query(db: Session):
+    user_submission = UserFreeTextSubmission(free_text=WARM_UP_FREE_TEXT, created_at=datetime.now(timezone.utc))
+
+    SBertRecommender(db=db, submission_id=0).recommend(user_free_text=user_submission, num_perfect=WARM_UP_NUM_FITS,
+                                                       num_good=WARM_UP_NUM_FITS, num_bad=WARM_UP_NUM_FITS,
+                                                       store=False)
+
+
+""" -----------------------------------------------------------------------------------------------
+ Startup of the app and its readiness (see /health/ready). The lifespan in main.py times each of
+ its phases with phase(), then warm_up() continues in a background thread with its own session:
+ loading the SBERT model and corpus embeddings and running a synthetic query through the BM25 and
+ the SBERT recommender (nothing is stored), which also fills the SQLite page cache. Only then the
+ app is ready, so the first real request does not pay for any of it. The warm-up runs in the
+ background, as the server does not answer at all before the lifespan is done (/health/live
+ answers while warming up).
+ A failed warm-up is retried with exponential backoff (e.g. the model download failed). If all
+ attempts fail, or the app is not ready by the deadline, /health/live fails as well, so the
+ orchestrator restarts the worker instead of keeping a worker that never gets traffic.
+----------------------------------------------------------------------------------------------- """
+class StartupWarmUp:
+    def __init__(self, session_factory=SessionLocal, enabled: bool = STARTUP_WARM_UP_ENABLED,
+                 max_attempts: int = STARTUP_WARM_UP_ATTEMPTS, backoff_s: float = STARTUP_WARM_UP_BACKOFF_S,
+                 deadline_s: float = STARTUP_WARM_UP_DEADLINE_S):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_s = max(0.0, backoff_s)
+        self.deadline_s = deadline_s
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started = time.perf_counter()
+        self._phases: dict[str, float] = {}
+        self._thread: threading.Thread | None = None
+        self._ready = False
+        self._ready_after_ms: float | None = None
+        self._error: str | None = None
+        self._attempts = 0
+        self._failed = False
+
+    # Called first in the lifespan, the phases and the time until ready are measured from here
+    def begin(self):
+        with self._lock:
+            self._started = time.perf_counter()
+            self._phases = {}
+            self._ready = False
+            self._ready_after_ms = None
+            self._error = None
+            self._attempts = 0
+            self._failed = False
+        self._stop.clear()
+
+    # Times a phase of the startup, e.g. with startup_warm_up.phase("migrations"): ...
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phases[name] = (time.perf_counter() - started) * 1000
+
+    # Called at the end of the lifespan startup
+    def warm_up(self):
+        if not self.enabled:
+            self._set_ready()
+            return
+
+        self._thread = threading.Thread(target=self._run, name="startup-warm-up", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        backoff = self.backoff_s
+        for attempt in range(1, self.max_attempts + 1):
+            with self._lock:
+                self._attempts = attempt
+
+            if self._warm_up_once():
+                self._set_ready()
+                return
+
+            # Waiting before the next attempt, stopped early upon shutdown
+            if attempt == self.max_attempts or self._stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, STARTUP_WARM_UP_MAX_BACKOFF_S)
+
+        with self._lock:
+            self._failed = not self._stop.is_set()
+
+    # One attempt of the warm-up, returns whether it succeeded
+    def _warm_up_once(self) -> bool:
+        db = self.session_factory()
+        try:
+            with self.phase("sbert_index"):
+                sbert_registry.get(db=db)
+            with self.phase("bm25_query"):
+                run_bm25_query(db=db)
+            with self.phase("sbert_query"):
+                run_sbert_query(db=db)
+            return True
+        except Exception as error:
+            with self._lock:
+                # First line only, SQLAlchemy errors append the statement and a link
+                self._error = f"{type(error).__name__}: {str(error).partition(chr(10))[0]}"
+            return False
+        finally:
+            db.close()
+
+    def _set_ready(self):
+        with self._lock:
+            self._ready = True
+            self._ready_after_ms = (time.perf_counter() - self._started) * 1000
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    # False once all attempts of the warm-up failed or the app is not ready by the deadline
+    @property
+    def alive(self) -> bool:
+        with self._lock:
+            if self._ready:
+                return True
+            return not self._failed and time.perf_counter() - self._started <= self.deadline_s
+
+    # Waits for the running warm-up, returns whether the app is ready
+    def wait(self, timeout: float | None = None) -> bool:
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=timeout)
+        return self._ready
+
+    # Stops waiting for the next attempt, called upon shutdown
+    def close(self):
+        self._stop.set()
+
+    def stats(self) -> dict:
+        thread = self._thread
+        alive = self.alive
+        with self._lock:
+            return {
+                "ready": self._ready,
+                "alive": alive,
+                "warm_up_enabled": self.enabled,
+                "warm_up_running": thread is not None and thread.is_alive(),
+                "attempts": self._attempts,
+                "max_attempts": self.max_attempts,
+                "failed": self._failed,
+                "error": self._error,
+                "ready_after_ms": None if self._ready_after_ms is None else round(self._ready_after_ms, 1),
+                "phases_ms": {name: round(ms, 1) for name, ms in self._phases.items()},
+            }
+
+
+startup_warm_up = StartupWarmUp()